@@ -0,0 +1,191 @@
+"""Inverted-file (IVF) approximate nearest-neighbour index over dense chunk vectors.
+
+Spherical k-means splits the chunk vectors into ``lists`` clusters. A query
+is compared with the centroids, and only the chunks of its ``nprobe`` closest
+clusters are scored exactly, so the cost per query grows with
+nprobe * chunks / lists instead of with the corpus:
+
+  nprobe   recall/latency knob: more clusters probed finds more of the true
+           nearest chunks and costs proportionally more (nprobe == lists is
+           exact search).
+  lists    more clusters make each probe cheaper; about 4 * sqrt(chunks)
+           by default.
+
+New vectors are inserted into their nearest cluster without retraining. The
+centroids go stale only if the corpus drifts far from what they were trained
+on; ``needs_training`` flags an index that has grown to several times its
+training size.
+"""
+import logging
+import math
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('ann_index')
+
+DEFAULT_NPROBE = 32
+KMEANS_ITERATIONS = 10
+# Training sample per cluster; k-means on a sample costs far less and finds nearly the same centroids
+TRAINING_SAMPLE_PER_LIST = 32
+# Rows assigned to centroids per matrix product during training and insertion
+ASSIGN_BLOCK_ROWS = 16384
+# Retrain once the index holds this many times the vectors it was trained on
+GROWTH_BEFORE_RETRAINING = 4
+
+
+def default_lists(rows: int) -> int:
+    return max(1, min(rows, int(4 * math.sqrt(rows))))
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def _dequantize(vectors: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    block = vectors.astype(np.float32)
+    if scales is not None:
+        block *= scales[:, np.newaxis]
+    return block
+
+
+def assign(vectors: np.ndarray, scales: Optional[np.ndarray], centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (highest cosine) of every vector."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        stop = start + ASSIGN_BLOCK_ROWS
+        block = _dequantize(vectors[start:stop], scales[start:stop] if scales is not None else None)
+        assignments[start:stop] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors: np.ndarray, scales: Optional[np.ndarray], lists: int,
+                     iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Unit-length centroids of lists clusters, trained on a sample of the vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * TRAINING_SAMPLE_PER_LIST)
+    sample = np.sort(rng.choice(len(vectors), sample_size, replace=False))
+    points = _dequantize(vectors[sample], scales[sample] if scales is not None else None)
+    centroids = points[rng.choice(len(points), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign(points, None, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, points)
+        counts = np.bincount(assignments, minlength=lists)
+        empty = counts == 0
+        if empty.any():  # restart empty clusters on random points
+            sums[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class IvfIndex:
+    """Centroids plus, for every cluster, the sorted row numbers of its vectors.
+
+    The vectors themselves stay with their owner (an LsaIndex) and are passed
+    to ``search``; rows are gathered from them per probed cluster.
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray], trained_rows: int):
+        self.centroids = centroids
+        self.lists = lists
+        self.trained_rows = trained_rows
+
+    @property
+    def size(self) -> int:
+        return sum(len(rows) for rows in self.lists)
+
+    @property
+    def needs_training(self) -> bool:
+        return self.size > GROWTH_BEFORE_RETRAINING * max(self.trained_rows, 1)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.centroids.nbytes + sum(rows.nbytes for rows in self.lists)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, scales: Optional[np.ndarray] = None, lists: int = 0,
+              seed: int = 0) -> 'IvfIndex':
+        """Cluster the vectors (rows of unit length once scaled) into lists clusters (0: automatic)."""
+        start = time.perf_counter()
+        lists = min(lists or default_lists(len(vectors)), len(vectors))
+        centroids = spherical_kmeans(vectors, scales, lists, seed=seed)
+        index = cls(centroids, [np.empty(0, dtype=np.int64) for _ in range(lists)], len(vectors))
+        index.add(np.arange(len(vectors)), vectors, scales)
+        logger.info('Trained IVF index: %d lists over %d vectors in %.1f s', lists, len(vectors),
+                    time.perf_counter() - start)
+        return index
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray, scales: Optional[np.ndarray] = None):
+        """Insert vectors, known by their row numbers, into their closest clusters."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        assignments = assign(vectors, scales, self.centroids)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(len(self.lists) + 1))
+        for cluster in np.unique(assignments):
+            added = rows[order[bounds[cluster]:bounds[cluster + 1]]]
+            self.lists[cluster] = np.union1d(self.lists[cluster], added)
+
+    def remapped(self, mapping: np.ndarray) -> 'IvfIndex':
+        """This index with every row r renumbered to mapping[r]; rows mapped to -1 are dropped."""
+        lists = []
+        for rows in self.lists:
+            moved = mapping[rows]
+            lists.append(np.sort(moved[moved >= 0]))
+        return IvfIndex(self.centroids, lists, self.trained_rows)
+
+    def search(self, queries: np.ndarray, vectors: np.ndarray, scales: Optional[np.ndarray], k: int,
+               nprobe: int = DEFAULT_NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """The k best rows of every (unit-length) query among its nprobe closest clusters.
+
+        Returns (rows, scores), both queries x k and best first; missing
+        places hold row -1 and score -inf.
+        """
+        nprobe = max(1, min(nprobe, len(self.lists)))
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        closest = queries @ self.centroids.T
+        probes = np.argpartition(-closest, nprobe - 1, axis=1)[:, :nprobe] if nprobe < len(self.lists) else \
+            np.tile(np.arange(len(self.lists)), (len(queries), 1))
+        for q, probe in enumerate(probes):
+            candidates = np.concatenate([self.lists[cluster] for cluster in probe])
+            if not len(candidates):
+                continue
+            block = _dequantize(vectors[candidates], scales[candidates] if scales is not None else None)
+            candidate_scores = block @ queries[q]
+            top = min(k, len(candidates))
+            best = np.argpartition(-candidate_scores, top - 1)[:top]
+            best = best[np.argsort(-candidate_scores[best], kind='stable')]
+            rows[q, :top] = candidates[best]
+            scores[q, :top] = candidate_scores[best]
+        return rows, scores
+
+    def arrays(self) -> dict:
+        """The index as flat arrays, for saving alongside the vectors."""
+        offsets = np.zeros(len(self.lists) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(rows) for rows in self.lists])
+        rows = np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64)
+        return {'ann_centroids': self.centroids, 'ann_offsets': offsets, 'ann_rows': rows,
+                'ann_trained_rows': np.array([self.trained_rows], dtype=np.int64)}
+
+    @classmethod
+    def from_arrays(cls, data) -> Optional['IvfIndex']:
+        if 'ann_centroids' not in data:
+            return None
+        offsets, rows = data['ann_offsets'], data['ann_rows']
+        lists = [rows[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        return cls(data['ann_centroids'], lists, int(data['ann_trained_rows'][0]))
+
+
+def recall(exact_rows: Sequence[Sequence[int]], approximate_rows: Sequence[Sequence[int]]) -> float:
+    """Share of the exact top rows the approximate search also returned."""
+    found = total = 0
+    for exact, approximate in zip(exact_rows, approximate_rows):
+        found += len(set(exact) & set(approximate))
+        total += len(exact)
+    return found / total if total else 1.0
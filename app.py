@@ -1,96 +1,65 @@
-from flask import Flask, render_template, request, jsonify, Response, stream_with_context
-from openai import OpenAI
-from document_processor import (
-    process_document_directory, 
-    extract_text_from_pdf, 
-    extract_text_from_docx, 
-    extract_text_from_doc,
-    extract_text_from_txt
-)
+import time
+# Wall-clock marks for the startup report logged once the module has loaded
+_startup_marks = [('begin', time.perf_counter())]
+
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g, abort, send_file
+from extractors import extract_text, get_file_type as get_extractor_type, select_backends
+from extraction_pool import ExtractionPool, ExtractionError
+from concurrent.futures import Future, as_completed
+import atexit
+import threading
+from models.corpus import ChangeRecorder, Corpus
+from watcher import DirectoryWatcher, DELETED
+from uploads import UploadRequest, ContentHashIndex
+import metrics
+import extractors
+from profiler import ProfileStore, RequestProfile, profile_iterable, requested_mode, authorized
+from ffmpeg_setup import configure_pydub
+from retrieval import (ChunkIndex, IndexCache, split_text_into_chunks, extract_query_terms, chunk_documents,
+                       create_vectorizer, cosine_similarity, simple_keyword_matching, tokenize, locate_chunk)
+from chunk_store import ChunkStore, ChunkStoreError
+from cascade import Cascade
+from facets import FilterError, matches, parse_filters
+from pagination import CursorError, ResultCache, decode_cursor, encode_cursor
+from sentences import expand_windows
+from positional import constrain, parse_query
+from suggest import Suggester
+import functools
 import os
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
-import time
 import json
 import gc
 from dotenv import load_dotenv
 from datetime import timedelta
 import logging
-from logging.handlers import RotatingFileHandler
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import re
+from logging_config import configure_logging
+# sklearn, openai and pydub are imported on first use (see retrieval.py,
+# get_openai_client and convert_to_wav) to keep startup fast
+
+_startup_marks.append(('imports', time.perf_counter()))
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-    
-file_handler = RotatingFileHandler('logs/app.log', maxBytes=10240, backupCount=10)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-file_handler.setLevel(logging.INFO)
-
-# Setup ffmpeg before importing pydub
-def setup_ffmpeg():
-    """Setup ffmpeg path by checking multiple common locations."""
-    possible_paths = [
-        "C:\\ProgramData\\chocolatey\\bin",  # Chocolatey installation path
-        "C:\\ffmpeg\\bin",
-        "C:\\Program Files\\ffmpeg\\bin",
-        os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Programs\\ffmpeg\\bin'),
-        os.path.join(os.environ.get('APPDATA', ''), 'ffmpeg\\bin'),
-        "C:\\Program Files (x86)\\ffmpeg\\bin"
-    ]
-    
-    # First check if ffmpeg.exe exists in any of these locations
-    ffmpeg_path = None
-    for path in possible_paths:
-        if os.path.exists(os.path.join(path, 'ffmpeg.exe')):
-            ffmpeg_path = path
-            break
-    
-    if not ffmpeg_path:
-        # Check PATH environment variable
-        for path in os.environ.get('PATH', '').split(os.pathsep):
-            if os.path.exists(os.path.join(path, 'ffmpeg.exe')):
-                ffmpeg_path = path
-                break
-    
-    if ffmpeg_path:
-        print(f"Found ffmpeg at: {ffmpeg_path}")
-        # Add to PATH if not already there
-        if ffmpeg_path not in os.environ.get('PATH', ''):
-            os.environ["PATH"] = ffmpeg_path + os.pathsep + os.environ.get("PATH", "")
-        
-        # Import and configure pydub
-        from pydub import AudioSegment
-        AudioSegment.converter = os.path.join(ffmpeg_path, "ffmpeg.exe")
-        AudioSegment.ffmpeg = os.path.join(ffmpeg_path, "ffmpeg.exe")
-        AudioSegment.ffprobe = os.path.join(ffmpeg_path, "ffprobe.exe")
-        return True
-    else:
-        print("WARNING: ffmpeg not found in common locations. Audio processing may not work.")
-        print("Please install ffmpeg using: winget install -e --id Gyan.FFmpeg")
-        # Import pydub anyway for other functionality
-        from pydub import AudioSegment
-        return False
-
-# Call setup function before anything else
-setup_ffmpeg()
-
-# Now import pydub after setting up ffmpeg
-from pydub import AudioSegment
+# Setup logging: records go through a queue to a listener thread that writes
+# logs/app.log (JSON lines, rotated at LOG_MAX_BYTES) and the console
+configure_logging()
+_startup_marks.append(('logging', time.perf_counter()))
 
 app = Flask(__name__)
-app.logger.addHandler(file_handler)
-app.logger.setLevel(logging.INFO)
+# Stream multipart uploads to disk (hashing as they arrive) instead of into memory
+app.request_class = UploadRequest
 app.logger.info('Application startup')
 
+# Benchmark the installed extractor backends once and pick the fastest per format.
+# This imports the PDF/DOCX libraries, so it runs off the startup path; until it
+# finishes, extraction uses the registry's default backend order
+def _select_extractor_backends():
+    app.logger.info('Extractor backends: %s', select_backends())
+
+threading.Thread(target=_select_extractor_backends, name='extractor-benchmark', daemon=True).start()
+
 CORS(app)  # Enable CORS for all routes
 
 # Increase timeouts and buffer sizes
@@ -113,18 +82,29 @@ def internal_server_error(error):
 # ==============================================
 # API CONFIGURATION
 # ==============================================
-# Initialize the OpenAI client with error handling
-try:
-    client = OpenAI(
-        api_key=os.getenv('OPENAI_API_KEY'),
-        timeout=60.0,  # Increased timeout to 60 seconds
-        max_retries=3  # Allow 3 retries
-    )
-    if not os.getenv('OPENAI_API_KEY'):
-        raise ValueError("OpenAI API key is not set")
-except Exception as e:
-    app.logger.error('Error initializing OpenAI client: %s', str(e))
-    client = None
+# The OpenAI client (and the openai package, ~0.5s to import) is created on first use
+_openai_client = None
+_openai_lock = threading.Lock()
+
+def get_openai_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_lock:
+            if _openai_client is None:
+                if not os.getenv('OPENAI_API_KEY'):
+                    raise ValueError("OpenAI API key is not set")
+                from openai import OpenAI
+                _openai_client = OpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    base_url=os.getenv('OPENAI_BASE_URL') or None,  # e.g. the local stub used for load tests
+                    timeout=60.0,  # Increased timeout to 60 seconds
+                    max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 3))  # Allow 3 retries
+                )
+    return _openai_client
+
+if not os.getenv('OPENAI_API_KEY'):
+    app.logger.error('Error initializing OpenAI client: OpenAI API key is not set')
 
 # ==============================================
 # STORAGE CONFIGURATION
@@ -177,9 +157,360 @@ ALLOWED_EXTENSIONS = {'pdf', 'docx', 'doc', 'txt', 'wav'}
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Extraction sandbox: worker processes with per-file wall-clock and memory caps
+app.config['EXTRACTION_WORKERS'] = int(os.getenv('EXTRACTION_WORKERS', max(2, (os.cpu_count() or 2) // 2)))
+app.config['EXTRACTION_TIMEOUT'] = float(os.getenv('EXTRACTION_TIMEOUT', 120))
+app.config['AUDIO_EXTRACTION_TIMEOUT'] = float(os.getenv('AUDIO_EXTRACTION_TIMEOUT', 1800))
+app.config['EXTRACTION_MAX_RSS_MB'] = float(os.getenv('EXTRACTION_MAX_RSS_MB', 1024))
+
+_extraction_pool = None
+
+def get_extraction_pool():
+    """Return the shared extraction worker pool, creating it on first use."""
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ExtractionPool(
+            workers=app.config['EXTRACTION_WORKERS'],
+            timeout=app.config['EXTRACTION_TIMEOUT'],
+            timeouts={'audio': app.config['AUDIO_EXTRACTION_TIMEOUT']},
+            max_rss_mb=app.config['EXTRACTION_MAX_RSS_MB']
+        )
+        atexit.register(_extraction_pool.shutdown)
+    return _extraction_pool
+
+# Directories scanned by /ingest and, in watcher mode, watched for changes
+app.config['INGEST_DIRECTORIES'] = [d for d in os.getenv('INGEST_DIRECTORIES', 'pdfs,test_audio').split(',') if d]
+app.config['WATCH_DIRECTORIES'] = os.getenv('WATCH_DIRECTORIES', '').lower() in ('1', 'true', 'yes')
+app.config['WATCH_DEBOUNCE'] = float(os.getenv('WATCH_DEBOUNCE', 1.0))
+app.config['WATCH_POLL_INTERVAL'] = float(os.getenv('WATCH_POLL_INTERVAL', 2.0))
+
+# Ingestion lanes: slow formats are extracted by a separate background pool
+INGEST_LANES = {'audio': 'background'}
+app.config['AUDIO_EXTRACTION_WORKERS'] = int(os.getenv('AUDIO_EXTRACTION_WORKERS', 1))
+
+_audio_pool = None
+background_status = {'queued': 0, 'completed': 0, 'failed': 0}
+_background_lock = threading.Lock()
+
+def ingest_lane(extractor_type):
+    """Return 'background' for formats that should not block ingestion, else 'fast'."""
+    return INGEST_LANES.get(extractor_type, 'fast')
+
+def get_audio_pool():
+    """Return the background extraction pool used for audio transcription."""
+    global _audio_pool
+    if _audio_pool is None:
+        _audio_pool = ExtractionPool(
+            workers=app.config['AUDIO_EXTRACTION_WORKERS'],
+            timeout=app.config['AUDIO_EXTRACTION_TIMEOUT'],
+            max_rss_mb=app.config['EXTRACTION_MAX_RSS_MB'],
+            name='audio'
+        )
+        atexit.register(_audio_pool.shutdown)
+    return _audio_pool
+
+def _merge_when_done(future, corpus, directory, filename, file_type, on_done=None):
+    """Return a Future that resolves once the extracted text is merged into corpus.
+    
+    Documents that now yield no text are dropped from the corpus, so a file
+    rewritten with unreadable content does not keep serving stale text. With
+    corpus None, the text goes to the corpus that is live when extraction
+    finishes, even if /ingest published a new one meanwhile.
+    """
+    file_path = os.path.join(directory, filename)
+    merged = Future()
+    
+    def merge(done):
+        try:
+            content = done.result()
+        except Exception as e:
+            content = None
+            app.logger.error('Extraction failed for %s: %s', file_path, str(e))
+            error = e
+        else:
+            error = None
+        # Errors raised here would be swallowed by the callback machinery and leave merged unresolved
+        try:
+            target = corpus if corpus is not None else get_live_corpus()
+            if content and content.strip():
+                target.add({
+                    'filename': filename,
+                    'content': content,
+                    'directory': directory,
+                    'file_type': file_type
+                })
+                app.logger.info('Merged %s into live index', file_path)
+            else:
+                target.remove(directory, filename)
+        except Exception as e:
+            app.logger.exception('Could not merge %s into the corpus', file_path)
+            content, error = None, e
+        if on_done is not None:
+            try:
+                on_done(content)
+            except Exception as e:
+                app.logger.exception('Merge callback failed for %s', file_path)
+                error = error or e
+        if error is not None:
+            merged.set_exception(error)
+        else:
+            merged.set_result(content)
+    
+    future.add_done_callback(merge)
+    return merged
+
+def submit_background_extraction(corpus, directory, filename, file_type):
+    """Transcribe a file in the background lane and merge it into corpus (None: the live one) when done."""
+    with _background_lock:
+        background_status['queued'] += 1
+    
+    def record(content):
+        with _background_lock:
+            background_status['queued'] -= 1
+            background_status['completed' if content else 'failed'] += 1
+    
+    future = get_audio_pool().submit(os.path.join(directory, filename), get_extractor_type(filename))
+    return _merge_when_done(future, corpus, directory, filename, file_type, on_done=record)
+
+# ==============================================
+# RETRIEVAL
+# ==============================================
+# Chunks at least this similar (estimated word 3-gram Jaccard, see dedup.py) are indexed once,
+# citing every source; 0 disables near-duplicate removal
+app.config['CHUNK_DEDUP_THRESHOLD'] = float(os.getenv('CHUNK_DEDUP_THRESHOLD', 0.8))
+# What the retrieval index holds: 'chunk' (overlapping ~1000-character chunks) or 'sentence' (short sentence
+# spans, each hit expanded to SENTENCE_WINDOW spans either side at query time, see sentences.py)
+app.config['CHUNK_GRANULARITY'] = os.getenv('CHUNK_GRANULARITY', 'chunk').lower()
+app.config['SENTENCE_WINDOW'] = int(os.getenv('SENTENCE_WINDOW', 2))
+# Fitted TF-IDF index of the latest corpus snapshot, shared by /chat and batch retrieval
+chunk_index_cache = IndexCache(app.config['CHUNK_DEDUP_THRESHOLD'], app.config['CHUNK_GRANULARITY'])
+app.config['BATCH_RETRIEVAL_MAX_QUERIES'] = int(os.getenv('BATCH_RETRIEVAL_MAX_QUERIES', 10000))
+# How chunks are scored: tfidf (in-memory cosine), lsa (dense LSA vectors, see dense_index.py),
+# cascade (BM25 candidates reranked, see cascade.py) or fts5 (bm25 from the chunk store, needs CHUNK_STORE)
+app.config['RETRIEVAL_BACKEND'] = os.getenv('RETRIEVAL_BACKEND', 'tfidf').lower()
+# Cascade: BM25 candidates passed to the rerank stage, and the time budget of one query's rerank
+app.config['CASCADE_CANDIDATES'] = int(os.getenv('CASCADE_CANDIDATES', 300))
+app.config['CASCADE_BUDGET_MS'] = float(os.getenv('CASCADE_BUDGET_MS', 50))
+retrieval_cascade = Cascade(app.config['CASCADE_CANDIDATES'], app.config['CASCADE_BUDGET_MS'])
+# LSA vectors are loaded from LSA_INDEX_PATH when it matches the corpus (build it offline with
+# `python -m dense_index`), otherwise fitted on first use
+app.config['LSA_INDEX_PATH'] = os.getenv('LSA_INDEX_PATH', '')
+app.config['LSA_DIMENSIONS'] = int(os.getenv('LSA_DIMENSIONS', 256))
+app.config['LSA_DTYPE'] = os.getenv('LSA_DTYPE', 'int8')
+# From LSA_ANN_MIN_CHUNKS chunks on, LSA retrieval probes an IVF approximate nearest-neighbour index
+# (see ann_index.py) instead of scoring every chunk; LSA_ANN_NPROBE trades latency for recall
+app.config['LSA_ANN_MIN_CHUNKS'] = int(os.getenv('LSA_ANN_MIN_CHUNKS', 50000))
+app.config['LSA_ANN_LISTS'] = int(os.getenv('LSA_ANN_LISTS', 0))
+app.config['LSA_ANN_NPROBE'] = int(os.getenv('LSA_ANN_NPROBE', 32))
+# /search ranks up to SEARCH_MAX_RESULTS chunks of a query once and pages through them; the ranked lists of
+# the last SEARCH_CACHE_SIZE queries are kept until the corpus changes
+app.config['SEARCH_MAX_RESULTS'] = int(os.getenv('SEARCH_MAX_RESULTS', 100))
+app.config['SEARCH_CACHE_SIZE'] = int(os.getenv('SEARCH_CACHE_SIZE', 256))
+search_results = ResultCache(app.config['SEARCH_CACHE_SIZE'])
+
+# /suggest completes questions from past ones that found chunks (at most SUGGEST_MAX_QUESTIONS kept) and from the
+# retrieval vocabulary; SUGGEST_LOG keeps the questions across restarts as JSON lines (empty: in memory only)
+app.config['SUGGEST_MAX_QUESTIONS'] = int(os.getenv('SUGGEST_MAX_QUESTIONS', 50000))
+app.config['SUGGEST_LOG'] = os.getenv('SUGGEST_LOG', '')
+suggester = Suggester(app.config['SUGGEST_MAX_QUESTIONS'], app.config['SUGGEST_LOG'])
+
+# ==============================================
+# METRICS
+# ==============================================
+def _index_stat(stat):
+    index = chunk_index_cache.index
+    return stat(index) if index is not None else None
+
+metrics.gauge('rag_index_chunks', 'Chunks in the current retrieval index',
+              func=lambda: _index_stat(lambda index: len(index.chunks)))
+metrics.gauge('rag_index_vocabulary_terms', 'Terms in the current TF-IDF vocabulary',
+              func=lambda: _index_stat(lambda index: index.vocabulary_size))
+metrics.gauge('rag_index_memory_bytes', 'Memory held by the current retrieval index arrays',
+              func=lambda: _index_stat(lambda index: index.memory_bytes))
+metrics.gauge('rag_dense_index_memory_bytes', 'Memory held by the LSA vectors of the current index',
+              func=lambda: _index_stat(lambda index: index.lsa.memory_bytes if getattr(index, 'lsa', None) else None))
+
+def _corpus_documents():
+    return list(getattr(app, 'processed_documents', None) or [])
+
+metrics.gauge('rag_corpus_documents', 'Documents in the published corpus',
+              func=lambda: len(_corpus_documents()))
+metrics.gauge('rag_corpus_chars', 'Characters of text in the published corpus',
+              func=lambda: sum(len(doc['content']) for doc in _corpus_documents()))
+metrics.gauge('rag_extraction_cache_chars', 'Characters held by the extraction cache',
+              func=lambda: extractors.cache.chars)
+metrics.gauge('rag_extraction_cache_lookups', 'Extraction cache lookups since startup', ('result',),
+              func=lambda: {('hit',): extractors.cache.hits, ('miss',): extractors.cache.misses})
+metrics.gauge('rag_search_cache_lookups', 'Search result cache lookups since startup', ('result',),
+              func=lambda: {('hit',): search_results.hits, ('miss',): search_results.misses})
+metrics.gauge('rag_suggest_questions', 'Distinct past questions offered as completions',
+              func=lambda: suggester.question_count)
+metrics.gauge('rag_extraction_pool_tasks', 'Extraction pool task and worker counts since startup',
+              ('pool', 'event'),
+              func=lambda: {(pool.name, event): count
+                            for pool in (_extraction_pool, _audio_pool) if pool is not None
+                            for event, count in pool.stats.items()})
+metrics.gauge('rag_background_extractions', 'Background lane files by state', ('state',),
+              func=lambda: {(state,): count for state, count in background_status.items()})
+
+# ==============================================
+# REQUEST PROFILING
+# ==============================================
+# Opt-in per request (X-Profile / ?profile=) and only with the PROFILING_TOKEN secret;
+# leaving PROFILING_TOKEN unset disables profiling and the /profiles endpoints
+app.config['PROFILING_TOKEN'] = os.getenv('PROFILING_TOKEN', '')
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join('logs', 'profiles'))
+app.config['PROFILE_KEEP'] = int(os.getenv('PROFILE_KEEP', 20))
+app.config['PROFILE_SAMPLE_INTERVAL'] = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+profile_store = ProfileStore(app.config['PROFILE_DIR'], keep=app.config['PROFILE_KEEP'])
+_profiling_pool = None
+
+def get_profiling_pool():
+    """Inline extraction pool for profiled requests, so extractor time lands in their profile."""
+    global _profiling_pool
+    if _profiling_pool is None:
+        _profiling_pool = ExtractionPool(workers=0, name='profiling')
+    return _profiling_pool
+
+def profiled(operation):
+    """Profile the decorated view when the request asks for it with a valid token."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = requested_mode(request, app.config['PROFILING_TOKEN'])
+            if mode is None:
+                return view(*args, **kwargs)
+            profile = RequestProfile(operation, mode, app.config['PROFILE_SAMPLE_INTERVAL'])
+            g.profile = profile
+            meta = {'method': request.method, 'path': request.path}
+            
+            def save():
+                try:
+                    profile.save(profile_store, **meta)
+                except Exception as e:
+                    app.logger.error('Could not save profile %s: %s', profile.id, str(e))
+            
+            profile.resume()
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                # Release the cProfile slot and stop the sampler thread before the error propagates
+                profile.finish()
+                save()
+                raise
+            profile.pause()
+            response.headers['X-Profile-Id'] = profile.id
+            meta['status'] = response.status_code
+            if response.is_streamed:
+                # Keep profiling while the body is generated, then save
+                response.response = profile_iterable(profile, response.response, save)
+            else:
+                profile.finish()
+                save()
+            return response
+        return wrapper
+    return decorator
+
+def _require_profiling_token():
+    token = request.headers.get('X-Profile-Token') or request.args.get('profile_token')
+    if not authorized(token, app.config['PROFILING_TOKEN']):
+        abort(404)
+
+@app.route('/profiles')
+def list_profiles():
+    """List the saved request profiles, newest first."""
+    _require_profiling_token()
+    return jsonify({'profiles': profile_store.list()})
+
+@app.route('/profiles/<name>')
+def download_profile(name):
+    """Download a saved .pstats, .collapsed or .json profile file."""
+    _require_profiling_token()
+    path = profile_store.path_for(name)
+    if path is None:
+        abort(404)
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=name)
+
+# ==============================================
+# PERSISTENT CHUNK STORE
+# ==============================================
+# Optional SQLite/FTS5 copy of the corpus (CHUNK_STORE=path/to/chunks.db): the corpus is
+# restored from it on startup, and with RETRIEVAL_BACKEND=fts5 retrieval ranks its chunks
+# with bm25 instead of fitting TF-IDF in memory
+app.config['CHUNK_STORE'] = os.getenv('CHUNK_STORE', '')
+
+chunk_store = None
+if app.config['CHUNK_STORE']:
+    try:
+        chunk_store = ChunkStore(app.config['CHUNK_STORE'], split_text_into_chunks, tokenize)
+    except ChunkStoreError as e:
+        app.logger.error('%s; running without a chunk store', e)
+if app.config['RETRIEVAL_BACKEND'] == 'fts5' and chunk_store is None:
+    app.logger.warning('RETRIEVAL_BACKEND=fts5 needs CHUNK_STORE; using TF-IDF retrieval')
+
+metrics.gauge('rag_chunk_store_rows', 'Rows in the persistent chunk store', ('table',),
+              func=lambda: {(table,): count for table, count in chunk_store.stats().items() if table != 'bytes'}
+              if chunk_store is not None else {})
+
+def create_corpus(documents=None):
+    """Create a Corpus whose changes are written through to the chunk store, if enabled."""
+    corpus = Corpus(documents)
+    if chunk_store is not None:
+        corpus.subscribe(chunk_store.on_corpus_change)
+    return corpus
+
+def publish_corpus(corpus):
+    """Make corpus the one /chat answers from; the chunk store drops documents it no longer has."""
+    app.processed_documents = corpus
+    if chunk_store is not None:
+        chunk_store.retain(Corpus.key_for(doc) for doc in corpus)
+
+def get_live_corpus():
+    """Return the published corpus, creating an empty one if nothing is loaded yet."""
+    corpus = getattr(app, 'processed_documents', None)
+    if not isinstance(corpus, Corpus):
+        corpus = create_corpus(corpus or [])
+        app.processed_documents = corpus
+    return corpus
+
+if chunk_store is not None:
+    stored_documents = chunk_store.documents()
+    if stored_documents:
+        app.processed_documents = create_corpus(stored_documents)
+        app.logger.info('Restored %d documents from chunk store %s', len(stored_documents), app.config['CHUNK_STORE'])
+
+def search_chunk_store(query, max_chunks=10, filters=None):
+    """bm25 keyword retrieval from the chunk store, favouring one chunk per source first."""
+    candidates = chunk_store.search(query, max_chunks * 2, filters)
+    first, rest, seen = [], [], set()
+    for chunk in candidates:
+        (rest if chunk['source'] in seen else first).append(chunk)
+        seen.add(chunk['source'])
+    relevant_chunks = (first + rest)[:max_chunks]
+    relevant_chunks.sort(key=lambda chunk: chunk['similarity'], reverse=True)
+    return relevant_chunks
+
+def ingest_file(directory, filename, corpus=None):
+    """Extract a single file through its lane and merge it into the live corpus.
+    
+    Returns a Future that resolves to the extracted text once the document is
+    searchable (or None if no text could be extracted). Without a corpus, the
+    live one is looked up when extraction finishes.
+    """
+    extractor_type = get_extractor_type(filename)
+    file_type = 'audio' if is_whatsapp_audio(filename) else filename.split('.')[-1].lower()
+    if ingest_lane(extractor_type) == 'background':
+        return submit_background_extraction(corpus, directory, filename, file_type)
+    future = get_extraction_pool().submit(os.path.join(directory, filename), extractor_type)
+    return _merge_when_done(future, corpus, directory, filename, file_type)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Content hashes of everything already in the upload folder, for upload dedupe
+upload_hashes = ContentHashIndex(UPLOAD_FOLDER, file_filter=allowed_file)
+
 def is_whatsapp_audio(filename):
     """Check if a file is a WhatsApp audio file based on name pattern or content."""
     return ('whatsapp audio' in filename.lower() or 
@@ -187,6 +518,7 @@ def is_whatsapp_audio(filename):
 
 def convert_to_wav(input_path, output_path):
     """Convert audio file to WAV format using pydub."""
+    AudioSegment = configure_pydub()
     try:
         # For WhatsApp audio files or .dat files, try to process as MP4 container
         if input_path.endswith('.dat') or is_whatsapp_audio(input_path):
@@ -216,252 +548,319 @@ def process_audio_file(file_path):
         if not file_path.lower().endswith(('.wav', '.mp3', '.dat')):
             raise Exception("Unsupported audio format")
             
-        # Process the audio file directly
-        result = process_document_directory(os.path.dirname(file_path))
-        
-        # Find our processed file in the results
-        filename = os.path.basename(file_path)
-        for doc in result:
-            if os.path.basename(doc['filename']) == filename:
-                return doc['content']
-        
-        return None
+        # Process just this file through the extractor registry
+        return extract_text(file_path, 'audio')
     except Exception as e:
         app.logger.error('Error in process_audio_file: %s', str(e))
         raise
 
-def split_text_into_chunks(text, chunk_size=1000, overlap=200):
-    """Split text into overlapping chunks for better context retrieval."""
-    if not text:
-        return []
-    
-    # Split by paragraphs first
-    paragraphs = re.split(r'\n\s*\n', text)
-    chunks = []
-    current_chunk = ""
-    
-    for paragraph in paragraphs:
-        # Clean the paragraph
-        paragraph = paragraph.strip()
-        if not paragraph:
-            continue
-            
-        # If adding this paragraph would exceed chunk_size, save current chunk and start a new one
-        if len(current_chunk) + len(paragraph) > chunk_size and current_chunk:
-            # Add the current chunk
-            chunks.append(current_chunk.strip())
-            
-            # Keep some overlap for context
-            overlap_text = current_chunk[-overlap:] if len(current_chunk) > overlap else current_chunk
-            
-            # Start new chunk with overlap
-            current_chunk = overlap_text + "\n\n" + paragraph
-        else:
-            # Add paragraph to current chunk
-            current_chunk += "\n\n" + paragraph if current_chunk else paragraph
-    
-    # Add the last chunk if it's not empty
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    # Post-process chunks to ensure they're meaningful
-    processed_chunks = []
-    for chunk in chunks:
-        # Remove excessive whitespace
-        chunk = re.sub(r'\s+', ' ', chunk).strip()
-        
-        # Skip chunks that are too short
-        if len(chunk) < 50:  # Minimum length threshold
-            continue
-            
-        # Skip chunks that are just numbers or special characters
-        if re.match(r'^[\d\s\W]+$', chunk):
-            continue
-            
-        processed_chunks.append(chunk)
-    
-    return processed_chunks
+def dense_retrieval(index, subset=None):
+    """(scorer, nearest) arguments of index.search for RETRIEVAL_BACKEND=lsa; (None, None) is TF-IDF cosine.
+
+    The LSA index is saved to LSA_INDEX_PATH whenever it changes, so it is
+    extended rather than refitted after a restart. Filtered searches (a
+    subset) score their rows exactly rather than through the ANN index.
+    """
+    if app.config['RETRIEVAL_BACKEND'] != 'lsa':
+        return None, None
+    from dense_index import lsa_for
+    lsa = lsa_for(index, app.config['LSA_INDEX_PATH'], app.config['LSA_DIMENSIONS'], app.config['LSA_DTYPE'],
+                  ann_min_chunks=app.config['LSA_ANN_MIN_CHUNKS'], ann_lists=app.config['LSA_ANN_LISTS'],
+                  persist=True)
+    if lsa is None:
+        return None, None
+    if lsa.ann is not None and subset is None:
+        nprobe = app.config['LSA_ANN_NPROBE']
+        return None, lambda queries, k: lsa.nearest(queries, k, nprobe)
+    return lsa.scores, None
+
+def expand_hits(index, relevant_chunks):
+    """Sentence-granular hits grown into merged windows of their documents; chunks are returned as they are."""
+    if index.granularity != 'sentence':
+        return relevant_chunks
+    return expand_windows(index, relevant_chunks, app.config['SENTENCE_WINDOW'])
 
-def find_relevant_chunks(query, documents, max_chunks=10):
-    """Find the most relevant chunks from documents based on the query."""
+def find_relevant_chunks(query, documents, max_chunks=10, filters=None):
+    """Find the most relevant chunks from documents based on the query.
+
+    filters (see facets.parse_filters) restrict the search to the chunks of
+    matching documents.
+    """
     if not documents or not query:
         return []
     
-    # Prepare documents for vectorization
-    all_chunks = []
-    chunk_sources = []
-    chunk_docs = []  # Track which document each chunk came from
-    
-    # Preprocess query to extract key terms
-    query_terms = set(query.lower().split())
-    query_terms = {term for term in query_terms if len(term) > 3}  # Remove short words
-    
-    for doc in documents:
-        # Split document content into chunks
-        chunks = split_text_into_chunks(doc['content'])
-        all_chunks.extend(chunks)
-        chunk_sources.extend([doc['filename']] * len(chunks))
-        chunk_docs.extend([doc['filename']] * len(chunks))
+    if app.config['RETRIEVAL_BACKEND'] == 'fts5' and chunk_store is not None:
+        return search_chunk_store(query, max_chunks, filters)
     
-    if not all_chunks:
+    # The fitted index is reused until the corpus changes
+    index = chunk_index_cache.get(documents)
+    if not index.chunks:
         return []
-    
-    # Create TF-IDF vectors with custom parameters
-    vectorizer = TfidfVectorizer(
-        stop_words='english',
-        max_features=5000,  # Limit vocabulary size
-        ngram_range=(1, 2),  # Include word pairs
-        min_df=2,  # Minimum document frequency
-        max_df=0.95  # Maximum document frequency
-    )
+    subset = index.subset(filters)
+    # Quoted phrases and NEAR/k leave only the chunks meeting them to be scored (see positional.py)
+    parsed = parse_query(query)
+    if parsed.constrained:
+        query, subset = parsed.text, constrain(index, parsed, subset)
     
     try:
-        # Fit and transform the documents
-        tfidf_matrix = vectorizer.fit_transform(all_chunks)
-        query_vector = vectorizer.transform([query])
-        
-        # Calculate cosine similarity
-        similarities = cosine_similarity(query_vector, tfidf_matrix).flatten()
-        
-        # Get top chunks
-        top_indices = similarities.argsort()[-max_chunks*2:][::-1]  # Get more chunks initially
-        
-        # Return relevant chunks with their sources, ensuring document diversity
-        relevant_chunks = []
-        used_docs = set()  # Track which documents we've already included
-        
-        # First pass: include at least one chunk from each document if similarity is above threshold
-        for idx in top_indices:
-            doc_name = chunk_docs[idx]
-            if similarities[idx] > 0.05 and doc_name not in used_docs:  # Lower threshold for document diversity
-                # Check if chunk contains query terms
-                chunk_text = all_chunks[idx].lower()
-                term_matches = sum(1 for term in query_terms if term in chunk_text)
-                
-                if term_matches > 0:  # Only include if it matches query terms
-                    relevant_chunks.append({
-                        'content': all_chunks[idx],
-                        'source': chunk_sources[idx],
-                        'similarity': float(similarities[idx]),
-                        'term_matches': term_matches
-                    })
-                    used_docs.add(doc_name)
-        
-        # Second pass: fill remaining slots with highest similarity chunks
-        for idx in top_indices:
-            if len(relevant_chunks) >= max_chunks:
-                break
-                
-            if similarities[idx] > 0.05:  # Lower threshold for general chunks
-                # Check if this chunk is already included
-                chunk_content = all_chunks[idx]
-                if not any(chunk['content'] == chunk_content for chunk in relevant_chunks):
-                    # Check if chunk contains query terms
-                    chunk_text = chunk_content.lower()
-                    term_matches = sum(1 for term in query_terms if term in chunk_text)
-                    
-                    if term_matches > 0:  # Only include if it matches query terms
-                        relevant_chunks.append({
-                            'content': chunk_content,
-                            'source': chunk_sources[idx],
-                            'similarity': float(similarities[idx]),
-                            'term_matches': term_matches
-                        })
-        
-        # Sort by similarity and term matches
-        relevant_chunks.sort(key=lambda x: (x['similarity'], x['term_matches']), reverse=True)
-        
-        # Log the sources being used
-        sources_used = set(chunk['source'] for chunk in relevant_chunks)
-        app.logger.info(f"Using content from {len(sources_used)} sources: {', '.join(sources_used)}")
-        app.logger.info(f"Found {len(relevant_chunks)} relevant chunks with similarity scores ranging from {min(chunk['similarity'] for chunk in relevant_chunks):.3f} to {max(chunk['similarity'] for chunk in relevant_chunks):.3f}")
-        
-        return relevant_chunks
+        if app.config['RETRIEVAL_BACKEND'] == 'cascade':
+            relevant_chunks = retrieval_cascade.search(index, query, max_chunks, subset)
+        else:
+            relevant_chunks = index.search(query, max_chunks, *dense_retrieval(index, subset), subset=subset)
     except Exception as e:
         app.logger.error('Error in find_relevant_chunks: %s', str(e))
         # Fallback to simple keyword matching if vectorization fails
-        return simple_keyword_matching(query, all_chunks, chunk_sources, max_chunks)
+        return expand_hits(index, index.keyword_search(query, max_chunks, subset))
+    relevant_chunks = expand_hits(index, relevant_chunks)
+    
+    # Log the sources being used (chunks are sorted by similarity, best first)
+    if relevant_chunks and app.logger.isEnabledFor(logging.INFO):
+        sources_used = sorted({chunk['source'] for chunk in relevant_chunks})
+        app.logger.info('Using content from %d sources: %s', len(sources_used), sources_used)
+        app.logger.info('Found %d relevant chunks with similarity scores ranging from %.3f to %.3f',
+                        len(relevant_chunks), relevant_chunks[-1]['similarity'], relevant_chunks[0]['similarity'])
+    
+    return relevant_chunks
 
-def simple_keyword_matching(query, chunks, sources, max_chunks=10):
-    """Simple keyword matching as a fallback for finding relevant chunks."""
-    query_words = set(query.lower().split())
-    chunk_scores = []
+def find_relevant_chunks_batch(queries, documents, max_chunks=10, filters=None):
+    """Find the relevant chunks for many queries, scoring them in one matrix product."""
+    if not documents or not queries:
+        return [[] for _ in queries]
     
-    for i, chunk in enumerate(chunks):
-        chunk_words = set(chunk.lower().split())
-        # Calculate simple overlap score
-        score = len(query_words.intersection(chunk_words)) / len(query_words) if query_words else 0
-        chunk_scores.append((score, i))
+    if app.config['RETRIEVAL_BACKEND'] == 'fts5' and chunk_store is not None:
+        return [search_chunk_store(query, max_chunks, filters) if query else [] for query in queries]
     
-    # Sort by score and get top chunks
-    chunk_scores.sort(reverse=True)
-    top_indices = [idx for score, idx in chunk_scores[:max_chunks] if score > 0]
+    index = chunk_index_cache.get(documents)
+    subset = index.subset(filters)
+    # Empty queries get no chunks, as in find_relevant_chunks
+    asked = [i for i, query in enumerate(queries) if query]
+    # Queries with phrases or NEAR/k each score their own chunks, so they are searched one at a time
+    parsed = {i: parse_query(queries[i]) for i in asked}
+    plain = [i for i in asked if not parsed[i].constrained]
+    results = [[] for _ in queries]
+    if app.config['RETRIEVAL_BACKEND'] == 'cascade':
+        batch = retrieval_cascade.search_batch(index, [queries[i] for i in plain], max_chunks, subset)
+    else:
+        batch = index.search_batch([queries[i] for i in plain], max_chunks, *dense_retrieval(index, subset),
+                                   subset=subset)
+    for i, relevant_chunks in zip(plain, batch):
+        results[i] = expand_hits(index, relevant_chunks)
+    for i in asked:
+        if parsed[i].constrained:
+            constrained = constrain(index, parsed[i], subset)
+            if app.config['RETRIEVAL_BACKEND'] == 'cascade':
+                relevant_chunks = retrieval_cascade.search(index, parsed[i].text, max_chunks, constrained)
+            else:
+                relevant_chunks = index.search(parsed[i].text, max_chunks, *dense_retrieval(index, constrained),
+                                               subset=constrained)
+            results[i] = expand_hits(index, relevant_chunks)
+    app.logger.info('Batch retrieval: %d queries over %d chunks', len(queries), len(index.chunks))
+    return results
+
+@app.route('/')
+def home():
+    return render_template('index.html')
+
+@app.route('/health')
+def health():
+    """Liveness/readiness probe; touches no files and imports nothing heavy."""
+    return jsonify({
+        'status': 'ok',
+        'uptime_seconds': round(time.time() - STARTUP_REPORT['started'], 3),
+        'startup_ms': STARTUP_REPORT['total_ms'],
+        'documents': len(_corpus_documents()),
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint: request/stage/extractor histograms, corpus and index gauges."""
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/retrieve/batch', methods=['POST'])
+@profiled('retrieve_batch')
+@metrics.traced('retrieve_batch')
+def retrieve_batch():
+    """Retrieve chunks for a list of queries (evaluation and pre-warming jobs), no model call."""
+    if not hasattr(app, 'processed_documents') or not app.processed_documents:
+        return jsonify({'error': 'Please process documents first'}), 400
     
-    # Return relevant chunks with their sources
-    relevant_chunks = []
-    used_sources = set()  # Track which sources we've already included
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return jsonify({'error': 'queries must be a list of strings'}), 400
+    if len(queries) > app.config['BATCH_RETRIEVAL_MAX_QUERIES']:
+        return jsonify({'error': f"At most {app.config['BATCH_RETRIEVAL_MAX_QUERIES']} queries per request"}), 400
+    max_chunks = data.get('max_chunks', 10)
+    if not isinstance(max_chunks, int) or not 1 <= max_chunks <= 100:
+        return jsonify({'error': 'max_chunks must be an integer between 1 and 100'}), 400
+    try:
+        filters = parse_filters(data.get('filters'))
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # First pass: include at least one chunk from each source
-    for score, idx in chunk_scores:
-        if len(relevant_chunks) >= max_chunks:
-            break
-            
-        source = sources[idx]
-        if source not in used_sources and score > 0.05:  # Lower threshold for source diversity
-            relevant_chunks.append({
-                'content': chunks[idx],
-                'source': source,
-                'similarity': score
-            })
-            used_sources.add(source)
+    documents = list(app.processed_documents)
+    with metrics.span('retrieval'):
+        results = find_relevant_chunks_batch(queries, documents, max_chunks, filters)
+    return jsonify({
+        'documents': len(documents),
+        'results': [{'query': query, 'chunks': chunks} for query, chunks in zip(queries, results)]
+    })
+
+def locate_chunks(chunks, documents):
+    """Set the (start, end) 'offsets' of every chunk in its source document's text, if not already found."""
+    by_name = None
+    for chunk in chunks:
+        if 'offsets' in chunk:
+            continue
+        if by_name is None:
+            by_name = {}
+            for doc in documents:
+                by_name.setdefault(doc['filename'], doc)
+                by_name[(doc.get('directory', ''), doc['filename'])] = doc
+        # Chunk store results know their directory; in-memory ones only their filename
+        doc = by_name.get((chunk['directory'], chunk['source'])) if 'directory' in chunk else None
+        doc = doc or by_name.get(chunk['source'])
+        chunk['offsets'] = locate_chunk(doc['content'], chunk['content']) if doc else None
+
+@app.route('/search', methods=['POST'])
+@profiled('search')
+@metrics.traced('search')
+def search():
+    """Ranked chunks of one query with scores, sources and offsets, no model call; paged with cursors.
     
-    # Second pass: fill remaining slots with highest scoring chunks
-    for score, idx in chunk_scores:
-        if len(relevant_chunks) >= max_chunks:
-            break
-            
-        if score > 0.05:  # Lower threshold for general chunks
-            # Check if this chunk is already included
-            chunk_content = chunks[idx]
-            if not any(chunk['content'] == chunk_content for chunk in relevant_chunks):
-                relevant_chunks.append({
-                    'content': chunk_content,
-                    'source': sources[idx],
-                    'similarity': score
-                })
+    The first request sends the query (and optional filters and page_size);
+    later pages send only the previous response's next_cursor.
+    """
+    if not hasattr(app, 'processed_documents') or not app.processed_documents:
+        return jsonify({'error': 'Please process documents first'}), 400
     
-    # Log the sources being used
-    sources_used = set(chunk['source'] for chunk in relevant_chunks)
-    app.logger.info(f"Using content from {len(sources_used)} sources (keyword matching): {', '.join(sources_used)}")
+    data = request.get_json(silent=True) or {}
+    cursor = data.get('cursor')
+    try:
+        if cursor is not None:
+            if not isinstance(cursor, str):
+                raise CursorError('Invalid cursor')
+            query, filters, page_size, offset = decode_cursor(cursor)
+            page_size = data.get('page_size', page_size)
+        else:
+            query, filters, page_size, offset = data.get('query'), data.get('filters'), data.get('page_size', 10), 0
+        filters = parse_filters(filters)
+    except (CursorError, FilterError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not isinstance(query, str) or not query.strip():
+        return jsonify({'error': 'query must be a non-empty string'}), 400
+    if not isinstance(page_size, int) or isinstance(page_size, bool) or not 1 <= page_size <= 100:
+        return jsonify({'error': 'page_size must be an integer between 1 and 100'}), 400
     
-    return relevant_chunks
+    documents = list(app.processed_documents)
+    max_results = app.config['SEARCH_MAX_RESULTS']
+    with metrics.span('retrieval'):
+        # Only the first page of a query searches; the following ones slice the cached list
+        results = search_results.get(documents, (app.config['RETRIEVAL_BACKEND'], query, filters),
+                                     lambda: find_relevant_chunks(query, documents, max_results, filters))
+    if cursor is None and results:
+        suggester.record(query)
+    page = results[offset:offset + page_size]
+    with metrics.span('offsets'):
+        locate_chunks(page, documents)
+    next_offset = offset + len(page)
+    return jsonify({
+        'query': query,
+        'total': len(results),
+        'offset': offset,
+        'results': [{
+            'rank': offset + rank,
+            'score': chunk['similarity'],
+            'content': chunk['content'],
+            'source': chunk['source'],
+            'sources': chunk.get('sources') or [chunk['source']],
+            'start': chunk['offsets'][0] if chunk['offsets'] else None,
+            'end': chunk['offsets'][1] if chunk['offsets'] else None,
+        } for rank, chunk in enumerate(page, 1)],
+        'next_cursor': encode_cursor(query, filters, page_size, next_offset) if next_offset < len(results) else None,
+    })
 
-@app.route('/')
-def home():
-    return render_template('index.html')
+def retrieval_vocabulary(documents):
+    """Number of chunks containing each term the configured backend indexes."""
+    if app.config['RETRIEVAL_BACKEND'] == 'fts5' and chunk_store is not None:
+        return chunk_store.vocabulary()
+    return chunk_index_cache.get(documents).chunk_frequencies()
+
+@app.route('/suggest')
+@metrics.traced('suggest')
+def suggest():
+    """Completions of a partly typed question (?q=): past questions, then vocabulary terms for its last word."""
+    text = request.args.get('q', '')
+    limit = request.args.get('limit', 8)
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= 20:
+        return jsonify({'error': 'limit must be an integer between 1 and 20'}), 400
+    
+    documents = _corpus_documents()
+    vocabulary = None
+    if documents:
+        # Built once per corpus snapshot, with the retrieval index it comes from
+        with metrics.span('vocabulary'):
+            vocabulary = suggester.vocabulary(documents, lambda: retrieval_vocabulary(documents))
+    with metrics.span('complete'):
+        suggestions = suggester.suggest(text, limit, vocabulary)
+    return jsonify({'query': text, 'suggestions': suggestions})
 
 @app.route('/ingest')
+@profiled('ingest')
 def ingest_documents():
     """Process documents from both pdfs and test_audio directories."""
     def generate():
-        # Process both directories
-        directories = ['pdfs', 'test_audio']
+        # Stage timings for this run; the body yields, so spans wrap only the work between events
+        trace = metrics.Trace('ingest')
+        try:
+            yield from run(trace)
+        except BaseException:
+            trace.status = 'error'
+            raise
+        finally:
+            trace.finish()
+    
+    def run(trace):
+        # Process the configured directories (pdfs and test_audio by default)
+        directories = app.config['INGEST_DIRECTORIES']
         total_files = 0
-        processed_files = 0
         
         # First, count total files across all directories
-        for directory in directories:
-            if os.path.exists(directory):
-                files = [f for f in os.listdir(directory) if allowed_file(f) and os.path.isfile(os.path.join(directory, f))]
-                total_files += len(files)
+        with trace.span('scan'):
+            for directory in directories:
+                if os.path.exists(directory):
+                    files = [f for f in os.listdir(directory) if allowed_file(f) and os.path.isfile(os.path.join(directory, f))]
+                    total_files += len(files)
         
-        # Clear any previously processed documents
-        if hasattr(app, 'processed_documents'):
-            app.processed_documents = []
+        # Build the new corpus off to the side so /chat keeps answering from the
+        # current one; if nothing is published yet, publish it right away so
+        # each document becomes searchable the moment it is extracted
+        corpus = create_corpus()
+        live = None
+        recorder = ChangeRecorder()
+        if not getattr(app, 'processed_documents', None):
+            publish_corpus(corpus)
         else:
-            app.processed_documents = []
+            # Uploads, watcher changes and transcripts merged into the live corpus meanwhile are carried over
+            live = get_live_corpus()
+            live.subscribe(recorder)
+        try:
+            yield from build(trace, corpus, live, recorder, total_files)
+        finally:
+            if live is not None:
+                live.unsubscribe(recorder)
+    
+    def build(trace, corpus, live, recorder, total_files):
+        directories = app.config['INGEST_DIRECTORIES']
+        processed_files = 0
             
         overall_file_count = 0  # Counter for all files across directories
+        completed_file_count = 0  # Counter for files that have finished extracting
+        background_files = 0  # Files handed to the background (audio) lane
         
         for directory in directories:
             if not os.path.exists(directory):
@@ -472,121 +871,218 @@ def ingest_documents():
             yield f"data: {json.dumps({'type': 'status', 'message': f'Processing directory: {directory}'})}\n\n"
             
             # Get list of files in directory
-            files = [f for f in os.listdir(directory) if allowed_file(f) and os.path.isfile(os.path.join(directory, f))]
+            with trace.span('scan'):
+                files = [f for f in os.listdir(directory) if allowed_file(f) and os.path.isfile(os.path.join(directory, f))]
             
             # Send directory start message
             yield f"data: {json.dumps({'status': 'directory_start', 'message': f'Starting to process {len(files)} files from {directory}', 'directory': directory})}\n\n"
             
-            # Process each file and send progress updates
-            for idx, filename in enumerate(files, 1):
+            # Fast formats go to the sandboxed worker pool and are awaited here;
+            # audio is handed to the background lane and merged when transcribed.
+            # Profiled runs extract inline so the extractors show up in the profile
+            pool = get_profiling_pool() if g.get('profile') else get_extraction_pool()
+            futures = {}
+            for filename in files:
                 overall_file_count += 1
                 file_path = os.path.join(directory, filename)
-                
-                try:
-                    file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-                except Exception as e:
-                    app.logger.error('Error getting file size for %s: %s', file_path, str(e))
-                    file_size_mb = 0
-                
                 file_type = filename.split('.')[-1].lower()
+                extractor_type = get_extractor_type(filename)
                 
                 # Convert .dat to audio type if it's a WhatsApp audio
                 if is_whatsapp_audio(filename):
                     file_type = 'audio'
                 
-                # Send file processing start
-                progress = {
-                    'status': 'processing',
-                    'message': f'Processing {file_type.upper()} file: {filename}',
+                event = {
                     'current': overall_file_count,
                     'total': total_files,
                     'directory': directory,
                     'file_type': file_type,
                     'filename': filename
                 }
-                yield f"data: {json.dumps(progress)}\n\n"
                 
+                if ingest_lane(extractor_type) == 'background':
+                    background_files += 1
+                    completed_file_count += 1
+                    submit_background_extraction(corpus, directory, filename, file_type)
+                    event.update(status='file_queued',
+                                 message=f'Transcribing {file_type.upper()} file in the background: {filename}')
+                    yield f"data: {json.dumps(event)}\n\n"
+                    continue
+                
+                # Send file processing start
+                event.update(status='processing', message=f'Processing {file_type.upper()} file: {filename}')
+                yield f"data: {json.dumps(event)}\n\n"
+                
+                app.logger.info('Queueing %s for extraction', file_path)
+                with trace.span('submit'):
+                    futures[pool.submit(file_path, extractor_type)] = (filename, file_type)
+            
+            # Report files as they finish; a hung or crashing file only costs its own worker.
+            # 'extract' is the time spent waiting on the pool, not the workers' total CPU time
+            completed = as_completed(futures)
+            while True:
+                with trace.span('extract'):
+                    future = next(completed, None)
+                if future is None:
+                    break
+                completed_file_count += 1
+                filename, file_type = futures[future]
+                event = {
+                    'current': completed_file_count,
+                    'total': total_files,
+                    'directory': directory,
+                    'file_type': file_type,
+                    'filename': filename
+                }
                 try:
-                    content = None
-                    
-                    if filename.lower().endswith('.pdf'):
-                        app.logger.info('Processing PDF file: %s', file_path)
-                        content = extract_text_from_pdf(file_path)
-                    elif filename.lower().endswith('.docx'):
-                        app.logger.info('Processing DOCX file: %s', file_path)
-                        content = extract_text_from_docx(file_path)
-                    elif filename.lower().endswith('.doc'):
-                        app.logger.info('Processing DOC file: %s', file_path)
-                        content = extract_text_from_doc(file_path)
-                    elif filename.lower().endswith('.txt'):
-                        app.logger.info('Processing TXT file: %s', file_path)
-                        content = extract_text_from_txt(file_path)
-                    elif filename.lower().endswith(('.wav', '.mp3')) or is_whatsapp_audio(filename):
-                        app.logger.info('Processing audio file: %s', file_path)
-                        content = process_audio_file(file_path)
-                    
-                    if content and content.strip():
-                        processed_files += 1
-                        app.processed_documents.append({
+                    content = future.result()
+                except ExtractionError as e:
+                    app.logger.error('Error processing file %s: %s', os.path.join(directory, filename), str(e))
+                    event.update(status='file_error',
+                                 message=f'Error processing {file_type.upper()} file {filename}: {str(e)}')
+                    yield f"data: {json.dumps(event)}\n\n"
+                    continue
+                
+                if content and content.strip():
+                    processed_files += 1
+                    with trace.span('merge'):
+                        corpus.add({
                             'filename': filename,
                             'content': content,
                             'directory': directory,
                             'file_type': file_type
                         })
-                        
-                        # Send success message
-                        success = {
-                            'status': 'file_complete',
-                            'message': f'Successfully processed {file_type.upper()} file: {filename}',
-                            'current': overall_file_count,
-                            'total': total_files,
-                            'directory': directory,
-                            'file_type': file_type,
-                            'filename': filename
-                        }
-                        yield f"data: {json.dumps(success)}\n\n"
-                    else:
-                        # Send error message for no content
-                        error = {
-                            'status': 'file_error',
-                            'message': f'Failed to process {file_type.upper()} file: {filename} - No content extracted',
-                            'current': overall_file_count,
-                            'total': total_files,
-                            'directory': directory,
-                            'file_type': file_type,
-                            'filename': filename
-                        }
-                        yield f"data: {json.dumps(error)}\n\n"
-                        
-                except Exception as e:
-                    app.logger.error('Error processing file %s: %s', file_path, str(e))
-                    error = {
-                        'status': 'file_error',
-                        'message': f'Error processing {file_type.upper()} file {filename}: {str(e)}',
-                        'current': overall_file_count,
-                        'total': total_files,
-                        'directory': directory,
-                        'file_type': file_type,
-                        'filename': filename
-                    }
-                    yield f"data: {json.dumps(error)}\n\n"
-                    continue
+                    event.update(status='file_complete',
+                                 message=f'Successfully processed {file_type.upper()} file: {filename}')
+                else:
+                    event.update(status='file_error',
+                                 message=f'Failed to process {file_type.upper()} file: {filename} - No content extracted')
+                yield f"data: {json.dumps(event)}\n\n"
             
             # Send directory completion message
             yield f"data: {json.dumps({'status': 'directory_complete', 'message': f'Completed processing {directory} ({len(files)} files)', 'directory': directory})}\n\n"
         
+        # Publish the text documents; audio transcripts keep arriving in the background
+        if live is not None:
+            recorder.replay(corpus)
+            publish_corpus(corpus)
+            # Merges that picked the old corpus just before it was replaced
+            live.unsubscribe(recorder)
+            if recorder.replay(corpus):
+                publish_corpus(corpus)
+        else:
+            publish_corpus(corpus)
+        
         # Send final completion message
+        message = f'Processing Complete: Successfully processed {processed_files} out of {total_files} files'
+        if background_files:
+            message += f' ({background_files} audio files are transcribing in the background)'
         completion = {
             'status': 'complete',
-            'message': f'Processing Complete: Successfully processed {processed_files} out of {total_files} files',
+            'message': message,
             'processed': processed_files,
-            'total': total_files
+            'total': total_files,
+            'background': background_files
         }
         yield f"data: {json.dumps(completion)}\n\n"
     
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
+@app.route('/process', methods=['POST'])
+def process_uploads():
+    """Store uploaded files and index only the new ones.
+    
+    The multipart body is streamed to disk by UploadRequest, so by the time
+    request.files is available every upload is already a hashed file in the
+    upload folder. Progress is streamed back as newline-delimited JSON and the
+    final 'complete' line is sent once every new document is searchable.
+    """
+    uploads = request.files.getlist('files')
+    if not uploads:
+        return jsonify({'error': 'No files uploaded'}), 400
+    
+    # Move uploads into place now, while the request's temp files still exist
+    stored = []
+    for upload in uploads:
+        filename = secure_filename(upload.filename or '')
+        if not filename or not allowed_file(filename):
+            upload.stream.close()
+            stored.append((upload.filename, None, False))
+            continue
+        stored_name, is_new = upload_hashes.store(upload.stream, filename)
+        stored.append((filename, stored_name, is_new))
+    
+    def generate():
+        # The live corpus is looked up each time: /ingest may publish a new one meanwhile
+        results = []
+        for idx, (filename, stored_name, is_new) in enumerate(stored, 1):
+            yield json.dumps({'type': 'progress', 'progress': int((idx - 1) * 100 / len(stored)),
+                              'currentFile': filename}) + '\n'
+            
+            if stored_name is None:
+                message = f'Skipped {filename}: unsupported file type'
+                results.append({'filename': filename, 'status': 'unsupported'})
+            elif not is_new and get_live_corpus().get(UPLOAD_FOLDER, stored_name) is not None:
+                message = f'{filename} is already indexed as {stored_name}'
+                results.append({'filename': filename, 'stored_as': stored_name, 'status': 'duplicate'})
+            else:
+                # New content (or known content missing from the live corpus): index just this file
+                try:
+                    content = ingest_file(UPLOAD_FOLDER, stored_name).result()
+                except Exception as e:
+                    content = None
+                    app.logger.error('Error indexing upload %s: %s', stored_name, str(e))
+                if content:
+                    message = f'Indexed {filename}'
+                    results.append({'filename': filename, 'stored_as': stored_name, 'status': 'indexed'})
+                else:
+                    message = f'Failed to extract text from {filename}'
+                    results.append({'filename': filename, 'stored_as': stored_name, 'status': 'error'})
+            yield json.dumps({'type': 'status', 'message': message}) + '\n'
+        
+        yield json.dumps({'type': 'progress', 'progress': 100, 'currentFile': None}) + '\n'
+        yield json.dumps({'type': 'complete', 'files': results, 'documents': len(get_live_corpus())}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/ingest/status')
+def ingest_status():
+    """Report live corpus size and background lane progress."""
+    documents = getattr(app, 'processed_documents', None) or []
+    with _background_lock:
+        status = dict(background_status)
+    return jsonify({
+        'documents': len(documents),
+        'background': status
+    })
+
+def build_context(relevant_chunks, documents):
+    """Join the selected chunks into prompt context, falling back to document samples."""
+    context_parts = []
+    sources_used = set()
+    
+    for chunk in relevant_chunks:
+        # A chunk found in several files (near-duplicates) cites them all
+        sources = chunk.get('sources') or [chunk['source']]
+        sources_used.update(sources)
+        context_parts.append(f"[Source: {'; '.join(sources)}]\n{chunk['content']}\n")
+    
+    context = "\n\n".join(context_parts)
+    
+    # If no relevant chunks found, use a small sample from each document
+    if not context:
+        app.logger.warning('No relevant chunks found, using document samples')
+        for doc in documents[:5]:  # Increased from 3 to 5 documents
+            sample = doc['content'][:500] + "..." if len(doc['content']) > 500 else doc['content']
+            context_parts.append(f"[Source: {doc['filename']}]\n{sample}\n")
+            sources_used.add(doc['filename'])
+        context = "\n\n".join(context_parts)
+    
+    return context, sources_used
+
 @app.route('/chat', methods=['POST'])
+@profiled('chat')
+@metrics.traced('chat')
 def chat():
     if not hasattr(app, 'processed_documents') or not app.processed_documents:
         return jsonify({'error': 'Please process documents first'}), 400
@@ -595,36 +1091,33 @@ def chat():
         data = request.get_json()
         user_message = data.get('message', '')
         conversation_history = data.get('history', [])
+        try:
+            filters = parse_filters(data.get('filters'))
+        except FilterError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Pin one snapshot of the live corpus; background lanes may publish more meanwhile
+        documents = list(app.processed_documents)
         
         # Log the number of processed documents
-        app.logger.info(f"Processing chat with {len(app.processed_documents)} documents available")
+        app.logger.info('Processing chat with %d documents available', len(documents))
         
         # Find relevant chunks based on the user's query
-        relevant_chunks = find_relevant_chunks(user_message, app.processed_documents, max_chunks=10)
+        with metrics.span('retrieval'):
+            relevant_chunks = find_relevant_chunks(user_message, documents, max_chunks=10, filters=filters)
+        # Questions that found nothing are not offered as completions
+        if relevant_chunks:
+            suggester.record(user_message)
         
         # Create context from relevant chunks only
-        context_parts = []
-        sources_used = set()
-        
-        for chunk in relevant_chunks:
-            source = chunk['source']
-            sources_used.add(source)
-            context_parts.append(f"[Source: {source}]\n{chunk['content']}\n")
-        
-        context = "\n\n".join(context_parts)
-        
-        # If no relevant chunks found, use a small sample from each document
-        if not context:
-            app.logger.warning('No relevant chunks found, using document samples')
-            for doc in app.processed_documents[:5]:  # Increased from 3 to 5 documents
-                sample = doc['content'][:500] + "..." if len(doc['content']) > 500 else doc['content']
-                context_parts.append(f"[Source: {doc['filename']}]\n{sample}\n")
-                sources_used.add(doc['filename'])
-            context = "\n\n".join(context_parts)
+        with metrics.span('context'):
+            # Document samples, if it comes to that, also come from the filtered documents only
+            context, sources_used = build_context(relevant_chunks,
+                                                  [doc for doc in documents if matches(doc, filters)])
         
         # Log the context length and sources
-        app.logger.info(f"Context length: {len(context)} characters")
-        app.logger.info(f"Sources used: {', '.join(sources_used)}")
+        app.logger.info('Context length: %d characters from sources %s', len(context), sorted(sources_used),
+                        extra={'context_chars': len(context), 'sources': len(sources_used)})
         
         # Create messages for OpenAI
         messages = [
@@ -658,14 +1151,15 @@ def chat():
         messages.append({"role": "user", "content": user_message})
         
         # Get response from OpenAI
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000,
-            presence_penalty=0.6,  # Encourage diverse responses
-            frequency_penalty=0.3  # Reduce repetition
-        )
+        with metrics.span('model'):
+            response = get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                presence_penalty=0.6,  # Encourage diverse responses
+                frequency_penalty=0.3  # Reduce repetition
+            )
         
         # Extract response and add source information
         response_content = response.choices[0].message.content
@@ -674,11 +1168,14 @@ def chat():
         if sources_used and "[Source:" not in response_content:
             response_content += f"\n\n[Based on teachings from: {', '.join(sources_used)}]"
         
-        return jsonify({
+        result = jsonify({
             'response': response_content,
             'conversation_history': messages + [{"role": "assistant", "content": response_content}],
             'sources_used': list(sources_used)
         })
+        # Expose the stage breakdown (retrieval and its sub-stages, context, model) to clients
+        result.headers['Server-Timing'] = metrics.current_trace().server_timing()
+        return result
         
     except Exception as e:
         app.logger.error('Error in chat route: %s', str(e))
@@ -699,6 +1196,70 @@ def get_file_type(filename):
         return 'txt'
     return 'unsupported'
 
+# ==============================================
+# WATCHER MODE
+# ==============================================
+# Started by the serving process only: from __main__ (in the reloader's child) or on the first request under a WSGI
+# server, never on import, so tests, benchmarks and the reloader's parent do not watch
+directory_watcher = None
+_watcher_lock = threading.Lock()
+
+def handle_watched_changes(changes):
+    """Feed created/modified files through extraction and drop deleted ones."""
+    for change, directory, filename in changes:
+        app.logger.info('Watcher: %s %s', change, os.path.join(directory, filename))
+        if change != DELETED and os.path.abspath(directory) == os.path.abspath(upload_hashes.directory) and \
+                upload_hashes.is_stored_upload(filename):
+            # /process moved this upload in and indexes it itself
+            app.logger.debug('Watcher: skipping upload %s', filename)
+            continue
+        if change == DELETED:
+            get_live_corpus().remove(directory, filename)
+        else:
+            # Merged into whichever corpus is live when extraction finishes
+            ingest_file(directory, filename)
+
+def start_directory_watcher():
+    """Start watching the ingest directories for incremental changes."""
+    global directory_watcher
+    with _watcher_lock:
+        if directory_watcher is None:
+            directory_watcher = DirectoryWatcher(
+                app.config['INGEST_DIRECTORIES'],
+                handle_watched_changes,
+                file_filter=allowed_file,
+                debounce=app.config['WATCH_DEBOUNCE'],
+                poll_interval=app.config['WATCH_POLL_INTERVAL']
+            ).start()
+    return directory_watcher
+
+@app.before_request
+def _start_watcher_on_first_request():
+    if app.config['WATCH_DIRECTORIES'] and directory_watcher is None:
+        start_directory_watcher()
+
+# ==============================================
+# STARTUP REPORT
+# ==============================================
+_startup_marks.append(('app', time.perf_counter()))
+
+def _startup_report():
+    """Milliseconds spent in each phase of loading this module, and in total."""
+    phases = {name: round((mark - previous) * 1000, 1)
+              for (_, previous), (name, mark) in zip(_startup_marks, _startup_marks[1:])}
+    total = round((_startup_marks[-1][1] - _startup_marks[0][1]) * 1000, 1)
+    return {'started': time.time() - total / 1000, 'total_ms': total, 'phases': phases}
+
+STARTUP_REPORT = _startup_report()
+metrics.gauge('rag_startup_seconds', 'Time spent loading the app, by phase', ('phase',),
+              func=lambda: {(phase,): ms / 1000 for phase, ms in STARTUP_REPORT['phases'].items()})
+app.logger.info('Startup completed in %.1f ms (%s)', STARTUP_REPORT['total_ms'],
+                ', '.join('%s=%.1f' % item for item in STARTUP_REPORT['phases'].items()),
+                extra={'startup': STARTUP_REPORT})
+
 if __name__ == '__main__':
-    print("Starting server on http://127.0.0.1:5001")
+    # With the debug reloader this module also runs in the parent process, which only restarts the server
+    if app.config['WATCH_DIRECTORIES'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_directory_watcher()
+    app.logger.info('Starting server on http://127.0.0.1:5001')
     app.run(host='127.0.0.1', port=5001, debug=True) 
\ No newline at end of file
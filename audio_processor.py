@@ -1,15 +1,15 @@
 import os
 import speech_recognition as sr
-from pydub import AudioSegment
 import gc
 from typing import Optional, Dict, List
 import tempfile
-import numpy as np
-import wave
 import logging
+from ffmpeg_setup import configure_pydub
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# pydub pointed at the ffmpeg found by ffmpeg_setup (cached per process)
+AudioSegment = configure_pydub()
+
+# Handlers and levels are configured by the application (see logging_config.py)
 logger = logging.getLogger('audio_processor')
 
 def extract_text_from_audio(file_path: str) -> Optional[str]:
@@ -17,11 +17,11 @@ def extract_text_from_audio(file_path: str) -> Optional[str]:
     try:
         # Convert to absolute path
         abs_path = os.path.abspath(file_path)
-        logger.info(f"Starting to process audio file: {abs_path}")
+        logger.info("Starting to process audio file: %s", abs_path)
         
         # Get file size in MB
         file_size_mb = os.path.getsize(abs_path) / (1024 * 1024)
-        logger.info(f"Audio file size: {file_size_mb:.2f} MB")
+        logger.info("Audio file size: %.2f MB", file_size_mb)
         
         # Initialize recognizer
         logger.debug("Initializing speech recognizer")
@@ -35,32 +35,32 @@ def extract_text_from_audio(file_path: str) -> Optional[str]:
                 audio = AudioSegment.from_file(abs_path)
                 logger.info("Successfully loaded audio as MP4 container")
             except Exception as e:
-                logger.error(f"Failed to process as MP4 container: {str(e)}")
+                logger.error("Failed to process as MP4 container: %s", e)
                 return None
         else:
             # Handle other audio formats (MP3, WAV)
             try:
-                logger.info(f"Processing audio file as {os.path.splitext(file_path)[1]} format")
+                logger.info("Processing audio file as %s format", os.path.splitext(file_path)[1])
                 audio = AudioSegment.from_file(abs_path)
-                logger.debug(f"Successfully loaded audio file, duration: {len(audio)}ms")
+                logger.debug("Successfully loaded audio file, duration: %dms", len(audio))
             except Exception as e:
-                logger.error(f"Error loading audio file: {str(e)}")
+                logger.error("Error loading audio file: %s", e)
                 return None
         
         # Process in chunks for memory efficiency
         chunk_length_ms = 30000  # 30 seconds per chunk
         chunks = [audio[i:i + chunk_length_ms] for i in range(0, len(audio), chunk_length_ms)]
-        logger.info(f"Split audio into {len(chunks)} chunks")
+        logger.info("Split audio into %d chunks", len(chunks))
         
         text_segments = []
         no_speech_chunks = 0
         
         for i, chunk in enumerate(chunks):
             try:
-                logger.debug(f"Processing chunk {i+1}/{len(chunks)}")
+                logger.debug("Processing chunk %d/%d", i + 1, len(chunks))
                 # Save chunk to temporary WAV file
                 with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
-                    logger.debug(f"Created temporary file for chunk: {temp_wav.name}")
+                    logger.debug("Created temporary file for chunk: %s", temp_wav.name)
                     chunk.export(temp_wav.name, format='wav')
                     
                     # Process the chunk
@@ -71,16 +71,16 @@ def extract_text_from_audio(file_path: str) -> Optional[str]:
                         text = recognizer.recognize_google(audio_data)
                         if text.strip():  # Only add non-empty text
                             text_segments.append(text)
-                            logger.debug(f"Successfully transcribed chunk {i+1}")
+                            logger.debug("Successfully transcribed chunk %d", i + 1)
                         else:
                             no_speech_chunks += 1
-                            logger.warning(f"No speech detected in chunk {i+1}")
+                            logger.warning("No speech detected in chunk %d", i + 1)
                         
                 # Clean up temporary file
                 try:
                     os.unlink(temp_wav.name)
                 except Exception as e:
-                    logger.error(f"Error cleaning up chunk temporary file: {str(e)}")
+                    logger.error("Error cleaning up chunk temporary file: %s", e)
                 
                 # Force garbage collection for large files
                 if file_size_mb > 50 and i % 5 == 0:
@@ -89,19 +89,19 @@ def extract_text_from_audio(file_path: str) -> Optional[str]:
                     
             except sr.UnknownValueError:
                 no_speech_chunks += 1
-                logger.warning(f"No speech detected in chunk {i+1}")
+                logger.warning("No speech detected in chunk %d", i + 1)
                 continue
             except sr.RequestError as e:
-                logger.error(f"Could not request results from speech recognition service for chunk {i+1}: {e}")
+                logger.error("Could not request results from speech recognition service for chunk %d: %s", i + 1, e)
                 continue
             except Exception as e:
-                logger.error(f"Error processing chunk {i+1}: {str(e)}")
+                logger.error("Error processing chunk %d: %s", i + 1, e)
                 continue
         
         if text_segments:
-            logger.info(f"Successfully processed {len(text_segments)} chunks with speech")
+            logger.info("Successfully processed %d chunks with speech", len(text_segments))
             if no_speech_chunks > 0:
-                logger.warning(f"{no_speech_chunks} chunks contained no speech")
+                logger.warning("%d chunks contained no speech", no_speech_chunks)
             return ' '.join(text_segments)
         else:
             if no_speech_chunks == len(chunks):
@@ -111,7 +111,7 @@ def extract_text_from_audio(file_path: str) -> Optional[str]:
             return None
         
     except Exception as e:
-        logger.error(f"Error processing audio file {file_path}: {str(e)}")
+        logger.error("Error processing audio file %s: %s", file_path, e)
         return None
 
 def process_audio_directory(directory_path: str) -> List[Dict]:
@@ -121,7 +121,7 @@ def process_audio_directory(directory_path: str) -> List[Dict]:
     # Get all files in the directory
     try:
         files = os.listdir(directory_path)
-        print(f"Found {len(files)} files in directory")
+        logger.info("Found %d files in directory", len(files))
         
         # Sort files by size to process smaller files first
         files.sort(key=lambda x: os.path.getsize(os.path.join(directory_path, x)))
@@ -130,7 +130,7 @@ def process_audio_directory(directory_path: str) -> List[Dict]:
             try:
                 file_path = os.path.join(directory_path, filename)
                 file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-                print(f"Processing {filename} ({file_size_mb:.2f} MB)")
+                logger.info("Processing %s (%.2f MB)", filename, file_size_mb)
                 
                 content = None
                 # Process based on file extension
@@ -145,21 +145,21 @@ def process_audio_directory(directory_path: str) -> List[Dict]:
                         'content': content,
                         'preview': preview_content
                     })
-                    print(f"Successfully processed {filename}")
+                    logger.info("Successfully processed %s", filename)
                 else:
-                    print(f"Failed to extract content from {filename}")
+                    logger.warning("Failed to extract content from %s", filename)
                 
                 # Force garbage collection for large files
                 if file_size_mb > 50:
                     gc.collect()
                     
             except Exception as e:
-                print(f"Error processing file {filename}: {str(e)}")
+                logger.error("Error processing file %s: %s", filename, e)
                 continue
                 
     except Exception as e:
-        print(f"Error accessing directory {directory_path}: {str(e)}")
+        logger.error("Error accessing directory %s: %s", directory_path, e)
         return []
         
-    print(f"Successfully processed {len(processed_audio)} out of {len(files)} files")
+    logger.info("Successfully processed %d out of %d files", len(processed_audio), len(files))
     return processed_audio 
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""Ingestion throughput benchmark: PDF, DOCX, TXT and WAV corpora per extractor backend.
+
+A seeded corpus is written to a temporary directory for each format:
+
+  pdf    --files PDFs of --pdf-pages pages each
+  docx   --files DOCX files of --docx-paragraphs paragraphs each
+  txt    --files text files of --txt-kb KB in each of --encodings
+  wav    --files 16 kHz mono WAV files of --audio-seconds seconds each
+
+Every installed backend for the format is run over the corpus in a fresh
+process (through extractors.iter_text with the cache off, exactly as pool
+workers call it), so peak RSS is measured per format and backend. A final
+'pool' row per format pushes the whole corpus through an ExtractionPool with
+--workers workers and the normally selected backends; its time includes
+worker start-up, so use enough files for that to amortize.
+
+Reported per row: MB/s of input, pages/s (PDF), characters/s, audio
+real-time factor (wall time / audio duration; below 1 is faster than real
+time) and peak RSS in MB.
+
+Usage:
+    python -m benchmarks.bench_ingest --files 20 --pdf-pages 50 --workers 4
+    python -m benchmarks.bench_ingest --formats pdf txt --encodings utf-8 cp1252 --output ingest.json
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.synthetic_corpus import generate_document
+
+FORMATS = ['pdf', 'docx', 'txt', 'wav']
+AUDIO_RATE = 16000
+# Non-ASCII text that each encoding can represent, so detection has real work to do
+ENCODING_SAMPLES = {
+    'utf-8': 'Shalom — שלום “Ahavas Yisrael”',
+    'cp1252': 'Shalom — “Ahavas Yisrael” €',
+    'latin-1': 'Shalom « Ahavas Yisrael » café',
+    'ascii': 'Shalom - "Ahavas Yisrael"',
+}
+
+
+def _write_wav(path: str, seconds: float, rng: random.Random):
+    """Write a speech-band tone sequence with noise as 16-bit mono PCM."""
+    frames = bytearray()
+    samples = int(seconds * AUDIO_RATE)
+    tone = rng.uniform(150, 400)
+    for i in range(samples):
+        if i % (AUDIO_RATE // 4) == 0:
+            tone = rng.uniform(150, 400)
+        value = 0.4 * math.sin(2 * math.pi * tone * i / AUDIO_RATE) + rng.uniform(-0.05, 0.05)
+        frames += struct.pack('<h', int(value * 32767))
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(AUDIO_RATE)
+        out.writeframes(bytes(frames))
+
+
+def build_corpus(directory: str, fmt: str, args, seed: int = 0) -> Dict:
+    """Write one format's corpus and return its file list and size totals."""
+    from extractors import build_docx_bytes, build_pdf_bytes
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    files, pages, audio_seconds = [], 0, 0.0
+    variants = args.encodings if fmt == 'txt' else [None]
+    for i in range(args.files):
+        for encoding in variants:
+            suffix = f"_{encoding}" if encoding else ''
+            extension = 'txt' if fmt == 'txt' else fmt
+            path = os.path.join(directory, f"bench_{i:04d}{suffix}.{extension}")
+            if fmt == 'pdf':
+                page_texts = [generate_document(rng, 2500) for _ in range(args.pdf_pages)]
+                with open(path, 'wb') as f:
+                    f.write(build_pdf_bytes(page_texts))
+                pages += args.pdf_pages
+            elif fmt == 'docx':
+                paragraphs = generate_document(rng, args.docx_paragraphs * 400).split('\n\n')
+                with open(path, 'wb') as f:
+                    f.write(build_docx_bytes(paragraphs))
+            elif fmt == 'txt':
+                text = generate_document(rng, args.txt_kb * 1024)
+                text = text.replace('\n\n', f"\n\n{ENCODING_SAMPLES.get(encoding, '')}\n", 1)
+                with open(path, 'w', encoding=encoding, errors='replace', newline='') as f:
+                    f.write(text)
+            else:
+                _write_wav(path, args.audio_seconds, rng)
+                audio_seconds += args.audio_seconds
+            files.append(path)
+    return {
+        'files': files,
+        'bytes': sum(os.path.getsize(path) for path in files),
+        'pages': pages,
+        'audio_seconds': audio_seconds,
+    }
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process and its reaped children, in MB."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_backend(files: List[str], file_type: str, backend: str) -> Dict:
+    """Extract every file with one backend; runs in a fresh process."""
+    import extractors
+    start = time.perf_counter()
+    chars = failed = empty = 0
+    for path in files:
+        try:
+            extracted = sum(len(s) for s in extractors.iter_text(path, file_type, use_cache=False,
+                                                                 backend=backend))
+        except Exception:
+            failed += 1
+            continue
+        chars += extracted
+        empty += not extracted
+    return {'elapsed_s': time.perf_counter() - start, 'chars': chars, 'failed': failed,
+            'empty': empty, 'peak_rss_mb': _peak_rss_mb()}
+
+
+def _run_pool(files: List[str], file_type: str, workers: int) -> Dict:
+    """Push every file through an ExtractionPool; runs in a fresh process."""
+    import extractors
+    from extraction_pool import ExtractionPool
+    extractors.select_backends()
+    pool = ExtractionPool(workers=workers, name='bench-ingest')
+    start = time.perf_counter()
+    chars = failed = empty = 0
+    try:
+        for _, future in pool.map_unordered((path, file_type) for path in files):
+            try:
+                text = future.result()
+            except Exception:
+                failed += 1
+                continue
+            chars += len(text or '')
+            empty += not text
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+    return {'elapsed_s': elapsed, 'chars': chars, 'failed': failed, 'empty': empty,
+            'peak_rss_mb': _peak_rss_mb()}
+
+
+def _isolated(func, *args) -> Dict:
+    """Run func(*args) in a new spawned process so RSS and imports start clean."""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(func, *args).result()
+
+
+def _rates(run: Dict, corpus: Dict) -> Dict:
+    elapsed = run['elapsed_s'] or 1e-9
+    rates = dict(run)
+    rates['mb_per_s'] = corpus['bytes'] / (1024 * 1024) / elapsed
+    rates['chars_per_s'] = run['chars'] / elapsed
+    if corpus['pages']:
+        rates['pages_per_s'] = corpus['pages'] / elapsed
+    if corpus['audio_seconds']:
+        rates['audio_rtf'] = elapsed / corpus['audio_seconds']
+    return rates
+
+
+def bench_format(fmt: str, corpus: Dict, workers: int, backends: Optional[List[str]] = None) -> List[Dict]:
+    """Benchmark every installed backend for a format plus the pool path."""
+    from extractors import available_backends
+    file_type = 'audio' if fmt == 'wav' else fmt
+    names = [name for name in available_backends().get(file_type, [])
+             if not backends or name in backends]
+    rows = []
+    for name in names:
+        rows.append(dict(_rates(_isolated(_run_backend, corpus['files'], file_type, name), corpus),
+                         backend=name))
+    if names and workers:
+        rows.append(dict(_rates(_isolated(_run_pool, corpus['files'], file_type, workers), corpus),
+                         backend=f'pool x{workers}'))
+    return rows
+
+
+def _format_row(fmt: str, row: Dict) -> str:
+    cells = [f"{row['mb_per_s']:.2f} MB/s", f"{row['chars_per_s'] / 1000:.0f}k chars/s"]
+    if 'pages_per_s' in row:
+        cells.append(f"{row['pages_per_s']:.1f} pages/s")
+    if 'audio_rtf' in row:
+        cells.append(f"RTF {row['audio_rtf']:.3f}")
+    if row['peak_rss_mb'] is not None:
+        cells.append(f"peak {row['peak_rss_mb']:.0f} MB")
+    if row['failed']:
+        cells.append(f"{row['failed']} failed")
+    if row['empty']:
+        cells.append(f"{row['empty']} empty")
+    return f"{fmt:<5} {row['backend']:<18} " + ', '.join(cells)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--formats', nargs='+', default=FORMATS, choices=FORMATS)
+    parser.add_argument('--backends', nargs='+', help='only run these backend names')
+    parser.add_argument('--files', type=int, default=10, help='files per format (and per encoding)')
+    parser.add_argument('--pdf-pages', type=int, default=20)
+    parser.add_argument('--docx-paragraphs', type=int, default=200)
+    parser.add_argument('--txt-kb', type=int, default=256)
+    parser.add_argument('--encodings', nargs='+', default=['utf-8', 'cp1252', 'latin-1'])
+    parser.add_argument('--audio-seconds', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=2, help='pool size for the pool row; 0 skips it')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='ingest_benchmark.json', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    results = {
+        'benchmark': 'ingest',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': args.seed,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': [],
+    }
+    root = tempfile.mkdtemp(prefix='bench-ingest-')
+    try:
+        for fmt in args.formats:
+            corpus = build_corpus(os.path.join(root, fmt), fmt, args, seed=args.seed)
+            rows = bench_format(fmt, corpus, args.workers, args.backends)
+            if not rows:
+                print(f"{fmt:<5} no extractor backend installed, skipped")
+            for row in rows:
+                print(_format_row(fmt, row))
+            results['results'].append({
+                'format': fmt,
+                'files': len(corpus['files']),
+                'bytes': corpus['bytes'],
+                'pages': corpus['pages'],
+                'audio_seconds': corpus['audio_seconds'],
+                'backends': rows,
+            })
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
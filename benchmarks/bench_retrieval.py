@@ -0,0 +1,197 @@
+"""Retrieval benchmark: times each stage of find_relevant_chunks at several corpus sizes.
+
+Stages are measured separately using the same helpers /chat uses:
+
+  chunking     chunk_documents() over the whole corpus
+  dedup        MinHash near-duplicate detection over all chunks (CHUNK_DEDUP_THRESHOLD)
+  vectorizing  TF-IDF fit_transform over all chunks
+  scoring      query transform + cosine similarity (per query)
+  selection    ChunkIndex.select() (per query)
+  batch        ChunkIndex.search_batch() over all queries at once (per query)
+  search       ChunkIndex.search(), one query at a time (per query)
+  filtered     ChunkIndex.search() restricted to file_type=audio, a quarter of the documents (per query)
+  keyword      ChunkIndex.keyword_search(), the fallback when TF-IDF finds nothing (per query)
+  cascade      Cascade.search(), BM25 candidates reranked (RETRIEVAL_BACKEND=cascade, per query)
+
+Usage:
+    python -m benchmarks.bench_retrieval --chunks 10 1000 100000 --output results.json
+    python -m benchmarks.bench_retrieval --chunks 10 1000 --baseline results.json
+
+With --baseline the run exits non-zero if any stage's median latency regresses
+by more than --max-regression (default 25%) against the baseline file.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.synthetic_corpus import corpus_for_chunks, generate_queries
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+    return {
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': p95 * 1000,
+        'min_ms': samples[0] * 1000,
+        'samples': len(samples),
+    }
+
+
+def _time(func: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_size(target_chunks: int, queries: List[str], repeat: int, seed: int) -> Dict:
+    """Benchmark every retrieval stage for a corpus of about target_chunks chunks."""
+    from app import (chunk_documents, create_vectorizer, extract_query_terms,
+                     cosine_similarity, ChunkIndex, Cascade)
+
+    documents = corpus_for_chunks(target_chunks, seed=seed)
+    # The largest corpora are expensive to rebuild; time them fewer times
+    build_repeat = repeat if target_chunks <= 10000 else 1
+
+    chunked = {}
+
+    def chunk():
+        chunked['result'] = chunk_documents(documents)
+    chunking = _time(chunk, build_repeat)
+    all_chunks, chunk_sources, chunk_docs = chunked['result']
+    from dedup import near_duplicates
+    dedup = _time(lambda: near_duplicates(all_chunks), build_repeat)
+
+    fitted = {}
+
+    def vectorize():
+        vectorizer = create_vectorizer()
+        fitted['matrix'] = vectorizer.fit_transform(all_chunks)
+        fitted['vectorizer'] = vectorizer
+    vectorizing = _time(vectorize, build_repeat)
+    vectorizer, matrix = fitted['vectorizer'], fitted['matrix']
+
+    index = ChunkIndex(all_chunks, chunk_sources, chunk_docs, vectorizer, matrix)
+    from facets import FacetIndex, parse_filters
+    numbers = {doc['filename']: number for number, doc in enumerate(documents)}
+    index.facets = FacetIndex(documents, [[numbers[source]] for source in chunk_sources])
+    scoring, selection = [], []
+    for query in queries:
+        start = time.perf_counter()
+        similarities = cosine_similarity(vectorizer.transform([query]), matrix).flatten()
+        scoring.append(time.perf_counter() - start)
+
+        query_terms = extract_query_terms(query)
+        start = time.perf_counter()
+        index.select(similarities, query_terms, 10)
+        selection.append(time.perf_counter() - start)
+
+    batch = [sample / len(queries) for sample in _time(lambda: index.search_batch(queries, 10), repeat)]
+    searched = [_time(lambda: index.search(query, 10), 1)[0] for query in queries]
+    # Resolving the filters is cached per index; only the first query pays for it
+    subset = index.subset(parse_filters({'file_type': 'audio'}))
+    filtered = [_time(lambda: index.search(query, 10, subset=subset), 1)[0] for query in queries]
+    keyword = [_time(lambda: index.keyword_search(query, 10), 1)[0] for query in queries]
+    cascade = Cascade()
+    cascaded = [_time(lambda: cascade.search(index, query, 10), 1)[0] for query in queries]
+
+    return {
+        'target_chunks': target_chunks,
+        'chunks': len(all_chunks),
+        'documents': len(documents),
+        'corpus_chars': sum(len(doc['content']) for doc in documents),
+        'vocabulary': len(vectorizer.vocabulary_),
+        'stages': {
+            'chunking': _summarize(chunking),
+            'dedup': _summarize(dedup),
+            'vectorizing': _summarize(vectorizing),
+            'scoring': _summarize(scoring),
+            'selection': _summarize(selection),
+            'batch': _summarize(batch),
+            'search': _summarize(searched),
+            'filtered': _summarize(filtered),
+            'keyword': _summarize(keyword),
+            'cascade': _summarize(cascaded),
+        },
+    }
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Return human-readable regressions of median stage latency vs a baseline run."""
+    previous = {entry['target_chunks']: entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results['results']:
+        base = previous.get(entry['target_chunks'])
+        if base is None:
+            continue
+        for stage, summary in entry['stages'].items():
+            base_summary = base['stages'].get(stage)
+            if not base_summary or base_summary['median_ms'] <= 0:
+                continue
+            ratio = summary['median_ms'] / base_summary['median_ms']
+            if ratio > 1 + max_regression:
+                regressions.append(
+                    f"{stage} @ {entry['target_chunks']} chunks: {base_summary['median_ms']:.2f}ms -> "
+                    f"{summary['median_ms']:.2f}ms ({(ratio - 1) * 100:.0f}% slower)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--chunks', type=int, nargs='+', default=[10, 1000, 100000],
+                        help='corpus sizes to benchmark, in chunks')
+    parser.add_argument('--queries', type=int, default=20, help='queries per corpus size')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of build stages')
+    parser.add_argument('--seed', type=int, default=0, help='corpus generator seed')
+    parser.add_argument('--output', default='retrieval_benchmark.json', help='JSON results file')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed fractional slowdown of a stage median before failing')
+    args = parser.parse_args(argv)
+
+    import numpy
+    import sklearn
+
+    queries = generate_queries(args.queries, seed=args.seed + 1)
+    results = {
+        'benchmark': 'retrieval',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': args.seed,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': numpy.__version__,
+            'sklearn': sklearn.__version__,
+        },
+        'results': [],
+    }
+    for size in args.chunks:
+        entry = bench_size(size, queries, args.repeat, args.seed)
+        results['results'].append(entry)
+        stages = ', '.join(f"{name} {s['median_ms']:.2f}ms" for name, s in entry['stages'].items())
+        print(f"{entry['chunks']:>7} chunks: {stages}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
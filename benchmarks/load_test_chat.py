@@ -0,0 +1,227 @@
+"""End-to-end /chat load test against a local stub LLM.
+
+By default this starts the stub OpenAI server in-process, writes a synthetic
+corpus to a temporary directory, launches app.py in a subprocess pointed at
+both, ingests the corpus and then replays questions at a target concurrency.
+Latency is reported in total and split into retrieval and model time using
+the Server-Timing header returned by /chat.
+
+Usage:
+    python -m benchmarks.load_test_chat --concurrency 8 --requests 400 --latency 0.3
+    python -m benchmarks.load_test_chat --url http://127.0.0.1:5001 --questions questions.txt
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.stub_llm_server import add_arguments, config_from_args, start_stub_server
+from benchmarks.synthetic_corpus import generate_corpus, generate_queries
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Parse 'retrieval;dur=12.3, model;dur=456.7' into {'retrieval': 12.3, 'model': 456.7}."""
+    timings = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def launch_app(stub_url: str, corpus_dir: str, port: int) -> subprocess.Popen:
+    """Start app.py in a subprocess pointed at the stub LLM and the synthetic corpus."""
+    env = dict(os.environ)
+    env.update({
+        'OPENAI_API_KEY': 'stub-key',
+        'OPENAI_BASE_URL': stub_url,
+        'OPENAI_MAX_RETRIES': '0',
+        'INGEST_DIRECTORIES': corpus_dir,
+    })
+    code = ("import app; app.app.run(host='127.0.0.1', port=%d, threaded=True, use_reloader=False)" % port)
+    return subprocess.Popen([sys.executable, '-c', code], cwd=REPO_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def ingest(base_url: str):
+    """Run /ingest and wait for its completion event."""
+    with urllib.request.urlopen(base_url + '/ingest', timeout=600) as response:
+        for line in response:
+            if line.startswith(b'data: ') and b'"complete"' in line:
+                return json.loads(line[6:])
+    return None
+
+
+def chat_once(base_url: str, question: str, timeout: float) -> Dict:
+    body = json.dumps({'message': question, 'history': []}).encode()
+    req = urllib.request.Request(base_url + '/chat', data=body,
+                                 headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status, timing = response.status, response.headers.get('Server-Timing')
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, timing = e.code, None
+    except Exception as e:
+        status, timing = type(e).__name__, None
+    return {'status': status, 'total_ms': (time.perf_counter() - start) * 1000,
+            'timings': parse_server_timing(timing)}
+
+
+def run_load(base_url: str, questions: List[str], concurrency: int, requests: int,
+             timeout: float = 120.0) -> Dict:
+    """Replay questions round-robin at the given concurrency and summarize the results."""
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    results = []
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            result = chat_once(base_url, questions[index % len(questions)], timeout)
+            with lock:
+                results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r['status'] == 200]
+    errors = {}
+    for r in results:
+        if r['status'] != 200:
+            errors[str(r['status'])] = errors.get(str(r['status']), 0) + 1
+
+    def summary(values):
+        return {f'p{p}': percentile(values, p) for p in (50, 95, 99)}
+
+    return {
+        'requests': len(results),
+        'succeeded': len(ok),
+        'errors': errors,
+        'concurrency': concurrency,
+        'elapsed_s': elapsed,
+        'throughput_rps': len(ok) / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'total': summary([r['total_ms'] for r in ok]),
+            'retrieval': summary([r['timings']['retrieval'] for r in ok if 'retrieval' in r['timings']]),
+            'model': summary([r['timings']['model'] for r in ok if 'model' in r['timings']]),
+        },
+    }
+
+
+def _format(report: Dict) -> str:
+    lines = [f"{report['succeeded']}/{report['requests']} ok at concurrency {report['concurrency']}, "
+             f"{report['throughput_rps']:.1f} req/s, errors: {report['errors'] or 'none'}"]
+    for name, values in report['latency_ms'].items():
+        cells = ', '.join(f"{p} {v:.1f}ms" if v is not None else f"{p} n/a" for p, v in values.items())
+        lines.append(f"  {name:<9} {cells}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='existing app to test instead of launching one')
+    parser.add_argument('--questions', help='file with one question per line')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--docs', type=int, default=50, help='synthetic documents to ingest')
+    parser.add_argument('--doc-chars', type=int, default=20000, help='characters per synthetic document')
+    parser.add_argument('--output', help='write the JSON report here')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.questions:
+        with open(args.questions, encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = generate_queries(100)
+
+    app_process = stub = corpus_dir = None
+    base_url = args.url
+    try:
+        if base_url is None:
+            stub = start_stub_server(config_from_args(args))
+            stub_url = f"http://127.0.0.1:{stub.server_port}/v1"
+            corpus_dir = tempfile.mkdtemp(prefix='loadtest-corpus-')
+            for doc in generate_corpus(args.docs, args.doc_chars, file_types=['txt']):
+                with open(os.path.join(corpus_dir, doc['filename']), 'w', encoding='utf-8') as f:
+                    f.write(doc['content'])
+            port = _free_port()
+            app_process = launch_app(stub_url, corpus_dir, port)
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_for(base_url + '/')
+            print(f"Ingest: {(ingest(base_url) or {}).get('message')}")
+
+        report = run_load(base_url, questions, args.concurrency, args.requests)
+        report['stub'] = None if args.url else {
+            'latency': args.latency, 'tokens_per_second': args.tokens_per_second,
+            'error_rate': args.error_rate, 'rate_limit_rate': args.rate_limit_rate}
+        print(_format(report))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=10)
+        if stub is not None:
+            stub.shutdown()
+        if corpus_dir is not None:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Local OpenAI-compatible stub server for load testing /chat without API costs.
+
+Implements POST /v1/chat/completions (plain and stream=true) and GET
+/v1/models. Responses are canned text whose timing is shaped by a fixed
+latency, a token generation rate and optional error injection.
+
+Usage:
+    python -m benchmarks.stub_llm_server --port 8089 --latency 0.3 --tokens-per-second 50
+then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANSWER = (
+    "Shalom Aleichem! The purpose of every invention is to reveal G-dliness in the world "
+    "(test.txt). As the teaching says, \"Every invention has a spiritual lesson we can learn "
+    "from\" (test.txt). Use each tool to add in goodness and kindness. Shalom!"
+)
+
+
+class StubConfig:
+    def __init__(self, latency=0.2, jitter=0.05, tokens_per_second=0.0, completion_tokens=60,
+                 error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def draw(self):
+        """Return (delay before first token, per-token delay, injected status or None)."""
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            jitter = self._rng.uniform(-self.jitter, self.jitter)
+        status = None
+        if roll < self.error_rate:
+            status = 500
+        elif roll < self.error_rate + self.rate_limit_rate:
+            status = 429
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return max(0.0, self.latency + jitter), per_token, status
+
+
+def _answer_tokens(count):
+    words = CANNED_ANSWER.split(' ')
+    return [(' ' if i else '') + words[i % len(words)] for i in range(count)]
+
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/models'):
+                self._send_json(200, {'object': 'list', 'data': [
+                    {'id': 'gpt-3.5-turbo', 'object': 'model', 'owned_by': 'stub'}]})
+            else:
+                self._send_json(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                request = {}
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'not found'}})
+                return
+
+            delay, per_token, status = config.draw()
+            time.sleep(delay)
+            if status is not None:
+                kind = 'rate_limit_exceeded' if status == 429 else 'server_error'
+                self._send_json(status, {'error': {'message': f'Injected {kind}', 'type': kind}})
+                return
+
+            max_tokens = request.get('max_tokens') or config.completion_tokens
+            tokens = _answer_tokens(min(config.completion_tokens, max_tokens))
+            prompt_tokens = sum(len(str(m.get('content', '')).split())
+                                for m in request.get('messages', []))
+            completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+            model = request.get('model', 'gpt-3.5-turbo')
+            created = int(time.time())
+
+            if request.get('stream'):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(per_token)
+                    chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                             'model': model, 'choices': [{'index': 0, 'delta': {'content': token},
+                                                          'finish_reason': None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                done = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                        'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+                self.close_connection = True
+                return
+
+            time.sleep(per_token * len(tokens))
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(tokens)}}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                          'total_tokens': prompt_tokens + len(tokens)},
+            })
+
+    return Handler
+
+
+def start_stub_server(config: StubConfig, host='127.0.0.1', port=0):
+    """Start the stub in a daemon thread and return the server (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stub-llm', daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before the first token')
+    parser.add_argument('--jitter', type=float, default=0.05, help='+/- seconds added to the latency')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0,
+                        help='generation rate; 0 returns the whole answer at once')
+    parser.add_argument('--completion-tokens', type=int, default=60, help='tokens per answer')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='fraction of requests failing with 429')
+    parser.add_argument('--seed', type=int, default=None, help='seed for jitter and error injection')
+
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                      completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+                      rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config_from_args(args)))
+    print(f"Stub LLM listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Seeded synthetic corpus generator for retrieval and ingestion benchmarks.
+
+Documents are built from a Torah/Chassidus-flavoured vocabulary mixed with
+ordinary English so that TF-IDF, stop-word removal and bigrams behave roughly
+as they do on the real corpus. The same seed always yields the same corpus.
+"""
+import random
+from typing import Dict, List, Optional
+
+# split_text_into_chunks only breaks on paragraph boundaries and carries a
+# 200-char overlap, so with this generator's paragraph lengths each chunk
+# advances about this many characters through a document (measured)
+CHARS_PER_CHUNK = 580
+
+TERMS = [
+    'Torah', 'mitzvah', 'mitzvos', 'Chassidus', 'Rebbe', 'emunah', 'bitachon', 'Ahavas',
+    'Yisrael', 'tzedakah', 'Shabbos', 'neshamah', 'Moshiach', 'Geulah', 'teshuvah',
+    'tefillah', 'davening', 'farbrengen', 'sicha', 'maamar', 'Tanya', 'Alter', 'Baal',
+    'Shem', 'Tov', 'chinuch', 'shlichus', 'shliach', 'dirah', "b'tachtonim", 'Elokus',
+    'bittul', 'simcha', 'kedushah', 'tzaddik', 'beinoni', 'yetzer', 'hatov', 'hara',
+    'nefesh', 'Elokis', 'behamis', 'Shechinah', 'galus', 'Yom', 'Tov', 'Pesach', 'Sukkos',
+    'Chanukah', 'Purim', 'yeshivah', 'Gemara', 'Mishnah', 'halachah', 'minhag', 'Kabbalah',
+    'sefirah', 'chesed', 'gevurah', 'tiferes', 'Hashem', 'G-d', 'G-dliness', 'Eretz',
+    'mikvah', 'kashrus', 'tefillin', 'mezuzah', 'Rambam', 'Midrash', 'Zohar', 'niggun',
+]
+
+COMMON = [
+    'the', 'and', 'of', 'to', 'in', 'that', 'is', 'for', 'with', 'as', 'this', 'every',
+    'world', 'light', 'purpose', 'soul', 'life', 'study', 'person', 'divine', 'unity',
+    'service', 'practical', 'action', 'teaching', 'wisdom', 'joy', 'kindness', 'goodness',
+    'physical', 'spiritual', 'reveal', 'elevate', 'connection', 'inner', 'essence',
+    'technology', 'invention', 'darkness', 'community', 'education', 'children', 'home',
+    'dwelling', 'place', 'lower', 'realms', 'descent', 'ascent', 'strength', 'humility',
+    'must', 'can', 'should', 'through', 'which', 'each', 'one', 'all', 'also', 'even',
+]
+
+
+def _sentence(rng: random.Random, term_ratio: float = 0.3) -> str:
+    length = rng.randint(8, 22)
+    words = [rng.choice(TERMS) if rng.random() < term_ratio else rng.choice(COMMON)
+             for _ in range(length)]
+    words[0] = words[0][:1].upper() + words[0][1:]
+    return ' '.join(words) + rng.choice('..!?')
+
+
+def generate_document(rng: random.Random, chars: int) -> str:
+    """Generate one document of roughly `chars` characters in paragraphs."""
+    paragraphs = []
+    total = 0
+    while total < chars:
+        paragraph = ' '.join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return '\n\n'.join(paragraphs)
+
+
+def generate_corpus(num_docs: int, doc_chars: int = 5000, seed: int = 0,
+                    file_types: Optional[List[str]] = None) -> List[Dict]:
+    """Generate documents shaped like app.processed_documents entries."""
+    rng = random.Random(seed)
+    file_types = file_types or ['txt', 'pdf', 'docx', 'audio']
+    docs = []
+    for i in range(num_docs):
+        file_type = file_types[i % len(file_types)]
+        extension = 'wav' if file_type == 'audio' else file_type
+        docs.append({
+            'filename': f'synthetic_{i:06d}.{extension}',
+            'content': generate_document(rng, doc_chars),
+            'directory': 'test_audio' if file_type == 'audio' else 'pdfs',
+            'file_type': file_type,
+        })
+    return docs
+
+
+def corpus_for_chunks(num_chunks: int, seed: int = 0, chunks_per_doc: int = 10) -> List[Dict]:
+    """Generate a corpus that chunks into approximately `num_chunks` chunks."""
+    chunks_per_doc = max(1, min(chunks_per_doc, num_chunks))
+    num_docs = max(1, round(num_chunks / chunks_per_doc))
+    doc_chars = chunks_per_doc * CHARS_PER_CHUNK
+    return generate_corpus(num_docs, doc_chars=doc_chars, seed=seed)
+
+
+def generate_queries(count: int, seed: int = 1) -> List[str]:
+    """Generate question-style queries drawn from the same vocabulary."""
+    rng = random.Random(seed)
+    openers = ['What does the Rebbe teach about', 'How can we understand', 'What is the purpose of',
+               'Why is', 'How does', 'Explain the connection between']
+    queries = []
+    for _ in range(count):
+        words = [rng.choice(TERMS) for _ in range(rng.randint(1, 3))]
+        words += [rng.choice(COMMON[12:]) for _ in range(rng.randint(1, 2))]
+        queries.append(f"{rng.choice(openers)} {' '.join(words)}?")
+    return queries
@@ -0,0 +1,114 @@
+"""Two-stage retrieval: cheap BM25 candidates, then a precise rerank of only those.
+
+Stage 1 scores chunks with BM25 straight from the unigram postings of the
+query terms, so its cost grows with how often the terms occur rather than
+with the corpus, and keeps the best ``candidates`` chunks.
+
+Stage 2 reranks the candidates with
+
+  cosine     bigram TF-IDF cosine similarity (the score of the one-stage path)
+  coverage   share of the query terms the chunk contains
+  proximity  how tightly the chunk's query terms cluster: the characters
+             of the distinct terms over the length of the shortest span of
+             text holding all of them (1.0 for adjacent terms)
+
+combined as cosine + PROXIMITY_WEIGHT * proximity + COVERAGE_WEIGHT * coverage,
+reported as the chunk's 'similarity'. Proximity scans the chunk's text and is
+the costly part, so it is only computed for candidates it could lift into the
+top 2 * max_chunks (at most PROXIMITY_WEIGHT behind the last of them), best
+first, until the query's time budget runs out; candidates not reached get no
+proximity bonus.
+"""
+import logging
+import re
+import time
+from typing import List, Pattern, Sequence
+
+import metrics
+from retrieval import ChunkIndex, extract_query_terms
+
+logger = logging.getLogger('cascade')
+
+DEFAULT_CANDIDATES = 300
+DEFAULT_BUDGET_MS = 50.0
+PROXIMITY_WEIGHT = 0.2
+COVERAGE_WEIGHT = 0.2
+
+budget_exhausted = metrics.counter('rag_cascade_budget_exhausted_total',
+                                   'Queries whose rerank stage ran out of its time budget')
+
+
+def term_pattern(query_terms) -> Pattern:
+    """Regex matching any of the query terms as a whole token of lowercased text."""
+    alternatives = sorted(query_terms, key=len, reverse=True)
+    return re.compile(r'(?u)\b(?:%s)\b' % '|'.join(map(re.escape, alternatives)))
+
+
+def proximity(text: str, pattern: Pattern) -> float:
+    """Share of the shortest span of lowercased text containing every distinct term matched by pattern
+    taken up by those terms; 0.0 when fewer than two distinct terms occur.
+    """
+    hits = [(match.start(), match.end(), match.group()) for match in pattern.finditer(text)]
+    distinct = {term for _, _, term in hits}
+    if len(distinct) < 2:
+        return 0.0
+    best = len(text)
+    inside = {}
+    left = 0
+    for _, end, term in hits:
+        inside[term] = inside.get(term, 0) + 1
+        while len(inside) == len(distinct):
+            start, _, first = hits[left]
+            best = min(best, end - start)
+            inside[first] -= 1
+            if not inside[first]:
+                del inside[first]
+            left += 1
+    return sum(map(len, distinct)) / best
+
+
+class Cascade:
+    """Two-stage search over a ChunkIndex with a per-query time budget."""
+
+    def __init__(self, candidates: int = DEFAULT_CANDIDATES, budget_ms: float = DEFAULT_BUDGET_MS):
+        self.candidates = candidates
+        self.budget = budget_ms / 1000.0
+
+    def search(self, index: ChunkIndex, query: str, max_chunks: int = 10, subset=None) -> List[dict]:
+        """The max_chunks best chunks for query; with a subset (see facets.py), only among its chunks."""
+        import numpy as np
+        deadline = time.perf_counter() + self.budget
+        query_terms = extract_query_terms(query)
+        # Stop words are left out of the TF-IDF vocabulary; their long postings only slow stage 1 down
+        stop_words = index.vectorizer.get_stop_words() if index.vectorizer is not None else None
+        content_terms = query_terms - stop_words if stop_words else query_terms
+        with metrics.span('candidates'):
+            candidates, _ = index.bm25(content_terms or query_terms, max(self.candidates, max_chunks * 2), subset)
+        if not len(candidates):
+            return index.keyword_search(query, max_chunks, subset)
+
+        with metrics.span('rerank'):
+            if index.vectorizer is not None:
+                cosine = np.asarray((index.matrix[candidates] @ index.vectorizer.transform([query]).T).todense())
+                cosine = cosine.ravel().astype(np.float32)
+            else:
+                cosine = np.zeros(len(candidates), dtype=np.float32)
+            scores = cosine + COVERAGE_WEIGHT * index.term_matches(candidates, query_terms) / max(len(query_terms), 1)
+            best_first = np.argsort(-scores, kind='stable')
+            cutoff = scores[best_first[min(max_chunks * 2, len(scores)) - 1]] - PROXIMITY_WEIGHT
+            reachable = best_first[scores[best_first] >= cutoff]
+            pattern = term_pattern(query_terms)
+            for done, i in enumerate(reachable):
+                if time.perf_counter() > deadline:
+                    budget_exhausted.inc()
+                    logger.debug('Rerank budget exhausted after %d of %d candidates', done, len(reachable))
+                    break
+                scores[i] += PROXIMITY_WEIGHT * proximity(index.chunks[candidates[i]].lower(), pattern)
+            order = np.argsort(-scores, kind='stable')
+        with metrics.span('selection'):
+            return index.select_candidates(candidates[order], scores[order].astype(np.float32), query_terms,
+                                           max_chunks)
+
+    def search_batch(self, index: ChunkIndex, queries: Sequence[str], max_chunks: int = 10,
+                     subset=None) -> List[List[dict]]:
+        return [self.search(index, query, max_chunks, subset) for query in queries]
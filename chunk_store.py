@@ -0,0 +1,239 @@
+"""Persistent SQLite store of documents and their chunks with FTS5 keyword search.
+
+The store keeps a durable copy of the corpus so it survives restarts, and an
+FTS5 full-text index over the chunks ranked with bm25, so keyword retrieval
+needs no in-memory index. The database runs in WAL mode: searches from many
+threads proceed while ingestion writes. Each thread gets its own connection;
+writes are serialized by a lock.
+
+Schema:
+  documents(id, directory, filename, file_type, content, content_hash, chunks, updated)
+  chunks(id, document_id, position, content)
+  chunks_fts: external-content FTS5 table over chunks.content, kept in sync by triggers
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from positional import parse_query
+
+logger = logging.getLogger('chunk_store')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    directory TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_type TEXT,
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    UNIQUE (directory, filename)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_document ON chunks(document_id, position);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    content, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_vocab USING fts5vocab(chunks_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+
+class ChunkStoreError(Exception):
+    """The store could not be opened (e.g. SQLite was built without FTS5)."""
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _quoted(word: str) -> str:
+    return '"%s"' % word.replace('"', '""')
+
+
+def fts_query(query: str, tokenize: Callable[[str], List[str]]) -> str:
+    """Turn free text into an FTS5 query matching any of its words.
+
+    Words are quoted so FTS5 operators and punctuation in the question are
+    taken literally. Quoted phrases and NEAR/k pairs (see positional.py)
+    become FTS5 phrases and NEAR groups every match must also meet.
+    """
+    parsed = parse_query(query)
+    match = ' OR '.join(_quoted(word) for word in dict.fromkeys(tokenize(parsed.text)))
+    constraints = [_quoted(' '.join(tokens)) for tokens in parsed.phrases]
+    constraints += ['NEAR(%s %s, %d)' % (_quoted(a), _quoted(b), k) for a, b, k in parsed.near]
+    if not match or not constraints:
+        return match
+    return '(%s) AND %s' % (match, ' AND '.join(constraints))
+
+
+class ChunkStore:
+    """Documents and chunks in one SQLite database file."""
+
+    def __init__(self, path: str, chunker: Callable[[str], List[str]], tokenize: Callable[[str], List[str]]):
+        self.path = path
+        self.chunker = chunker
+        self.tokenize = tokenize
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with self._write_lock:
+                connection = self._connection()
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            raise ChunkStoreError(f"Cannot open chunk store {path}: {e}") from e
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA foreign_keys=ON')
+            connection.execute('PRAGMA synchronous=NORMAL')  # durable at checkpoints; safe with WAL
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    # ----------------------------------------------------------------- writes
+
+    def upsert(self, doc: dict) -> bool:
+        """Store a document and its chunks; returns False if it was already stored unchanged."""
+        digest = content_hash(doc['content'])
+        directory = doc.get('directory', '')
+        with self._write_lock:
+            connection = self._connection()
+            row = connection.execute('SELECT id, content_hash FROM documents WHERE directory = ? AND filename = ?',
+                                     (directory, doc['filename'])).fetchone()
+            if row is not None and row['content_hash'] == digest:
+                return False
+            chunks = self.chunker(doc['content'])
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if row is not None:
+                    connection.execute('DELETE FROM documents WHERE id = ?', (row['id'],))
+                document_id = connection.execute(
+                    'INSERT INTO documents (directory, filename, file_type, content, content_hash, chunks, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (directory, doc['filename'], doc.get('file_type'), doc['content'], digest, len(chunks),
+                     time.time())).lastrowid
+                connection.executemany('INSERT INTO chunks (document_id, position, content) VALUES (?, ?, ?)',
+                                       [(document_id, position, chunk) for position, chunk in enumerate(chunks)])
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        logger.debug('Stored %s/%s (%d chunks)', directory, doc['filename'], len(chunks))
+        return True
+
+    def remove(self, directory: str, filename: str) -> bool:
+        with self._write_lock:
+            cursor = self._connection().execute('DELETE FROM documents WHERE directory = ? AND filename = ?',
+                                                (directory, filename))
+            return cursor.rowcount > 0
+
+    def clear(self):
+        with self._write_lock:
+            self._connection().execute('DELETE FROM documents')
+
+    def retain(self, keys: Iterable[Tuple[str, str]]) -> int:
+        """Remove every document whose (directory, filename) is not in keys; returns how many."""
+        keep = set(keys)
+        stored = [(row['directory'], row['filename'])
+                  for row in self._connection().execute('SELECT directory, filename FROM documents')]
+        removed = sum(self.remove(directory, filename) for directory, filename in stored
+                      if (directory, filename) not in keep)
+        if removed:
+            logger.info('Removed %d documents from chunk store %s', removed, self.path)
+        return removed
+
+    def sync(self, documents: Iterable[dict]) -> Dict[str, int]:
+        """Make the store hold exactly these documents; unchanged ones are not rewritten."""
+        documents = list(documents)
+        counts = {'stored': 0, 'unchanged': 0}
+        for doc in documents:
+            counts['stored' if self.upsert(doc) else 'unchanged'] += 1
+        counts['removed'] = self.retain((doc.get('directory', ''), doc['filename']) for doc in documents)
+        return counts
+
+    def on_corpus_change(self, event: str, doc: Optional[dict]):
+        """Corpus listener writing every change through to the store."""
+        try:
+            if event == 'add':
+                self.upsert(doc)
+            elif event == 'remove':
+                self.remove(doc.get('directory', ''), doc['filename'])
+            elif event == 'clear':
+                self.clear()
+        except sqlite3.Error as e:
+            logger.error('Chunk store update (%s) failed: %s', event, e)
+
+    # ------------------------------------------------------------------ reads
+
+    def documents(self) -> List[dict]:
+        """All stored documents, oldest first, in the corpus' dict format."""
+        rows = self._connection().execute(
+            'SELECT directory, filename, file_type, content FROM documents ORDER BY updated, id')
+        return [{'filename': row['filename'], 'content': row['content'], 'directory': row['directory'],
+                 'file_type': row['file_type']} for row in rows]
+
+    def search(self, query: str, limit: int = 10, filters=None) -> List[dict]:
+        """Chunks matching any query word, best bm25 rank first.
+
+        'similarity' is the negated bm25 rank, so higher is better. filters
+        (as parsed by facets.parse_filters) restrict the documents searched;
+        filename patterns are SQLite GLOBs over the lowercased filename.
+        """
+        match = fts_query(query, self.tokenize)
+        if not match:
+            return []
+        clauses, parameters = [], [match]
+        for facet, values in filters or ():
+            if facet == 'filename':
+                clauses.append('(%s)' % ' OR '.join(['lower(d.filename) GLOB ?'] * len(values)))
+            else:
+                clauses.append('d.%s IN (%s)' % (facet, ', '.join('?' * len(values))))
+            parameters.extend(values)
+        rows = self._connection().execute(
+            'SELECT c.id, c.position, c.content, d.filename, d.directory, bm25(chunks_fts) AS rank '
+            'FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid JOIN documents d ON d.id = c.document_id '
+            'WHERE chunks_fts MATCH ?%s ORDER BY rank LIMIT ?' % ''.join(' AND ' + c for c in clauses),
+            parameters + [limit])
+        return [{'content': row['content'], 'source': row['filename'], 'similarity': -row['rank'],
+                 'chunk_id': row['id'], 'position': row['position'], 'directory': row['directory']}
+                for row in rows]
+
+    def vocabulary(self) -> Dict[str, int]:
+        """Number of chunks containing each term of the FTS5 index."""
+        return {row['term']: row['doc'] for row in self._connection().execute('SELECT term, doc FROM chunks_vocab')}
+
+    def stats(self) -> Dict[str, int]:
+        connection = self._connection()
+        return {
+            'documents': connection.execute('SELECT COUNT(*) FROM documents').fetchone()[0],
+            'chunks': connection.execute('SELECT COUNT(*) FROM chunks').fetchone()[0],
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
@@ -1,7 +1,10 @@
 import os
+import logging
 from typing import List, Optional, Dict
 from models.document import Document
 
+logger = logging.getLogger('document_controller')
+
 class DocumentController:
     def __init__(self, base_dir: str):
         self.base_dir = os.path.abspath(base_dir)
@@ -29,14 +32,14 @@ class DocumentController:
         """Process a single document and return its content."""
         abs_path = os.path.abspath(file_path)
         if not os.path.exists(abs_path):
-            print(f"File does not exist: {abs_path}")
+            logger.warning("File does not exist: %s", abs_path)
             return None
             
         # If this is a temporary DOCX file created from a DOC file, skip it
         if abs_path.endswith('.docx'):
             doc_path = abs_path.replace('.docx', '.doc')
             if os.path.exists(doc_path):
-                print(f"Skipping temporary DOCX file: {abs_path}")
+                logger.debug("Skipping temporary DOCX file: %s", abs_path)
                 return None
                 
         if abs_path not in self.documents:
@@ -45,25 +48,25 @@ class DocumentController:
         doc = self.documents[abs_path]
         content = doc.extract_content()
         if content is None:
-            print(f"Failed to extract content from: {abs_path}")
+            logger.warning("Failed to extract content from: %s", abs_path)
         return content
     
     def process_all_documents(self) -> Dict[str, Optional[str]]:
         """Process all documents in the base directory."""
         # First scan to ensure we have all current files
         found_files = self.scan_directory()
-        print(f"Found {len(found_files)} files to process")
+        logger.info("Found %d files to process", len(found_files))
         
         results = {}
         # Process each document that exists
         for file_path in found_files:
             if os.path.exists(file_path):  # Verify file still exists
-                print(f"Processing file: {file_path}")
+                logger.info("Processing file: %s", file_path)
                 content = self.process_document(file_path)
                 if content is not None:  # Only include successfully processed files
                     results[file_path] = content
             else:
-                print(f"File no longer exists: {file_path}")
+                logger.warning("File no longer exists: %s", file_path)
         return results
     
     def get_document_content(self, file_path: str) -> Optional[str]:
@@ -0,0 +1,158 @@
+"""Near-duplicate chunk detection with MinHash and locality-sensitive hashing.
+
+The same passage often reaches the corpus several times: a sicha exported as
+PDF and DOCX, or transcribed from audio. Each chunk is reduced to a set of
+shingles, the SHINGLE_BYTES bytes of its normalized UTF-8 text (lowercase,
+runs of ASCII punctuation and whitespace as one space) starting at every
+word, about two and a half words. The Jaccard similarity of two such sets is estimated by the
+share of equal values in their MinHash signatures.
+
+LSH finds the candidate pairs without comparing every pair: signatures are
+cut into BANDS bands, and chunks whose values agree on a whole band land in
+the same bucket. A pair is linked when its estimated similarity reaches the
+threshold. Linked chunks form clusters, and every cluster is represented by
+its first chunk.
+
+Shingles and signatures are computed with numpy over one byte buffer of all
+chunks, so nothing here compares chunk text or loops over shingles in Python.
+"""
+import logging
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('dedup')
+
+NUM_PERMUTATIONS = 64
+BANDS = 16  # 4 rows per band: pairs above ~0.5 similarity usually share a bucket
+SHINGLE_BYTES = 16
+DEFAULT_THRESHOLD = 0.8
+# Shingles hashed per block; bounds the (shingles x permutations) temporary
+_BLOCK_SHINGLES = 1 << 15
+# Bytes that belong to words: ASCII letters and digits, and every byte of a multi-byte UTF-8 character
+_WORD_BYTES = np.zeros(256, dtype=bool)
+_WORD_BYTES[[ord(c) for c in 'abcdefghijklmnopqrstuvwxyz0123456789']] = True
+_WORD_BYTES[0x80:] = True
+# Odd 64-bit multipliers mixing the two 8-byte halves of a shingle into one 32-bit hash
+_MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9))
+
+
+def _normalized_buffer(chunks: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(buffer, offsets): every chunk's lowercased UTF-8 words separated by single spaces (runs of ASCII
+    punctuation and whitespace), each chunk followed by SHINGLE_BYTES zero bytes; chunk i starts at offsets[i].
+    """
+    separator = b'\0' * SHINGLE_BYTES  # shingles at the end of a chunk run into these, never into the next chunk
+    texts = [chunk.lower().encode('utf-8', 'surrogatepass') + separator for chunk in chunks]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) for text in texts])
+    raw = np.frombuffer(b''.join(texts), dtype=np.uint8)
+    word = _WORD_BYTES[raw]
+    separator_byte = raw == 0
+    other = ~word & ~separator_byte
+    # Position of the first word or separator byte at or after every byte (the buffer ends in a separator)
+    marks = np.where(other, len(raw), np.arange(len(raw)))
+    next_mark = np.minimum.accumulate(marks[::-1])[::-1]
+    # Word bytes, separators, and, as a space, the first byte of every run of other bytes between two words
+    kept = word | separator_byte | (other & np.r_[False, word[:-1]] & word[next_mark])
+    buffer = np.where(other, np.uint8(ord(' ')), raw)[kept]
+    new_offsets = np.zeros(len(offsets), dtype=np.int64)
+    new_offsets[1:] = np.cumsum(kept)[offsets[1:] - 1]
+    return buffer, new_offsets
+
+
+def shingle_hashes(chunks: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(hashes, indptr): 32-bit hashes of every chunk's shingles, those of chunk i in hashes[indptr[i]:indptr[i + 1]]."""
+    buffer, offsets = _normalized_buffer(chunks)
+    buffer = np.r_[buffer, np.zeros(SHINGLE_BYTES, dtype=np.uint8)]
+    in_word = _WORD_BYTES[buffer]
+    starts = np.flatnonzero(in_word & ~np.r_[False, in_word[:-1]])
+    halves = []
+    for half in range(2):
+        value = np.zeros(len(starts), dtype=np.uint64)
+        for byte in range(8):
+            value |= buffer[starts + half * 8 + byte].astype(np.uint64) << np.uint64(8 * byte)
+        halves.append(value)
+    mixed = (halves[0] * _MIX[0] + halves[1] * _MIX[1]) * _MIX[2]
+    return (mixed >> np.uint64(32)).astype(np.uint32), np.searchsorted(starts, offsets)
+
+
+def minhash_signatures(chunks: Sequence[str], num_permutations: int = NUM_PERMUTATIONS,
+                       seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """(signatures, has_shingles): the MinHash signature of every chunk (chunks x num_permutations).
+
+    The permutations are x -> a * x + b modulo 2**32 with odd a. Chunks with
+    no words get no meaningful signature and are flagged False in
+    has_shingles.
+    """
+    hashes, indptr = shingle_hashes(chunks)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 1 << 32, size=num_permutations, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+    b = rng.integers(0, 1 << 32, size=num_permutations, dtype=np.uint64).astype(np.uint32)
+    has_shingles = np.diff(indptr) > 0
+    signatures = np.full((len(chunks), num_permutations), np.iinfo(np.uint32).max, dtype=np.uint32)
+    start_row = 0
+    while start_row < len(chunks):
+        # Whole rows whose shingles fit in one block (at least one row)
+        stop_row = max(int(np.searchsorted(indptr, indptr[start_row] + _BLOCK_SHINGLES, side='right')) - 1,
+                       start_row + 1)
+        stop_row = min(stop_row, len(chunks))
+        rows = np.flatnonzero(has_shingles[start_row:stop_row]) + start_row
+        if len(rows):
+            lo, hi = indptr[start_row], indptr[stop_row]
+            # permutations x shingles, so each reduction runs over contiguous memory
+            permuted = a[:, np.newaxis] * hashes[np.newaxis, lo:hi] + b[:, np.newaxis]
+            signatures[rows] = np.minimum.reduceat(permuted, indptr[rows] - lo, axis=1).T
+        start_row = stop_row
+    return signatures, has_shingles
+
+
+def _find(parent: List[int], item: int) -> int:
+    while parent[item] != item:
+        parent[item] = parent[parent[item]]
+        item = parent[item]
+    return item
+
+
+def cluster_representatives(signatures: np.ndarray, has_shingles: np.ndarray,
+                            threshold: float = DEFAULT_THRESHOLD, bands: int = BANDS) -> np.ndarray:
+    """For every chunk, the index of the first chunk of its near-duplicate cluster (itself if unique)."""
+    count, permutations = signatures.shape
+    parent = list(range(count))
+    linked = set()
+    rows_per_band = permutations // bands
+    eligible = np.flatnonzero(has_shingles)
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[eligible, band * rows_per_band:(band + 1) * rows_per_band])
+        _, bucket = np.unique(keys.view(np.dtype((np.void, keys.dtype.itemsize * rows_per_band))),
+                              return_inverse=True)
+        bucket = bucket.ravel()
+        order = np.argsort(bucket, kind='stable')
+        sorted_buckets = bucket[order]
+        starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+        first = np.repeat(order[starts], np.diff(np.r_[starts, len(order)]))
+        pairs = first != order
+        if not pairs.any():
+            continue
+        left, right = eligible[first[pairs]], eligible[order[pairs]]
+        similar = (signatures[left] == signatures[right]).mean(axis=1) >= threshold
+        for i, j in zip(left[similar].tolist(), right[similar].tolist()):
+            root_i, root_j = _find(parent, i), _find(parent, j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+                linked.update((i, j))
+    representatives = np.arange(count, dtype=np.int64)
+    for item in linked:
+        representatives[item] = _find(parent, item)
+    return representatives
+
+
+def near_duplicates(chunks: Sequence[str], threshold: float = DEFAULT_THRESHOLD) -> np.ndarray:
+    """Representative (first near-duplicate) of every chunk; see cluster_representatives."""
+    start = time.perf_counter()
+    signatures, has_shingles = minhash_signatures(chunks)
+    representatives = cluster_representatives(signatures, has_shingles, threshold)
+    duplicates = int((representatives != np.arange(len(chunks))).sum())
+    logger.info('Near-duplicate detection: %d of %d chunks duplicate an earlier one (%.1f ms)', duplicates,
+                len(chunks), (time.perf_counter() - start) * 1000)
+    return representatives
@@ -0,0 +1,332 @@
+"""Dense latent-semantic (LSA) chunk vectors for paraphrase-tolerant retrieval.
+
+TruncatedSVD projects the chunk TF-IDF matrix onto a few hundred latent
+dimensions, where chunks about the same idea score high even when they share
+no words with the question. The chunk vectors are L2-normalized and kept as
+one contiguous quantized matrix:
+
+  int8     4x smaller than float32; rows scaled to [-127, 127], one float
+           scale per row. Dequantizing is cheap, so scoring runs close to
+           float32 BLAS speed (the default).
+  float16  2x smaller, more precise, but numpy converts it slowly.
+  float32  no quantization.
+
+A query is scored against every chunk with one matrix product per block of
+rows (a single product for small corpora), bounding the float32 temporaries.
+
+Fitting needs the whole corpus, so an index can be built offline and loaded
+by the app (LSA_INDEX_PATH):
+
+    python -m dense_index --output data/lsa.npz --directories pdfs test_audio
+    python -m dense_index --output data/lsa.npz --store data/chunks.db --dtype float16 --ann
+
+Saved vectors are keyed by a hash of each chunk's text, so a saved index
+still matches when documents are ingested in a different order. When the
+corpus changes, the index of the previous corpus is extended instead of
+refitted: vectors of removed chunks are dropped and new chunks are projected
+with the existing SVD ("folded in"). Once more than half of the chunks would
+be folded in, the index is refitted.
+
+Large corpora also get an IVF approximate nearest-neighbour index over the
+vectors (see ann_index.py), saved in the same file and extended the same way.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from ann_index import DEFAULT_NPROBE, IvfIndex
+from retrieval import ChunkIndex, create_vectorizer
+
+logger = logging.getLogger('dense_index')
+
+DTYPES = ('int8', 'float16', 'float32')
+DEFAULT_DIMENSIONS = 256
+# Rows dequantized per matrix product; bounds the float32 temporary per query block
+BLOCK_ROWS = 65536
+# Refit instead of extending an index when more than this share of the chunks would be folded in
+MAX_FOLDED_SHARE = 0.5
+
+_fit_lock = threading.Lock()
+_save_lock = threading.Lock()
+# LSA index of the most recent corpus, extended when the corpus changes
+_latest: Optional['LsaIndex'] = None
+
+
+def chunk_keys(chunks: Sequence[str]) -> np.ndarray:
+    """64-bit hash of every chunk's text, used to match saved vectors to chunks."""
+    return np.array([int.from_bytes(hashlib.blake2b(chunk.encode('utf-8', 'surrogatepass'), digest_size=8).digest(),
+                                    'little') for chunk in chunks], dtype=np.uint64)
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """Return (stored matrix, per-row scales or None) for L2-normalized float32 vectors."""
+    if dtype == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        stored = np.rint(vectors / scales[:, np.newaxis]).astype(np.int8)
+        return np.ascontiguousarray(stored), scales.astype(np.float32)
+    if dtype in ('float16', 'float32'):
+        return np.ascontiguousarray(vectors.astype(dtype)), None
+    raise ValueError(f"dtype must be one of {DTYPES}, not {dtype!r}")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class LsaIndex:
+    """Quantized LSA vectors of the chunks of one ChunkIndex, plus the query projection."""
+
+    def __init__(self, vectorizer, components: np.ndarray, vectors: np.ndarray, scales: Optional[np.ndarray],
+                 keys: np.ndarray, ann: Optional[IvfIndex] = None):
+        self.vectorizer = vectorizer
+        self.components = components  # dimensions x vocabulary, float32
+        self.vectors = vectors          # chunks x dimensions, int8/float16/float32
+        self.scales = scales            # per-row scale for int8 vectors
+        self.keys = keys                # chunk text hashes, row order of vectors
+        self.ann = ann                  # approximate nearest-neighbour index over the rows, if trained
+
+    @property
+    def dimensions(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def dtype(self) -> str:
+        return self.vectors.dtype.name
+
+    @property
+    def memory_bytes(self) -> int:
+        scales = self.scales.nbytes if self.scales is not None else 0
+        ann = self.ann.memory_bytes if self.ann is not None else 0
+        return self.vectors.nbytes + scales + self.components.nbytes + ann
+
+    @classmethod
+    def fit(cls, index: ChunkIndex, dimensions: int = DEFAULT_DIMENSIONS, dtype: str = 'int8',
+            seed: int = 0) -> 'LsaIndex':
+        """Fit TruncatedSVD on the index's TF-IDF matrix and quantize the chunk vectors."""
+        from sklearn.decomposition import TruncatedSVD
+        if index.matrix is None:
+            raise ValueError("The chunk index has no TF-IDF matrix to decompose")
+        dimensions = max(1, min(dimensions, index.matrix.shape[1] - 1, index.matrix.shape[0] - 1))
+        start = time.perf_counter()
+        svd = TruncatedSVD(n_components=dimensions, algorithm='randomized', random_state=seed)
+        vectors = _normalize(svd.fit_transform(index.matrix))
+        stored, scales = quantize(vectors, dtype)
+        logger.info('Fitted %d-dimension LSA over %d chunks in %.1f s (%s, %.1f MB)', dimensions,
+                    len(index.chunks), time.perf_counter() - start, dtype, stored.nbytes / 1e6)
+        return cls(index.vectorizer, svd.components_.astype(np.float32), stored, scales, chunk_keys(index.chunks))
+
+    def project(self, queries: Sequence[str]) -> np.ndarray:
+        """Normalized LSA vectors of the queries (queries x dimensions)."""
+        return _normalize(np.asarray(self.vectorizer.transform(queries) @ self.components.T))
+
+    def scores(self, queries: Sequence[str], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of every query to every chunk (queries x chunks, float32).
+
+        With rows, only those chunks are scored (queries x len(rows)).
+        """
+        projected = self.project(queries)
+        count = len(self.vectors) if rows is None else len(rows)
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            if rows is None:
+                block = self.vectors[start:start + BLOCK_ROWS]
+            else:
+                block = self.vectors[rows[start:start + BLOCK_ROWS]]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            scores[:, start:start + len(block)] = projected @ block.T
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def nearest(self, queries: Sequence[str], k: int, nprobe: int = DEFAULT_NPROBE):
+        """Approximate k best chunks of every query from the IVF index: (rows, scores), queries x k."""
+        return self.ann.search(self.project(queries), self.vectors, self.scales, k, nprobe)
+
+    def train_ann(self, lists: int = 0, seed: int = 0):
+        self.ann = IvfIndex.train(self.vectors, self.scales, lists, seed)
+
+    def extended_to(self, index: ChunkIndex, max_folded_share: float = MAX_FOLDED_SHARE) -> Optional['LsaIndex']:
+        """This index with its rows in the chunk index's order, or None if too much has changed.
+
+        Chunks with a saved vector keep it; the others are folded in. None
+        when more than max_folded_share of the chunks would be folded in.
+        """
+        keys = chunk_keys(index.chunks)
+        if np.array_equal(keys, self.keys):
+            return self
+        if not len(self.keys):
+            return None
+        order = np.argsort(self.keys)
+        rows = order[np.minimum(np.searchsorted(self.keys, keys, sorter=order), len(order) - 1)]
+        known = self.keys[rows] == keys
+        folded = np.flatnonzero(~known)
+        if len(folded) > max_folded_share * len(keys):
+            return None
+
+        vectors = np.empty((len(keys), self.dimensions), dtype=self.vectors.dtype)
+        vectors[known] = self.vectors[rows[known]]
+        scales = None
+        if self.scales is not None:
+            scales = np.empty(len(keys), dtype=np.float32)
+            scales[known] = self.scales[rows[known]]
+        if len(folded):
+            folded_vectors, folded_scales = quantize(self.project([index.chunks[i] for i in folded]), self.dtype)
+            vectors[folded] = folded_vectors
+            if scales is not None:
+                scales[folded] = folded_scales
+
+        ann = None
+        if self.ann is not None:
+            mapping = np.full(len(self.keys), -1, dtype=np.int64)
+            mapping[rows[known]] = np.flatnonzero(known)
+            ann = self.ann.remapped(mapping)
+            # Folded-in chunks, and repeats of a chunk text, are not in the index yet
+            missing = np.setdiff1d(np.arange(len(keys)), mapping[mapping >= 0], assume_unique=True)
+            ann.add(missing, vectors[missing], scales[missing] if scales is not None else None)
+        logger.info('Extended LSA index to %d chunks (%d folded in)', len(keys), len(folded))
+        return LsaIndex(self.vectorizer, self.components, vectors, scales, keys, ann)
+
+    def save(self, path: str):
+        """Write the index to a .npz file (vectors, projection and the TF-IDF vocabulary)."""
+        terms = sorted(self.vectorizer.vocabulary_, key=self.vectorizer.vocabulary_.get)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = path + '.tmp.npz'
+        ann = self.ann.arrays() if self.ann is not None else {}
+        with _save_lock:
+            np.savez(temporary, vectors=self.vectors, components=self.components, keys=self.keys,
+                     scales=self.scales if self.scales is not None else np.empty(0, dtype=np.float32),
+                     terms=np.array(terms, dtype=str), idf=self.vectorizer.idf_, **ann)
+            os.replace(temporary, path)
+        logger.info('Saved LSA index to %s', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'LsaIndex':
+        with np.load(path) as data:
+            vectorizer = create_vectorizer()
+            vectorizer.vocabulary_ = {str(term): i for i, term in enumerate(data['terms'])}
+            vectorizer.idf_ = data['idf']
+            scales = data['scales'] if len(data['scales']) else None
+            return cls(vectorizer, data['components'], data['vectors'], scales, data['keys'],
+                       IvfIndex.from_arrays(data))
+
+
+def lsa_for(index: ChunkIndex, path: str = '', dimensions: int = DEFAULT_DIMENSIONS, dtype: str = 'int8',
+            ann_min_chunks: int = 0, ann_lists: int = 0, persist: bool = False) -> Optional[LsaIndex]:
+    """Return the LSA index of a ChunkIndex, extending the previous one or fitting it on first use.
+
+    The index of the previous corpus, else the one saved at path, is
+    extended to the chunks if it still mostly matches them; otherwise a new
+    one is fitted. An IVF index is trained once the corpus has
+    ann_min_chunks chunks (0: never), and retrained when it outgrows its
+    training. With persist, a new or changed index is saved to path in the
+    background. The result is cached on the ChunkIndex, so it is dropped
+    with it when the corpus changes. None if the chunk index has no TF-IDF
+    matrix.
+    """
+    global _latest
+    if index.matrix is None:
+        return None
+    lsa = getattr(index, 'lsa', None)
+    if lsa is None:
+        with _fit_lock:
+            lsa = getattr(index, 'lsa', None)
+            if lsa is None:
+                lsa, changed = _extend_previous(index, path)
+                if lsa is None:
+                    lsa, changed = LsaIndex.fit(index, dimensions, dtype), True
+                if ann_min_chunks and len(index.chunks) >= ann_min_chunks and \
+                        (lsa.ann is None or lsa.ann.needs_training):
+                    lsa.train_ann(ann_lists)
+                    changed = True
+                index.lsa = _latest = lsa
+                if persist and path and changed:
+                    threading.Thread(target=lsa.save, args=(path,), name='lsa-save', daemon=True).start()
+    return lsa
+
+
+def _extend_previous(index: ChunkIndex, path: str):
+    """(LSA index extended to index, whether it differs from the one saved at path), or (None, True)."""
+    if _latest is not None:
+        extended = _latest.extended_to(index)
+        if extended is not None:
+            return extended, extended is not _latest
+    if path and os.path.exists(path):
+        try:
+            saved = LsaIndex.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning('Cannot load LSA index %s: %s', path, e)
+            return None, True
+        extended = saved.extended_to(index)
+        if extended is not None:
+            return extended, extended is not saved
+        logger.warning('LSA index %s does not match the corpus; refitting', path)
+    return None, True
+
+
+def _load_documents(args) -> List[dict]:
+    if args.store:
+        from chunk_store import ChunkStore
+        from retrieval import split_text_into_chunks, tokenize
+        store = ChunkStore(args.store, split_text_into_chunks, tokenize)
+        try:
+            return store.documents()
+        finally:
+            store.close()
+    from extractors import extract_text, get_file_type
+    documents = []
+    for directory in args.directories:
+        for filename in sorted(os.listdir(directory)):
+            file_type = get_file_type(filename)
+            path = os.path.join(directory, filename)
+            if file_type is None or not os.path.isfile(path):
+                continue
+            content = extract_text(path, file_type)
+            if content and content.strip():
+                documents.append({'filename': filename, 'content': content, 'directory': directory,
+                                  'file_type': file_type})
+    return documents
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the LSA dense retrieval index offline.')
+    parser.add_argument('--output', required=True, help='.npz file to write (the app reads LSA_INDEX_PATH)')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--store', help='read documents from this chunk store database')
+    source.add_argument('--directories', nargs='+', default=['pdfs', 'test_audio'],
+                        help='extract documents from these directories')
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument('--dtype', choices=DTYPES, default='int8')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ann', action='store_true', help='also train an IVF approximate nearest-neighbour index')
+    parser.add_argument('--ann-lists', type=int, default=0, help='IVF clusters (default: about 4 * sqrt(chunks))')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    documents = _load_documents(args)
+    index = ChunkIndex.build(documents)
+    if index.matrix is None:
+        print('No TF-IDF matrix could be fitted (empty or tiny corpus)', file=sys.stderr)
+        return 1
+    lsa = LsaIndex.fit(index, args.dimensions, args.dtype, args.seed)
+    if args.ann:
+        lsa.train_ann(args.ann_lists, args.seed)
+    lsa.save(args.output)
+    print(f"{len(documents)} documents, {len(index.chunks)} chunks, {lsa.dimensions} dimensions, "
+          f"{lsa.dtype}: {lsa.vectors.nbytes / 1e6:.1f} MB vectors vs {index.memory_bytes / 1e6:.1f} MB sparse index")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""Sandboxed extraction worker pool.
+
+Text extraction runs in separate worker processes so that a malformed PDF or a
+corrupt audio file can only ever take down its own worker. Each file gets a
+wall-clock limit and each worker a resident-memory cap; a worker that exceeds
+either is killed and replaced and the file is reported as failed.
+"""
+import collections
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, as_completed
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import extractors
+
+logger = logging.getLogger('extraction_pool')
+
+DEFAULT_TIMEOUT = 120.0          # seconds per document
+DEFAULT_TIMEOUTS = {'audio': 1800.0}  # transcription is much slower than parsing
+DEFAULT_MAX_RSS_MB = 1024
+RSS_POLL_INTERVAL = 0.5
+
+
+class ExtractionError(Exception):
+    """Raised when a file could not be extracted in the worker pool."""
+
+
+class ExtractionTimeout(ExtractionError):
+    """The worker exceeded the per-file wall-clock limit."""
+
+
+class ExtractionMemoryError(ExtractionError):
+    """The worker exceeded the resident memory cap."""
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Return the resident set size of a process in MB, if it can be measured."""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _worker_main(conn, order):
+    """Worker loop: receive (file_path, file_type) tasks and send back results.
+
+    Replies are (ok, text-or-error, observations) where observations are the
+    extractor timings recorded while handling the task, replayed into the
+    parent's metrics.
+    """
+    extractors.set_backend_order(order)
+    observations = []
+    extractors.extraction_observer = lambda *observation: observations.append(observation)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        file_path, file_type = task
+        del observations[:]
+        try:
+            # The parent owns the shared cache, so never cache in the worker
+            text = '\n'.join(extractors.iter_text(file_path, file_type, use_cache=False))
+            conn.send((True, text if text.strip() else None, observations))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}", observations))
+
+
+class _Worker:
+    def __init__(self, ctx, order):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, order), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = 0.0
+        self.tasks_done = 0
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except Exception as e:
+            logger.warning("Error killing extraction worker %s: %s", self.process.pid, e)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=2)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class _Task:
+    def __init__(self, file_path: str, file_type: Optional[str], timeout: float):
+        self.file_path = file_path
+        self.file_type = file_type
+        self.timeout = timeout
+        self.future: Future = Future()
+        self.cache_key = extractors.ExtractionCache.key_for(file_path)
+
+
+class ExtractionPool:
+    """Pool of isolated extraction processes with per-file time and memory caps.
+
+    Tasks are handed out by a dispatcher thread; ``submit`` returns a
+    ``concurrent.futures.Future`` resolving to the extracted text (or None when
+    the file has no text) and failing with an ExtractionError subclass.
+    With ``workers=0`` extraction runs inline in the calling thread.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = DEFAULT_TIMEOUT,
+                 max_rss_mb: Optional[float] = DEFAULT_MAX_RSS_MB,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 max_tasks_per_worker: int = 50, start_method: Optional[str] = None,
+                 name: str = 'extraction'):
+        self.workers = workers
+        self.timeout = timeout
+        self.timeouts = dict(DEFAULT_TIMEOUTS if timeouts is None else timeouts)
+        self.max_rss_mb = max_rss_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.name = name
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self._ctx = multiprocessing.get_context(start_method)
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._wake_r, self._wake_w = multiprocessing.Pipe(duplex=False)
+        self._workers = []
+        self._thread = None
+        self._closed = False
+        self.stats = collections.Counter()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, file_path: str, file_type: Optional[str] = None) -> Future:
+        """Queue a file for extraction and return a Future for its text."""
+        file_type = file_type or extractors.get_file_type(file_path)
+        task = _Task(file_path, file_type, self.timeouts.get(file_type, self.timeout))
+
+        cached = extractors.cache.get(task.cache_key)
+        if cached is not None:
+            task.future.set_result(cached)
+            return task.future
+
+        if self.workers <= 0:
+            self._run_inline(task)
+            return task.future
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Extraction pool {self.name} is shut down")
+            self._pending.append(task)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name=f'{self.name}-dispatcher',
+                                                daemon=True)
+                self._thread.start()
+        self._wake()
+        return task.future
+
+    def map_unordered(self, items: Iterable[Tuple[str, Optional[str]]]) -> Iterator[Tuple[str, Future]]:
+        """Submit (file_path, file_type) pairs and yield (file_path, future) as each finishes."""
+        futures = {self.submit(path, file_type): path for path, file_type in items}
+        for future in as_completed(futures):
+            yield futures[future], future
+
+    def shutdown(self):
+        """Stop the dispatcher and all worker processes; pending tasks are failed."""
+        with self._lock:
+            self._closed = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    # ------------------------------------------------------------------
+    # Dispatcher
+    # ------------------------------------------------------------------
+
+    def _wake(self):
+        try:
+            self._wake_w.send_bytes(b'')
+        except OSError:
+            pass
+
+    def _run_inline(self, task: _Task):
+        try:
+            text = '\n'.join(extractors.iter_text(task.file_path, task.file_type, use_cache=False))
+        except Exception as e:
+            task.future.set_exception(ExtractionError(f"{type(e).__name__}: {e}"))
+            return
+        self._finish(task, True, text if text.strip() else None)
+
+    def _finish(self, task: _Task, ok: bool, payload):
+        if ok:
+            self.stats['completed'] += 1
+            if payload is not None and task.cache_key is not None:
+                extractors.cache.put(task.cache_key, payload)
+            task.future.set_result(payload)
+        else:
+            self.stats['failed'] += 1
+            error = payload if isinstance(payload, ExtractionError) else ExtractionError(payload)
+            task.future.set_exception(error)
+
+    def _spawn_worker(self) -> _Worker:
+        worker = _Worker(self._ctx, extractors.backend_order())
+        self.stats['workers_started'] += 1
+        return worker
+
+    def _replace(self, worker: _Worker):
+        worker.kill()
+        self._workers.remove(worker)
+        self.stats['workers_killed'] += 1
+
+    def _assign(self):
+        """Hand pending tasks to idle workers, starting workers up to the limit."""
+        with self._lock:
+            while self._pending:
+                idle = next((w for w in self._workers if w.task is None), None)
+                if idle is None:
+                    if len(self._workers) >= self.workers:
+                        return
+                    idle = self._spawn_worker()
+                    self._workers.append(idle)
+                task = self._pending.popleft()
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    idle.conn.send((task.file_path, task.file_type))
+                except OSError as e:
+                    self._replace(idle)
+                    self._finish(task, False, ExtractionError(f"Worker unavailable: {e}"))
+                    continue
+                idle.task = task
+                idle.started = time.monotonic()
+
+    def _check_worker(self, worker: _Worker, ready, now: float, poll_rss: bool):
+        task = worker.task
+        if worker.conn in ready:
+            try:
+                ok, payload, observations = worker.conn.recv()
+            except (EOFError, OSError):
+                ok, payload, observations = None, None, ()
+            for observation in observations:
+                extractors.record_extraction(*observation)
+            if ok is not None:
+                worker.task = None
+                worker.tasks_done += 1
+                self._finish(task, ok, payload)
+                if worker.tasks_done >= self.max_tasks_per_worker:
+                    worker.stop()
+                    self._workers.remove(worker)
+                return
+        if not worker.process.is_alive():
+            code = worker.process.exitcode
+            logger.error("Extraction worker died on %s (exit code %s)", task.file_path, code)
+            self._replace(worker)
+            self._finish(task, False, ExtractionError(f"Worker crashed (exit code {code})"))
+        elif now - worker.started > task.timeout:
+            logger.error("Extraction of %s exceeded %.0fs, killing worker", task.file_path, task.timeout)
+            self._replace(worker)
+            self._finish(task, False, ExtractionTimeout(f"Timed out after {task.timeout:.0f}s"))
+        elif poll_rss and self.max_rss_mb:
+            rss = _rss_mb(worker.process.pid)
+            if rss is not None and rss > self.max_rss_mb:
+                logger.error("Extraction of %s used %.0f MB (cap %.0f MB), killing worker",
+                             task.file_path, rss, self.max_rss_mb)
+                self._replace(worker)
+                self._finish(task, False, ExtractionMemoryError(
+                    f"Exceeded memory cap of {self.max_rss_mb:.0f} MB"))
+
+    def _dispatch(self):
+        last_rss_poll = 0.0
+        while True:
+            with self._lock:
+                closed = self._closed
+            if closed:
+                break
+            self._assign()
+
+            busy = [w for w in self._workers if w.task is not None]
+            now = time.monotonic()
+            timeout = RSS_POLL_INTERVAL
+            for worker in busy:
+                timeout = min(timeout, max(0.0, worker.started + worker.task.timeout - now))
+            handles = [self._wake_r] + [w.conn for w in busy] + [w.process.sentinel for w in busy]
+            ready = wait(handles, timeout=timeout)
+            if self._wake_r in ready:
+                while self._wake_r.poll():
+                    self._wake_r.recv_bytes()
+
+            now = time.monotonic()
+            poll_rss = now - last_rss_poll >= RSS_POLL_INTERVAL
+            if poll_rss:
+                last_rss_poll = now
+            for worker in busy:
+                self._check_worker(worker, ready, now, poll_rss)
+
+        # Shutting down: fail anything still queued or running
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        for task in pending:
+            if task.future.set_running_or_notify_cancel():
+                self._finish(task, False, ExtractionError("Extraction pool shut down"))
+        for worker in list(self._workers):
+            if worker.task is not None:
+                self._finish(worker.task, False, ExtractionError("Extraction pool shut down"))
+            worker.stop()
+        self._workers.clear()
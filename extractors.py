@@ -0,0 +1,561 @@
+"""Text extractor registry shared by every ingestion path.
+
+Each file type ('pdf', 'docx', 'doc', 'txt', 'audio') can have several
+backends. The fastest installed backend is picked once at startup by a small
+benchmark, text is produced as a stream of segments (pages, paragraphs or
+blocks) and finished results are kept in a shared cache keyed by the file's
+path, size and modification time.
+"""
+import importlib.util
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+import metrics
+
+logger = logging.getLogger('extractors')
+
+# Map of lowercase extension -> registry file type
+EXTENSION_TYPES = {
+    '.pdf': 'pdf',
+    '.docx': 'docx',
+    '.doc': 'doc',
+    '.txt': 'txt',
+    '.wav': 'audio',
+    '.mp3': 'audio',
+    '.dat': 'audio',
+}
+
+# cp1252 before latin-1: latin-1 accepts every byte, so trying it first would
+# decode cp1252 smart quotes and dashes as control characters
+TXT_ENCODINGS = ['utf-8', 'cp1252', 'latin-1', 'ascii']
+TXT_BLOCK_SIZE = 64 * 1024
+DEFAULT_CACHE_CHARS = int(os.getenv('EXTRACTION_CACHE_CHARS', 50_000_000))
+
+
+def get_file_type(file_path: str) -> Optional[str]:
+    """Return the registry file type for a path, or None if unsupported."""
+    name = os.path.basename(file_path).lower()
+    if 'whatsapp audio' in name:
+        return 'audio'
+    return EXTENSION_TYPES.get(os.path.splitext(name)[1])
+
+
+class ExtractorBackend:
+    """A named text extraction implementation for a single file type."""
+
+    def __init__(self, file_type: str, name: str, func: Callable[[str], Iterator[str]],
+                 requires: Tuple[str, ...] = (), executable: Optional[str] = None):
+        self.file_type = file_type
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.executable = executable
+
+    def is_available(self) -> bool:
+        """Check whether the modules/executables this backend needs are installed."""
+        for module in self.requires:
+            try:
+                if importlib.util.find_spec(module) is None:
+                    return False
+            except (ImportError, ValueError):
+                return False
+        if self.executable and not shutil.which(self.executable):
+            return False
+        return True
+
+    def iter_text(self, file_path: str) -> Iterator[str]:
+        return self.func(file_path)
+
+    def __repr__(self):
+        return f"ExtractorBackend({self.file_type!r}, {self.name!r})"
+
+
+class ExtractionCache:
+    """Thread-safe LRU cache of extracted text, bounded by total characters."""
+
+    def __init__(self, max_chars: int = DEFAULT_CACHE_CHARS):
+        self.max_chars = max_chars
+        self._entries: 'OrderedDict[tuple, str]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(file_path: str) -> Optional[tuple]:
+        """Build a cache key that changes whenever the file is rewritten."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    def get(self, key: Optional[tuple]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key: Optional[tuple], text: str):
+        if key is None or len(text) > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = text
+            self._size += len(text)
+            while self._size > self.max_chars and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def chars(self) -> int:
+        """Total characters currently cached."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_BACKENDS: Dict[str, List[ExtractorBackend]] = {}
+_SELECTED: Dict[str, List[ExtractorBackend]] = {}
+_selection_lock = threading.Lock()
+cache = ExtractionCache()
+
+
+def register_backend(file_type: str, name: str, requires: Tuple[str, ...] = (),
+                     executable: Optional[str] = None):
+    """Decorator registering a generator function as an extractor backend.
+
+    Backends are tried in registration order unless the startup benchmark
+    finds a faster one.
+    """
+    def decorator(func):
+        _BACKENDS.setdefault(file_type, []).append(
+            ExtractorBackend(file_type, name, func, requires, executable))
+        # Force re-selection so a late registration is considered
+        _SELECTED.pop(file_type, None)
+        return func
+    return decorator
+
+
+# ==============================================
+# BACKENDS
+# ==============================================
+
+def _iter_pdf_pages(reader, file_path: str) -> Iterator[str]:
+    """Yield non-empty page texts from a pypdf/PyPDF2 reader, skipping bad pages."""
+    for page_num, page in enumerate(reader.pages):
+        try:
+            page_text = page.extract_text()
+        except Exception as e:
+            logger.warning("Error processing page %d of %s: %s", page_num, file_path, e)
+            continue
+        if page_text and page_text.strip():
+            yield page_text
+
+
+@register_backend('pdf', 'pymupdf', requires=('fitz',))
+def _pdf_pymupdf(file_path: str) -> Iterator[str]:
+    import fitz
+    with fitz.open(file_path) as pdf:
+        for page in pdf:
+            page_text = page.get_text()
+            if page_text.strip():
+                yield page_text
+
+
+@register_backend('pdf', 'pypdf', requires=('pypdf',))
+def _pdf_pypdf(file_path: str) -> Iterator[str]:
+    from pypdf import PdfReader
+    with open(file_path, 'rb') as file:
+        yield from _iter_pdf_pages(PdfReader(file), file_path)
+
+
+@register_backend('pdf', 'PyPDF2', requires=('PyPDF2',))
+def _pdf_pypdf2(file_path: str) -> Iterator[str]:
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        yield from _iter_pdf_pages(PyPDF2.PdfReader(file), file_path)
+
+
+_W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+@register_backend('docx', 'ooxml')
+def _docx_ooxml(file_path: str) -> Iterator[str]:
+    """Stream paragraphs straight out of word/document.xml without python-docx."""
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open('word/document.xml') as xml_file:
+            parts = []
+            for event, element in ElementTree.iterparse(xml_file, events=('end',)):
+                tag = element.tag
+                if tag == _W_NS + 't':
+                    parts.append(element.text or '')
+                elif tag == _W_NS + 'tab':
+                    parts.append('\t')
+                elif tag in (_W_NS + 'br', _W_NS + 'cr'):
+                    parts.append('\n')
+                elif tag == _W_NS + 'p':
+                    paragraph = ''.join(parts)
+                    parts = []
+                    element.clear()
+                    if paragraph.strip():
+                        yield paragraph
+
+
+@register_backend('docx', 'python-docx', requires=('docx',))
+def _docx_python_docx(file_path: str) -> Iterator[str]:
+    from docx import Document
+    for paragraph in Document(file_path).paragraphs:
+        if paragraph.text.strip():  # Only add non-empty paragraphs
+            yield paragraph.text
+
+
+@register_backend('doc', 'word-com', requires=('win32com', 'pythoncom'))
+def _doc_word_com(file_path: str) -> Iterator[str]:
+    """Convert DOC to DOCX with Word automation, then stream the DOCX."""
+    from document_processor import convert_doc_to_docx
+    temp_dir = tempfile.mkdtemp()
+    try:
+        base = os.path.splitext(os.path.basename(file_path))[0]
+        temp_docx = os.path.join(temp_dir, base + '.docx')
+        if not convert_doc_to_docx(os.path.abspath(file_path), temp_docx):
+            raise RuntimeError(f"Word could not convert {file_path}")
+        yield from iter_text(temp_docx, 'docx', use_cache=False)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@register_backend('doc', 'antiword', executable='antiword')
+def _doc_antiword(file_path: str) -> Iterator[str]:
+    import subprocess
+    result = subprocess.run(['antiword', file_path], capture_output=True, check=True)
+    text = result.stdout.decode('utf-8', errors='replace')
+    if text.strip():
+        yield text
+
+
+def _detect_encoding(file_path: str) -> Optional[str]:
+    """Return the first encoding in TXT_ENCODINGS that decodes the whole file."""
+    import codecs
+    for encoding in TXT_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(file_path, 'rb') as file:
+                for block in iter(lambda: file.read(TXT_BLOCK_SIZE), b''):
+                    decoder.decode(block)
+                decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+@register_backend('txt', 'text')
+def _txt_text(file_path: str) -> Iterator[str]:
+    encoding = _detect_encoding(file_path)
+    if encoding is None:
+        raise UnicodeDecodeError('txt', b'', 0, 0, 'no candidate encoding matched')
+    # Segments are split on line breaks so that '\n'.join() restores the file exactly. Only the new
+    # block is searched, and the unfinished line is kept as a list of blocks joined once it ends, so
+    # text without line breaks stays linear
+    pending = []
+    with open(file_path, 'r', encoding=encoding, newline='') as file:
+        for block in iter(lambda: file.read(TXT_BLOCK_SIZE), ''):
+            cut = block.rfind('\n')
+            if cut == -1:
+                pending.append(block)
+                continue
+            pending.append(block[:cut])
+            yield ''.join(pending)
+            pending = [block[cut + 1:]]
+    yield ''.join(pending)
+
+
+@register_backend('audio', 'speech_recognition', requires=('speech_recognition', 'pydub'))
+def _audio_speech_recognition(file_path: str) -> Iterator[str]:
+    from audio_processor import extract_text_from_audio
+    text = extract_text_from_audio(file_path)
+    if text:
+        yield text
+
+
+# ==============================================
+# BACKEND SELECTION
+# ==============================================
+
+BENCHMARK_TEXT = "Ahavas Yisrael begins with the simple unity of every Jew"
+
+
+def build_pdf_bytes(pages: List[str]) -> bytes:
+    """Build a minimal single-font PDF with one text page per entry in pages."""
+    def escape(line):
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_text in pages:
+        lines = page_text.split('\n') or ['']
+        ops = ["BT /F1 11 Tf 14 TL 50 780 Td"]
+        for line in lines:
+            ops.append(f"({escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = '\n'.join(ops).encode('latin-1', errors='replace')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref_offset = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(objects) + 1, xref_offset))
+    return out.getvalue()
+
+
+def build_docx_bytes(paragraphs: List[str]) -> bytes:
+    """Build a minimal DOCX package containing the given paragraphs."""
+    from xml.sax.saxutils import escape
+    body = ''.join(f'<w:p><w:r><w:t xml:space="preserve">{escape(p)}</w:t></w:r></w:p>'
+                   for p in paragraphs)
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'))
+        archive.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+            'relationships/officeDocument" Target="word/document.xml"/>'
+            '</Relationships>'))
+        archive.writestr('word/document.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'))
+    return out.getvalue()
+
+
+def _benchmark_samples() -> Dict[str, Tuple[str, bytes]]:
+    """Small in-memory fixtures used to time competing backends."""
+    lines = [f"{BENCHMARK_TEXT} {i}" for i in range(40)]
+    return {
+        'pdf': ('.pdf', build_pdf_bytes(['\n'.join(lines)] * 3)),
+        'docx': ('.docx', build_docx_bytes(lines * 3)),
+    }
+
+
+def _time_backend(backend: ExtractorBackend, sample_path: str, rounds: int = 3) -> Optional[float]:
+    """Return the best wall time for a backend on a sample, or None if it fails."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        try:
+            text = '\n'.join(backend.iter_text(sample_path))
+        except Exception as e:
+            logger.info("Backend %s failed benchmark: %s", backend.name, e)
+            return None
+        elapsed = time.perf_counter() - start
+        if BENCHMARK_TEXT not in text:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _parse_overrides() -> Dict[str, str]:
+    """Read EXTRACTOR_BACKENDS='pdf=pypdf,docx=ooxml' style overrides."""
+    overrides = {}
+    for item in os.getenv('EXTRACTOR_BACKENDS', '').split(','):
+        if '=' in item:
+            file_type, name = item.split('=', 1)
+            overrides[file_type.strip()] = name.strip()
+    return overrides
+
+
+def select_backends(benchmark: bool = True) -> Dict[str, str]:
+    """Pick the backend order for every file type and return the chosen names.
+
+    Available backends are ordered by a micro-benchmark on generated samples
+    where one exists; an EXTRACTOR_BACKENDS override always wins.
+    """
+    overrides = _parse_overrides()
+    samples = _benchmark_samples() if benchmark else {}
+    temp_dir = tempfile.mkdtemp() if samples else None
+    try:
+        with _selection_lock:
+            for file_type, backends in _BACKENDS.items():
+                available = [b for b in backends if b.is_available()]
+                if benchmark and file_type in samples and len(available) > 1:
+                    suffix, data = samples[file_type]
+                    sample_path = os.path.join(temp_dir, 'sample' + suffix)
+                    with open(sample_path, 'wb') as f:
+                        f.write(data)
+                    timings = {b.name: _time_backend(b, sample_path) for b in available}
+                    logger.info("Extractor benchmark for %s: %s", file_type, timings)
+                    # Failed backends sort last but remain as fallbacks
+                    available.sort(key=lambda b: (timings[b.name] is None, timings[b.name] or 0))
+                preferred = overrides.get(file_type)
+                if preferred:
+                    available.sort(key=lambda b: b.name != preferred)
+                _SELECTED[file_type] = available
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    chosen = selected_backends()
+    logger.info("Selected extractor backends: %s", chosen)
+    return chosen
+
+
+def _candidates(file_type: str) -> List[ExtractorBackend]:
+    if file_type not in _SELECTED:
+        with _selection_lock:
+            if file_type not in _SELECTED:
+                _SELECTED[file_type] = [b for b in _BACKENDS.get(file_type, []) if b.is_available()]
+    return _SELECTED[file_type]
+
+
+def selected_backends() -> Dict[str, str]:
+    """Return the preferred backend name for each file type that has one."""
+    return {ft: _candidates(ft)[0].name for ft in _BACKENDS if _candidates(ft)}
+
+
+def available_backends() -> Dict[str, List[str]]:
+    """Return every installed backend name per file type."""
+    return {ft: [b.name for b in backends if b.is_available()] for ft, backends in _BACKENDS.items()}
+
+
+def backend_order() -> Dict[str, List[str]]:
+    """Return the full selected backend order, e.g. to hand to a worker process."""
+    return {ft: [b.name for b in _candidates(ft)] for ft in _BACKENDS}
+
+
+def set_backend_order(order: Dict[str, List[str]]):
+    """Adopt a backend order chosen elsewhere instead of re-running the benchmark."""
+    with _selection_lock:
+        for file_type, names in order.items():
+            by_name = {b.name: b for b in _BACKENDS.get(file_type, [])}
+            _SELECTED[file_type] = [by_name[name] for name in names if name in by_name]
+
+
+# ==============================================
+# EXTRACTION API
+# ==============================================
+
+EXTRACTION_SECONDS = metrics.histogram('rag_extraction_duration_seconds',
+                                       'Time to extract one file, by file type and backend',
+                                       ('file_type', 'backend'))
+EXTRACTIONS = metrics.counter('rag_extractions_total', 'Files extracted, by file type, backend and outcome',
+                              ('file_type', 'backend', 'status'))
+
+
+def record_extraction(file_type: str, backend: str, seconds: float, status: str):
+    """Record one backend run in the extraction metrics."""
+    EXTRACTION_SECONDS.observe(seconds, file_type=file_type, backend=backend)
+    EXTRACTIONS.inc(file_type=file_type, backend=backend, status=status)
+
+
+# Called as observer(file_type, backend, seconds, status) after every backend
+# run; pool workers swap this out to ship observations back to the parent
+extraction_observer = record_extraction
+
+
+def iter_text(file_path: str, file_type: Optional[str] = None, use_cache: bool = True,
+              backend: Optional[str] = None) -> Iterator[str]:
+    """Stream text segments for a file through the registry.
+
+    Cached text is yielded as a single segment. Otherwise the preferred
+    backend streams its segments; if it fails before producing anything the
+    next available backend is tried. Completed results populate the cache.
+    """
+    file_type = file_type or get_file_type(file_path)
+    if file_type is None:
+        raise ValueError(f"Unsupported file type: {file_path}")
+
+    key = ExtractionCache.key_for(file_path) if use_cache else None
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    candidates = _candidates(file_type)
+    if backend is not None:
+        candidates = [b for b in _BACKENDS.get(file_type, []) if b.name == backend]
+    if not candidates:
+        raise RuntimeError(f"No extractor backend installed for {file_type} files")
+
+    last_error = None
+    for candidate in candidates:
+        segments = []
+        start = time.perf_counter()
+        try:
+            for segment in candidate.iter_text(file_path):
+                segments.append(segment)
+                yield segment
+        except Exception as e:
+            extraction_observer(file_type, candidate.name, time.perf_counter() - start, 'error')
+            if segments:
+                raise
+            last_error = e
+            logger.warning("Backend %s failed on %s: %s", candidate.name, file_path, e)
+            continue
+        extraction_observer(file_type, candidate.name, time.perf_counter() - start,
+                            'ok' if segments else 'empty')
+        if key is not None:
+            cache.put(key, '\n'.join(segments))
+        return
+    raise last_error
+
+
+def extract_text(file_path: str, file_type: Optional[str] = None, use_cache: bool = True,
+                 backend: Optional[str] = None) -> Optional[str]:
+    """Extract the full text of a file, returning None on failure or empty content."""
+    try:
+        text = '\n'.join(iter_text(file_path, file_type, use_cache=use_cache, backend=backend))
+    except Exception as e:
+        logger.error("Error extracting text from %s: %s", file_path, e)
+        return None
+    return text if text.strip() else None
+
+
+def clear_cache():
+    """Drop every cached extraction result."""
+    cache.clear()
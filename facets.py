@@ -0,0 +1,146 @@
+"""Faceted retrieval filters: restrict a search to chunks of some file types, directories or filenames.
+
+A request passes filters as a JSON object, each value a string or a list of
+strings (any of which may match):
+
+    {"file_type": ["audio", "txt"], "directory": "pdfs", "filename": "*tanya*"}
+
+Different keys must all match. filename values are shell-style globs,
+matched case-insensitively.
+
+FacetIndex precomputes the document numbers of every file type and
+directory and the (document, chunk row) pairs of the index, so a filter is
+resolved with a few array operations.
+Resolved filters are cached as ChunkSubsets, which also keep the TF-IDF
+rows of their chunks gathered into one matrix: a filtered query is scored
+against that smaller matrix only.
+
+numpy is imported on first use, as in retrieval.py: the app imports this
+module to validate requests.
+"""
+import fnmatch
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+FACETS = ('file_type', 'directory', 'filename')
+# Resolved filter sets kept per index
+SUBSET_CACHE_SIZE = 16
+
+
+class FilterError(ValueError):
+    """The filters of a request are malformed."""
+
+
+def parse_filters(filters) -> Optional[Tuple[Tuple[str, Tuple[str, ...]], ...]]:
+    """Validate request filters into a hashable, normalized form; None when nothing is filtered."""
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        raise FilterError('filters must be an object')
+    unknown = set(filters) - set(FACETS)
+    if unknown:
+        raise FilterError(f"Unknown filters: {', '.join(sorted(unknown))} (use {', '.join(FACETS)})")
+    normalized = []
+    for facet in FACETS:
+        values = filters.get(facet)
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not values or not all(isinstance(value, str) for value in values):
+            raise FilterError(f'{facet} must be a string or a non-empty list of strings')
+        if facet == 'filename':
+            values = [value.lower() for value in values]
+        normalized.append((facet, tuple(sorted(set(values)))))
+    return tuple(normalized) or None
+
+
+def matches(doc: dict, filters) -> bool:
+    """Whether a document dict passes parsed filters."""
+    for facet, values in filters or ():
+        if facet == 'filename':
+            name = doc.get('filename', '').lower()
+            if not any(fnmatch.fnmatchcase(name, pattern) for pattern in values):
+                return False
+        elif doc.get(facet) not in values:
+            return False
+    return True
+
+
+class ChunkSubset:
+    """The sorted chunk rows passing one set of filters, and their TF-IDF rows."""
+
+    def __init__(self, rows, chunk_count: int, matrix=None):
+        import numpy as np
+        self.rows = rows
+        self.matrix = matrix[rows] if matrix is not None else None
+        self.mask = np.zeros(chunk_count, dtype=bool)
+        self.mask[rows] = True
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class FacetIndex:
+    """Document numbers by file type and directory, and the chunk rows of every document.
+
+    chunk_documents lists, for every chunk, the numbers of the documents it
+    stands for: its own first, then those of near-duplicates dropped in its
+    favour, so a chunk passes when any of them matches every filter.
+    """
+
+    def __init__(self, documents: Sequence[dict], chunk_documents: Sequence[Sequence[int]]):
+        import numpy as np
+        self.documents = [{'filename': doc.get('filename', ''), 'directory': doc.get('directory'),
+                           'file_type': doc.get('file_type')} for doc in documents]
+        self.chunk_count = len(chunk_documents)
+        # One (document, row) pair per document a chunk stands for
+        self._pair_documents = np.array([number for numbers in chunk_documents for number in numbers],
+                                        dtype=np.int32)
+        self._pair_rows = np.repeat(np.arange(self.chunk_count, dtype=np.int32),
+                                    [len(numbers) for numbers in chunk_documents])
+        self.values: Dict[str, dict] = {}
+        for facet in ('file_type', 'directory'):
+            by_value: Dict[str, List[int]] = {}
+            for number, doc in enumerate(self.documents):
+                by_value.setdefault(doc[facet], []).append(number)
+            self.values[facet] = {value: np.array(numbers, dtype=np.int32) for value, numbers in by_value.items()}
+        self._subsets: 'OrderedDict[tuple, ChunkSubset]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matching_documents(self, filters):
+        """Boolean mask over the documents passing parsed filters."""
+        import numpy as np
+        passing = np.ones(len(self.documents), dtype=bool)
+        for facet, values in filters:
+            found = np.zeros(len(self.documents), dtype=bool)
+            if facet == 'filename':
+                found[[number for number, doc in enumerate(self.documents)
+                       if matches(doc, ((facet, values),))]] = True
+            else:
+                for value in values:
+                    found[self.values[facet].get(value, [])] = True
+            passing &= found
+        return passing
+
+    def resolve(self, filters):
+        """Sorted chunk rows standing for a document passing parsed filters."""
+        import numpy as np
+        return np.unique(self._pair_rows[self.matching_documents(filters)[self._pair_documents]])
+
+    def subset(self, filters, matrix=None) -> Optional[ChunkSubset]:
+        """The cached ChunkSubset of parsed filters; None when nothing is filtered."""
+        if not filters:
+            return None
+        with self._lock:
+            subset = self._subsets.get(filters)
+            if subset is not None:
+                self._subsets.move_to_end(filters)
+                return subset
+        subset = ChunkSubset(self.resolve(filters), self.chunk_count, matrix)
+        with self._lock:
+            self._subsets[filters] = subset
+            while len(self._subsets) > SUBSET_CACHE_SIZE:
+                self._subsets.popitem(last=False)
+        return subset
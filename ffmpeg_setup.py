@@ -0,0 +1,81 @@
+"""Cached, cross-platform ffmpeg discovery for pydub.
+
+The search order is FFMPEG_PATH (a binary or the directory containing it),
+then PATH, then the usual Windows install locations. The result is memoized
+for the process and written back to FFMPEG_PATH, so extraction workers
+started later inherit it instead of searching again. Nothing here imports
+pydub until ``configure_pydub()`` is called.
+"""
+import functools
+import logging
+import os
+import shutil
+import sys
+from typing import List, Optional
+
+logger = logging.getLogger('ffmpeg_setup')
+
+EXE_SUFFIX = '.exe' if sys.platform == 'win32' else ''
+
+
+def _windows_locations() -> List[str]:
+    return [
+        "C:\\ProgramData\\chocolatey\\bin",  # Chocolatey installation path
+        "C:\\ffmpeg\\bin",
+        "C:\\Program Files\\ffmpeg\\bin",
+        os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Programs\\ffmpeg\\bin'),
+        os.path.join(os.environ.get('APPDATA', ''), 'ffmpeg\\bin'),
+        "C:\\Program Files (x86)\\ffmpeg\\bin",
+    ]
+
+
+def _binary_in(directory: str, name: str = 'ffmpeg') -> Optional[str]:
+    path = os.path.join(directory, name + EXE_SUFFIX)
+    return path if os.path.isfile(path) else None
+
+
+@functools.lru_cache(maxsize=None)
+def find_ffmpeg() -> Optional[str]:
+    """Return the absolute path of the ffmpeg binary, or None if it is not installed."""
+    configured = os.getenv('FFMPEG_PATH')
+    if configured:
+        found = configured if os.path.isfile(configured) else _binary_in(configured)
+        if found:
+            return os.path.abspath(found)
+        logger.warning("FFMPEG_PATH=%s does not contain ffmpeg; searching instead", configured)
+
+    found = shutil.which('ffmpeg')
+    if not found and sys.platform == 'win32':
+        found = next(filter(None, (_binary_in(d) for d in _windows_locations())), None)
+    if found:
+        found = os.path.abspath(found)
+        os.environ['FFMPEG_PATH'] = found
+    return found
+
+
+def ensure_ffmpeg() -> Optional[str]:
+    """Find ffmpeg and put its directory on PATH for pydub and child processes."""
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        logger.warning("ffmpeg not found; audio conversion will not work. Install it (e.g. "
+                       "'apt install ffmpeg', 'brew install ffmpeg' or 'winget install -e --id Gyan.FFmpeg') "
+                       "or set FFMPEG_PATH")
+        return None
+    directory = os.path.dirname(ffmpeg)
+    if directory not in os.environ.get('PATH', '').split(os.pathsep):
+        os.environ['PATH'] = directory + os.pathsep + os.environ.get('PATH', '')
+    return ffmpeg
+
+
+@functools.lru_cache(maxsize=None)
+def configure_pydub():
+    """Import pydub pointed at the discovered ffmpeg/ffprobe and return AudioSegment."""
+    ffmpeg = ensure_ffmpeg()
+    from pydub import AudioSegment
+    if ffmpeg:
+        AudioSegment.converter = ffmpeg
+        AudioSegment.ffmpeg = ffmpeg
+        ffprobe = _binary_in(os.path.dirname(ffmpeg), 'ffprobe')
+        if ffprobe:
+            AudioSegment.ffprobe = ffprobe
+    return AudioSegment
@@ -0,0 +1,145 @@
+"""Asynchronous, structured logging for the app and its helper modules.
+
+``configure_logging()`` installs a single QueueHandler on the root logger, so
+callers only pay for building a LogRecord and an in-memory queue put. A
+QueueListener thread does the formatting and the file/console I/O. Records
+are not pre-formatted on the calling thread: pass values as %-style arguments
+(``logger.info('Loaded %s', name)``), never as f-strings. Disabled levels then
+cost nothing, and enabled ones are formatted off the request path.
+
+The log file holds one JSON object per line (timestamp, level, logger,
+message, source location and any ``extra=`` fields). Levels can be set per
+module, e.g. ``LOG_LEVELS=extractors=DEBUG,audio_processor=WARNING``.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import Dict, Optional
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 10
+# Third-party loggers that are noisy at INFO/DEBUG
+DEFAULT_MODULE_LEVELS = {
+    'urllib3': 'WARNING',
+    'httpx': 'WARNING',
+    'httpcore': 'WARNING',
+    'openai': 'WARNING',
+    'werkzeug': 'INFO',
+}
+
+# Attributes every LogRecord has; anything else came from extra= and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler renders the message (and any traceback) before queueing.
+    Records here stay in-process, so they are queued as-is and only copied, so
+    that handlers on other loggers see the original record untouched.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse 'name=LEVEL,other=LEVEL' into a mapping, ignoring malformed items."""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(log_dir: str = 'logs', filename: str = 'app.log', level: Optional[str] = None,
+                      module_levels: Optional[Dict[str, str]] = None, max_bytes: Optional[int] = None,
+                      backup_count: Optional[int] = None, console_level: Optional[str] = None,
+                      json_file: Optional[bool] = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a rotating JSON file and the console.
+
+    Unset arguments come from LOG_LEVEL, LOG_LEVELS, LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT, LOG_CONSOLE_LEVEL and LOG_FORMAT (json|text). Calling it
+    again returns the running listener.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+        levels = dict(DEFAULT_MODULE_LEVELS)
+        levels.update(module_levels if module_levels is not None else parse_levels(os.getenv('LOG_LEVELS', '')))
+        max_bytes = max_bytes or int(os.getenv('LOG_MAX_BYTES', DEFAULT_MAX_BYTES))
+        backup_count = backup_count if backup_count is not None else \
+            int(os.getenv('LOG_BACKUP_COUNT', DEFAULT_BACKUP_COUNT))
+        console_level = (console_level or os.getenv('LOG_CONSOLE_LEVEL', 'INFO')).upper()
+        if json_file is None:
+            json_file = os.getenv('LOG_FORMAT', 'json').lower() != 'text'
+
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, filename), maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter() if json_file else logging.Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+        console = logging.StreamHandler()
+        console.setLevel(console_level)
+        console.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(name)s: %(message)s'))
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(LazyQueueHandler(log_queue))
+        root.setLevel(level)
+        for name, module_level in levels.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, console,
+                                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
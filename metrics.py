@@ -0,0 +1,331 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are kept in a module-level registry and
+rendered by ``render()`` in the Prometheus text format served at /metrics.
+Request traces time the stages of a single request: ``trace()`` activates a
+trace for the current context and ``span(stage)`` records a stage into it
+(and into the stage histogram) from anywhere on the call path, so helpers
+such as find_relevant_chunks can be instrumented without new parameters.
+"""
+import contextvars
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers sub-millisecond scoring up to multi-minute transcriptions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, optionally computed at scrape time.
+
+    ``func`` returns either a number or, for labelled gauges, a mapping of
+    label-value tuples to numbers.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 func: Optional[Callable[[], object]] = None):
+        super().__init__(name, help, labelnames)
+        self.func = func
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self.func is not None:
+            try:
+                result = self.func()
+            except Exception:
+                return
+            items = result.items() if isinstance(result, dict) else [((), result)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for key, value in items:
+            if value is not None:
+                yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations with a running sum and count."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _format_value(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric; re-registering a name returns the existing metric of that type."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} already registered as {existing.kind}")
+                if isinstance(metric, Gauge) and metric.func is not None:
+                    existing.func = metric.func
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = (),
+          func: Optional[Callable[[], object]] = None) -> Gauge:
+    return registry.register(Gauge(name, help, labelnames, func))
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help, labelnames, buckets))
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    return registry.render()
+
+
+# ==============================================
+# REQUEST TRACES
+# ==============================================
+
+REQUESTS = counter('rag_requests_total', 'Requests handled, by operation and outcome',
+                   ('operation', 'status'))
+REQUEST_SECONDS = histogram('rag_request_duration_seconds', 'Wall time of whole requests',
+                            ('operation',))
+STAGE_SECONDS = histogram('rag_stage_duration_seconds',
+                          'Time spent in each stage of a request (stages may nest)',
+                          ('operation', 'stage'))
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('metrics_trace', default=None)
+
+
+class Trace:
+    """Stage timings for one request, accumulated per stage name."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.status = 'ok'
+        self.stages: Dict[str, float] = OrderedDict()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, operation=self.operation, stage=stage)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def finish(self, status: Optional[str] = None) -> float:
+        """Record the request outcome and total duration (once) and return the duration."""
+        if self.finished is None:
+            self.finished = time.perf_counter() - self.started
+            REQUESTS.inc(operation=self.operation, status=status or self.status)
+            REQUEST_SECONDS.observe(self.finished, operation=self.operation)
+        return self.finished
+
+    def server_timing(self) -> str:
+        """Format the stages as a Server-Timing header value (milliseconds)."""
+        return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in self.stages.items())
+
+
+@contextmanager
+def trace(operation: str):
+    """Activate a Trace for the current context and finish it on exit."""
+    current = Trace(operation)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    except BaseException:
+        current.status = 'error'
+        raise
+    finally:
+        _current_trace.reset(token)
+        current.finish()
+
+
+def traced(operation: str):
+    """Decorator running a view inside trace(operation).
+
+    Responses with a 4xx/5xx status (a (body, status) tuple or an object with
+    status_code) are counted as 'client_error'/'error'.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(operation) as current:
+                result = func(*args, **kwargs)
+                code = result[1] if isinstance(result, tuple) and len(result) > 1 else \
+                    getattr(result, 'status_code', 200)
+                if isinstance(code, int) and code >= 400:
+                    current.status = 'error' if code >= 500 else 'client_error'
+                return result
+        return wrapper
+    return decorator
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage into the active trace, or into the 'none' operation if there is none."""
+    active = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if active is not None:
+            active.add(stage, elapsed)
+        else:
+            STAGE_SECONDS.observe(elapsed, operation='none', stage=stage)
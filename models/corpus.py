@@ -0,0 +1,124 @@
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+
+class Corpus:
+    """Thread-safe live collection of processed documents.
+
+    Documents are plain dicts with at least 'filename' and 'content' (plus
+    'directory' and 'file_type' when ingested from disk), keyed by
+    (directory, filename) so re-ingesting a file replaces it. Readers iterate a
+    snapshot, so background lanes can keep adding documents while /chat runs.
+    Every change bumps ``generation`` so derived indexes know when to rebuild,
+    and is reported to listeners added with ``subscribe`` as
+    ``listener(event, doc)`` with event 'add', 'remove' or 'clear'.
+    """
+
+    def __init__(self, documents: Optional[List[dict]] = None):
+        self._lock = threading.Lock()
+        self._documents: Dict[Tuple[str, str], dict] = {}
+        self._snapshot: Optional[List[dict]] = None
+        self._listeners: List[Callable[[str, Optional[dict]], None]] = []
+        self.generation = 0
+        for doc in documents or []:
+            self.add(doc)
+
+    @staticmethod
+    def key_for(doc: dict) -> Tuple[str, str]:
+        return (doc.get('directory', ''), doc['filename'])
+
+    def add(self, doc: dict):
+        """Add a document, replacing any previous version of the same file."""
+        with self._lock:
+            key = self.key_for(doc)
+            # Re-inserting moves a replaced file to the end, like a fresh ingest
+            self._documents.pop(key, None)
+            self._documents[key] = doc
+            self._changed()
+        self._notify('add', doc)
+
+    # Keep list-style appends working for callers that treat this as a list
+    append = add
+
+    def remove(self, directory: str, filename: str) -> Optional[dict]:
+        """Remove a document and return it, or None if it was not present."""
+        with self._lock:
+            doc = self._documents.pop((directory, filename), None)
+            if doc is not None:
+                self._changed()
+        if doc is not None:
+            self._notify('remove', doc)
+        return doc
+
+    def get(self, directory: str, filename: str) -> Optional[dict]:
+        with self._lock:
+            return self._documents.get((directory, filename))
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._changed()
+        self._notify('clear', None)
+
+    def subscribe(self, listener: Callable[[str, Optional[dict]], None]):
+        """Call listener after every change; it runs on the thread that made the change."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[str, Optional[dict]], None]):
+        """Stop calling a listener added with subscribe."""
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify(self, event: str, doc: Optional[dict]):
+        for listener in list(self._listeners):
+            listener(event, doc)
+
+    def snapshot(self) -> List[dict]:
+        """Return an immutable-by-convention list of the current documents."""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = list(self._documents.values())
+            return self._snapshot
+
+    def _changed(self):
+        self._snapshot = None
+        self.generation += 1
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __getitem__(self, index):
+        return self.snapshot()[index]
+
+
+class ChangeRecorder:
+    """Corpus listener that records adds and removes, to replay them onto another corpus.
+
+    /ingest builds a new corpus off to the side; whatever is merged into the
+    live one meanwhile (uploads, watcher changes, transcripts) is replayed
+    onto the new one before it replaces the live one.
+    """
+
+    def __init__(self):
+        self._changes = deque()
+
+    def __call__(self, event: str, doc: Optional[dict]):
+        if event in ('add', 'remove'):
+            self._changes.append((event, doc))
+
+    def replay(self, corpus: Corpus) -> int:
+        """Apply the recorded changes to corpus, oldest first, and forget them; returns how many there were."""
+        replayed = 0
+        while self._changes:
+            event, doc = self._changes.popleft()
+            if event == 'add':
+                corpus.add(doc)
+            else:
+                corpus.remove(*Corpus.key_for(doc))
+            replayed += 1
+        return replayed
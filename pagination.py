@@ -0,0 +1,93 @@
+"""Cursor pagination over cached per-query result lists for the /search endpoint.
+
+A search ranks up to ``limit`` chunks once; ResultCache keeps that list,
+keyed by the query and its filters, so fetching the following pages only
+slices it. The cache is dropped whenever the documents change (compared by
+identity, like IndexCache), so pages of one list never mix two corpora.
+
+Cursors are opaque to clients: URL-safe base64 of the query, filters, page
+size and offset. A cursor carries everything needed to repeat the search,
+so it still works after its list has been evicted; only then does a page
+cost a search.
+"""
+import base64
+import binascii
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple
+
+DEFAULT_CACHE_SIZE = 256
+
+
+class CursorError(ValueError):
+    """A cursor that was not issued by encode_cursor."""
+
+
+def encode_cursor(query: str, filters, page_size: int, offset: int) -> str:
+    """Cursor of the page of page_size results starting at offset; filters as parsed by facets.parse_filters."""
+    state = {'q': query, 'f': [[facet, list(values)] for facet, values in filters or ()], 'n': page_size,
+             'o': offset}
+    encoded = base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+    return encoded.decode('ascii').rstrip('=')
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Optional[dict], int, int]:
+    """(query, filters, page_size, offset) of a cursor from encode_cursor.
+
+    filters come back in request form, to be validated with parse_filters
+    again: a client can forge any cursor.
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        query, page_size, offset = state['q'], state['n'], state['o']
+        filters = {facet: values for facet, values in state['f']} or None
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise CursorError('Invalid cursor')
+    # bool is an int subclass, but a JSON true is not a page size or offset
+    if not isinstance(query, str) or not _is_int(page_size) or not _is_int(offset) or offset < 0:
+        raise CursorError('Invalid cursor')
+    return query, filters, page_size, offset
+
+
+class ResultCache:
+    """The ranked result lists of the most recent queries over the current documents (LRU)."""
+
+    def __init__(self, size: int = DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._documents: tuple = ()
+        self._results: 'OrderedDict[tuple, List[dict]]' = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def _holds(self, documents: Sequence[dict]) -> bool:
+        return len(documents) == len(self._documents) and all(a is b for a, b in zip(documents, self._documents))
+
+    def get(self, documents: Sequence[dict], key: tuple, search: Callable[[], List[dict]]) -> List[dict]:
+        """The cached results for key over documents, running search() when there are none."""
+        with self._lock:
+            if not self._holds(documents):
+                self._results.clear()
+                self._documents = tuple(documents)
+            results = self._results.get(key)
+            if results is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return results
+            self.misses += 1
+        # Searched outside the lock; two requests for the same new query may both search
+        results = search()
+        with self._lock:
+            if self._holds(documents):
+                self._results[key] = results
+                while len(self._results) > self.size:
+                    self._results.popitem(last=False)
+        return results
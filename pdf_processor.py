@@ -1,19 +1,11 @@
 import os
-from PyPDF2 import PdfReader
+from extractors import extract_text
 
 def extract_text_from_pdf(pdf_path):
     """
-    Extract text from a PDF file.
+    Extract text from a PDF file using the shared extractor registry.
     """
-    try:
-        reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-        return text
-    except Exception as e:
-        print(f"Error processing PDF {pdf_path}: {str(e)}")
-        return None
+    return extract_text(pdf_path, 'pdf')
 
 def process_pdf_directory(directory_path):
     """
@@ -0,0 +1,224 @@
+"""Positional postings for quoted phrases and NEAR/k proximity queries.
+
+A question may quote phrases and join two words with NEAR/k:
+
+    What is "dirah b'tachtonim"?          the words in this order, adjacent
+    ahavas NEAR/3 yisrael                 at most 3 words between them, either order (NEAR alone is NEAR/10)
+
+parse_query separates these constraints from the text that is scored. A
+PositionalIndex stores, for every posting of a ChunkIndex (a token and a
+chunk containing it), the token's positions in the chunk: delta-encoded and
+packed as varints into one byte buffer, about one byte per token of the
+corpus. Phrases and NEAR pairs are matched on the decoded positions of only
+the chunks holding all their words, with array operations; the chunk text is
+never scanned. The matching chunks become a ChunkSubset, so the ranked
+retrieval path scores only them.
+
+The index is built on the first constrained query (positions_for) and kept
+on the ChunkIndex. numpy is imported on first use.
+"""
+import re
+import threading
+from typing import NamedTuple, Tuple
+
+from retrieval import TOKEN_PATTERN, tokenize
+
+DEFAULT_NEAR = 10
+# Longest phrase, and largest NEAR distance (larger ones are capped), that positions are matched for
+MAX_SPAN_TOKENS = 64
+
+_QUOTED = re.compile(r'["“”]([^"“”]*)["“”]')
+_NEAR = re.compile(r'(\w+)\s+NEAR(?:/(\d+))?\s+(?=(\w+))')
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+_build_lock = threading.Lock()
+
+
+class PositionalQuery(NamedTuple):
+    """A question split into the text to score and the constraints matching chunks must meet."""
+    text: str
+    phrases: Tuple[Tuple[str, ...], ...]  # token sequences that must occur in order, adjacent
+    near: Tuple[Tuple[str, str, int], ...]  # (a, b, k): a and b with at most k tokens between them
+
+    @property
+    def constrained(self) -> bool:
+        return bool(self.phrases or self.near)
+
+
+def parse_query(query: str) -> PositionalQuery:
+    """Split query into scored text and its quoted phrases and NEAR/k pairs.
+
+    Quotes and NEAR operators are removed from the text; the words stay, so
+    they are still scored. One-word phrases and unbalanced quotes are plain
+    text; only the first MAX_SPAN_TOKENS words of a phrase must match.
+    """
+    phrases = []
+    for match in _QUOTED.finditer(query):
+        tokens = tuple(tokenize(match.group(1))[:MAX_SPAN_TOKENS])
+        if len(tokens) > 1 and tokens not in phrases:
+            phrases.append(tokens)
+    text = _QUOTED.sub(lambda match: ' %s ' % match.group(1), query)
+    near = []
+    for match in _NEAR.finditer(text):
+        k = int(match.group(2)) if match.group(2) is not None else DEFAULT_NEAR
+        near.append((match.group(1).lower(), match.group(3).lower(), k))
+    text = re.sub(r'\bNEAR(?:/\d+)?\b', ' ', text) if near else text
+    return PositionalQuery(' '.join(text.split()), tuple(phrases), tuple(near))
+
+
+def encode_varints(values):
+    """LEB128 bytes of non-negative integers below 2**35: 7 bits per byte, high bit set on all but the last."""
+    import numpy as np
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for bits in (7, 14, 21, 28):
+        sizes += values >= (1 << bits)
+    owner = np.repeat(np.arange(len(values)), sizes)
+    shift = np.arange(len(owner)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    encoded = (values[owner] >> (7 * shift).astype(np.uint64)) & np.uint64(0x7F)
+    encoded |= (shift < sizes[owner] - 1).astype(np.uint64) << np.uint64(7)
+    return encoded.astype(np.uint8), sizes
+
+
+def decode_varints(encoded):
+    """Integers of a buffer of whole varints from encode_varints, as int64."""
+    import numpy as np
+    ends = encoded < 0x80
+    owner = np.cumsum(ends) - ends
+    starts = np.flatnonzero(np.r_[True, ends[:-1]])
+    shift = np.arange(len(encoded)) - starts[owner]
+    # Positions stay far below 2**53, so float64 sums are exact
+    weights = (encoded & 0x7F).astype(np.float64) * np.exp2(7 * shift)
+    return np.bincount(owner, weights=weights, minlength=len(starts)).astype(np.int64)
+
+
+class PositionalIndex:
+    """Varint-coded, delta-encoded token positions of every posting of a ChunkIndex.
+
+    Postings are numbered as in the ChunkIndex (by token, then chunk), so
+    the positions of posting p are the postings_tf[p] varints starting at
+    byte offsets[p] of buffer.
+    """
+
+    def __init__(self, index):
+        import numpy as np
+        self.index = index
+        vocabulary = index.token_ids
+        chunk_tokens = [_TOKEN_RE.findall(chunk.lower()) for chunk in index.chunks]
+        lengths = np.array([len(tokens) for tokens in chunk_tokens], dtype=np.int64)
+        tokens = np.fromiter((vocabulary[token] for chunk in chunk_tokens for token in chunk), dtype=np.int32,
+                             count=int(lengths.sum()))
+        chunks = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        positions = np.arange(len(tokens), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        # Stable: positions stay ascending within every (token, chunk) posting
+        order = np.lexsort((chunks, tokens))
+        tokens, chunks, positions = tokens[order], chunks[order], positions[order]
+        first = np.ones(len(tokens), dtype=bool)
+        first[1:] = (tokens[1:] != tokens[:-1]) | (chunks[1:] != chunks[:-1])
+        deltas = positions.copy()
+        deltas[1:][~first[1:]] -= positions[:-1][~first[1:]]
+        self.buffer, sizes = encode_varints(deltas)
+        offsets = np.r_[(np.cumsum(sizes) - sizes)[first], len(self.buffer)]
+        self.offsets = offsets.astype(np.int32 if len(self.buffer) < 1 << 31 else np.int64)
+        # Keys chunk * stride + position - offset never collide across chunks for offsets up to MAX_SPAN_TOKENS
+        self.stride = int(index.chunk_lengths.max(initial=0)) + MAX_SPAN_TOKENS + 1
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.buffer.nbytes + self.offsets.nbytes
+
+    def occurrences(self, token: str, rows=None):
+        """(chunk ids, positions) of every occurrence of token, optionally only in the sorted chunk rows."""
+        import numpy as np
+        index = self.index
+        column = index.token_ids.get(token)
+        if column is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        start, stop = index.postings_indptr[column], index.postings_indptr[column + 1]
+        postings = np.arange(start, stop)
+        if rows is not None:
+            if not len(rows):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            chunk_ids = index.postings[start:stop]
+            found = np.minimum(np.searchsorted(rows, chunk_ids), len(rows) - 1)
+            postings = postings[rows[found] == chunk_ids]
+        starts = self.offsets[postings].astype(np.int64)
+        lengths = self.offsets[postings + 1] - starts
+        byte_index = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(int(lengths.sum()))
+        deltas = decode_varints(self.buffer[byte_index])
+        counts = index.postings_tf[postings].astype(np.int64)
+        running = np.cumsum(deltas)
+        before = np.repeat(np.r_[0, running[np.cumsum(counts)[:-1] - 1]] if len(counts) else running[:0], counts)
+        return np.repeat(index.postings[postings].astype(np.int64), counts), running - before
+
+    def _keys(self, token: str, rows, offset: int = 0):
+        chunk_ids, positions = self.occurrences(token, rows)
+        return chunk_ids * self.stride + positions - offset
+
+    def _candidates(self, tokens, rows):
+        import numpy as np
+        postings = sorted((self.index.postings_for(token) for token in set(tokens)), key=len)
+        candidates = postings[0] if rows is None else np.intersect1d(postings[0], rows, assume_unique=True)
+        for other in postings[1:]:
+            candidates = np.intersect1d(candidates, other, assume_unique=True)
+        return candidates
+
+    def phrase_rows(self, tokens, rows=None):
+        """Sorted chunk ids containing tokens in order, adjacent; only among rows if given."""
+        import numpy as np
+        candidates = self._candidates(tokens, rows)
+        if not len(candidates):
+            return candidates
+        # Occurrence i positions back from word i of the phrase lines up with the phrase start
+        keys = self._keys(tokens[0], candidates)
+        for i, token in enumerate(tokens[1:], 1):
+            keys = np.intersect1d(keys, self._keys(token, candidates, i))
+            if not len(keys):
+                break
+        return np.unique(keys // self.stride)
+
+    def near_rows(self, a: str, b: str, k: int, rows=None):
+        """Sorted chunk ids where a and b occur with at most k tokens between them; only among rows if given.
+
+        With a == b, the word must occur twice that close.
+        """
+        import numpy as np
+        candidates = self._candidates((a, b), rows)
+        if not len(candidates):
+            return candidates
+        k = min(k, MAX_SPAN_TOKENS - 1)
+        if a == b:
+            # Keys are sorted, and those of different chunks lie more than MAX_SPAN_TOKENS apart
+            keys = self._keys(a, candidates)
+            return np.unique(keys[1:][np.diff(keys) <= k + 1] // self.stride)
+        a_keys, b_keys = self._keys(a, candidates), self._keys(b, candidates)
+        following = np.searchsorted(b_keys, a_keys)
+        after = b_keys[np.minimum(following, len(b_keys) - 1)] - a_keys
+        before = a_keys - b_keys[np.maximum(following - 1, 0)]
+        close = ((after > 0) & (after <= k + 1)) | ((before > 0) & (before <= k + 1))
+        return np.unique(a_keys[close] // self.stride)
+
+    def matching_rows(self, query: PositionalQuery, rows=None):
+        """Sorted chunk ids meeting every phrase and NEAR constraint of query; only among rows if given."""
+        for tokens in query.phrases:
+            rows = self.phrase_rows(tokens, rows)
+        for a, b, k in query.near:
+            rows = self.near_rows(a, b, k, rows)
+        return rows
+
+
+def positions_for(index) -> PositionalIndex:
+    """The PositionalIndex of a ChunkIndex, built on first use."""
+    if index.positions is None:
+        with _build_lock:
+            if index.positions is None:
+                index.positions = PositionalIndex(index)
+    return index.positions
+
+
+def constrain(index, query: PositionalQuery, subset=None):
+    """The ChunkSubset of chunks meeting query's constraints (within subset, if given); subset if unconstrained."""
+    if not query.constrained or not index.chunks:
+        return subset
+    from facets import ChunkSubset
+    rows = positions_for(index).matching_rows(query, subset.rows if subset is not None else None)
+    return ChunkSubset(rows, len(index.chunks), index.matrix)
@@ -0,0 +1,267 @@
+"""On-demand profiling of individual requests.
+
+A request opts in with ``X-Profile: cprofile|sample`` (or ``?profile=``) and
+must carry the shared secret in ``X-Profile-Token`` (or ``?profile_token=``);
+with no PROFILING_TOKEN configured profiling is disabled entirely.
+
+Every profiled request is sampled by a background thread that records the
+request thread's stack every few milliseconds, giving collapsed-stack output
+(``frame;frame;frame count`` per line) ready for flamegraph.pl or speedscope.
+In ``cprofile`` mode the request also runs under cProfile and its pstats are
+saved alongside. Profiles go to a bounded on-disk ring: only the newest
+``keep`` profiles are retained.
+"""
+import cProfile
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger('profiler')
+
+MODES = ('cprofile', 'sample')
+DEFAULT_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+# cProfile hooks are process-global on newer Pythons, so only one request at a
+# time gets the deterministic profiler; concurrent ones fall back to sampling
+_cprofile_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Periodically record the stack of one thread while sampling is resumed."""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        super().__init__(name='request-profiler', daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._thread_id: Optional[int] = None
+        self._resumed = threading.Event()
+        self._stopped = threading.Event()
+
+    def resume(self, thread_id: Optional[int] = None):
+        self._thread_id = thread_id or threading.get_ident()
+        self._resumed.set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self._resumed.set()
+        if self.is_alive():
+            self.join(timeout=5)
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._resumed.wait()
+            if self._stopped.is_set():
+                break
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(labels))] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """Return the samples in collapsed-stack format, one stack per line."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Profilers attached to one request; may be resumed and paused many times."""
+
+    def __init__(self, operation: str, mode: str = 'sample', interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.operation = operation
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{operation}-{uuid.uuid4().hex[:8]}"
+        self.sampler = StackSampler(interval)
+        self.profile: Optional[cProfile.Profile] = None
+        if mode == 'cprofile' and _cprofile_lock.acquire(blocking=False):
+            self.profile = cProfile.Profile()
+        self.mode = 'cprofile' if self.profile is not None else 'sample'
+        self.started = time.time()
+        self.wall = 0.0
+        self._resumed_at: Optional[float] = None
+
+    def resume(self):
+        if not self.sampler.is_alive():
+            self.sampler.start()
+        self._resumed_at = time.perf_counter()
+        self.sampler.resume()
+        if self.profile is not None:
+            try:
+                self.profile.enable()
+            except ValueError as e:
+                # Another tool owns the profiling hook; keep the samples only
+                logger.warning("cProfile unavailable, sampling only: %s", e)
+                self._release_cprofile()
+
+    def pause(self):
+        if self.profile is not None:
+            self.profile.disable()
+        self.sampler.pause()
+        if self._resumed_at is not None:
+            self.wall += time.perf_counter() - self._resumed_at
+            self._resumed_at = None
+
+    def finish(self):
+        self.pause()
+        self.sampler.stop()
+
+    def _release_cprofile(self):
+        if self.profile is not None:
+            self.profile = None
+            self.mode = 'sample'
+            _cprofile_lock.release()
+
+    def save(self, store: 'ProfileStore', **meta) -> List[str]:
+        """Write the profile into store and release the cProfile slot."""
+        try:
+            return store.save(self, meta)
+        finally:
+            self._release_cprofile()
+
+
+class ProfileStore:
+    """Bounded on-disk ring of saved profiles."""
+
+    def __init__(self, directory: str, keep: int = 20):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def save(self, profile: RequestProfile, meta: Optional[Dict] = None) -> List[str]:
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile.id)
+        paths = []
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            f.write(profile.sampler.collapsed())
+        paths.append(base + '.collapsed')
+        if profile.profile is not None:
+            profile.profile.dump_stats(base + '.pstats')
+            paths.append(base + '.pstats')
+        info = {
+            'id': profile.id,
+            'operation': profile.operation,
+            'mode': profile.mode,
+            'started': profile.started,
+            'wall_seconds': profile.wall,
+            'samples': profile.sampler.samples,
+            'files': [os.path.basename(path) for path in paths],
+        }
+        info.update(meta or {})
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2)
+        self._prune()
+        logger.info("Saved %s profile %s (%d samples)", profile.mode, profile.id, profile.sampler.samples)
+        return paths
+
+    def list(self) -> List[Dict]:
+        """Return the metadata of every stored profile, newest first."""
+        profiles = []
+        if not os.path.isdir(self.directory):
+            return profiles
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        profiles.sort(key=lambda info: info.get('started', 0), reverse=True)
+        return profiles
+
+    def path_for(self, filename: str) -> Optional[str]:
+        """Resolve a stored file name, refusing anything outside the ring."""
+        if os.path.basename(filename) != filename or not filename.endswith(('.collapsed', '.pstats', '.json')):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def _prune(self):
+        with self._lock:
+            stale = self.list()[self.keep:]
+            for info in stale:
+                for suffix in ('.json', '.collapsed', '.pstats'):
+                    try:
+                        os.remove(os.path.join(self.directory, info['id'] + suffix))
+                    except OSError:
+                        pass
+
+
+def authorized(token: Optional[str], secret: Optional[str]) -> bool:
+    """Constant-time check of a presented profiling token against the secret."""
+    return bool(secret) and bool(token) and hmac.compare_digest(token.encode(), secret.encode())
+
+
+def requested_mode(request, secret: Optional[str]) -> Optional[str]:
+    """Return the profiling mode a Flask request asks for, if it is allowed to."""
+    mode = request.headers.get('X-Profile') or request.args.get('profile')
+    if not mode:
+        return None
+    token = request.headers.get('X-Profile-Token') or request.args.get('profile_token')
+    if not authorized(token, secret):
+        logger.warning("Rejected profiling request for %s without a valid token", request.path)
+        return None
+    mode = mode.lower()
+    return mode if mode in MODES else 'sample'
+
+
+class _ProfiledBody:
+    """A streamed response body run under profile; on_finish() runs once, on exhaustion, error or close()."""
+
+    def __init__(self, profile: RequestProfile, iterable: Iterable, on_finish):
+        self.profile = profile
+        self._iterable = iterable
+        self._iterator = iter(iterable)
+        self._on_finish = on_finish
+        self._finished = False
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        self.profile.resume()
+        try:
+            item = next(self._iterator)
+        except BaseException:
+            self.profile.pause()
+            self.close()
+            raise
+        self.profile.pause()
+        return item
+
+    def close(self):
+        """Close the wrapped body and finish the profile; the server calls this even if the body was never read."""
+        if self._finished:
+            return
+        self._finished = True
+        try:
+            close = getattr(self._iterable, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.profile.finish()
+            self._on_finish()
+
+
+def profile_iterable(profile: RequestProfile, iterable: Iterable, on_finish) -> Iterator:
+    """Run a streamed response body under profile, calling on_finish() when it ends or is closed unread."""
+    return _ProfiledBody(profile, iterable, on_finish)
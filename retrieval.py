@@ -0,0 +1,592 @@
+"""Chunk retrieval: chunking, TF-IDF scoring and chunk selection.
+
+A ChunkIndex holds the chunks of one corpus snapshot together with the
+TF-IDF vectorizer fitted on them, so queries only pay for transforming the
+query and one sparse product against the chunk matrix. Many queries are
+scored at once by ``search_batch``: the queries are vectorized into one
+sparse matrix, multiplied by the chunk matrix in a single sparse-sparse
+product and the best candidates of every row are picked with argpartition.
+IndexCache keeps the index of the latest snapshot and rebuilds it only when
+the documents change; near-duplicate chunks can be dropped at build time,
+keeping one with the sources of all. Searches can be restricted to the
+chunks of some documents with a ChunkSubset (see facets.py), scoring only
+those rows. With granularity 'sentence' the index holds short sentence
+spans with their offsets instead of overlapping chunks (see sentences.py).
+
+numpy and scikit-learn are imported on first use to keep app startup fast.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import metrics
+
+logger = logging.getLogger('retrieval')
+
+# Upper bound on dense score cells (queries x chunks) materialized at once by search_batch
+BATCH_BLOCK_CELLS = 1 << 22
+# Chunks at or below this cosine similarity are never selected
+MIN_SIMILARITY = 0.05
+# What ChunkIndex.build indexes: overlapping ~1000-character chunks, or short sentence spans
+GRANULARITIES = ('chunk', 'sentence')
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = r'(?u)\b\w+\b'
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+
+
+def split_text_into_chunks(text, chunk_size=1000, overlap=200):
+    """Split text into overlapping chunks for better context retrieval."""
+    if not text:
+        return []
+    
+    # Split by paragraphs first
+    paragraphs = re.split(r'\n\s*\n', text)
+    chunks = []
+    current_chunk = ""
+    
+    for paragraph in paragraphs:
+        # Clean the paragraph
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+            
+        # If adding this paragraph would exceed chunk_size, save current chunk and start a new one
+        if len(current_chunk) + len(paragraph) > chunk_size and current_chunk:
+            # Add the current chunk
+            chunks.append(current_chunk.strip())
+            
+            # Keep some overlap for context
+            overlap_text = current_chunk[-overlap:] if len(current_chunk) > overlap else current_chunk
+            
+            # Start new chunk with overlap
+            current_chunk = overlap_text + "\n\n" + paragraph
+        else:
+            # Add paragraph to current chunk
+            current_chunk += "\n\n" + paragraph if current_chunk else paragraph
+    
+    # Add the last chunk if it's not empty
+    if current_chunk.strip():
+        chunks.append(current_chunk.strip())
+    
+    # Post-process chunks to ensure they're meaningful
+    processed_chunks = []
+    for chunk in chunks:
+        # Remove excessive whitespace
+        chunk = re.sub(r'\s+', ' ', chunk).strip()
+        
+        # Skip chunks that are too short
+        if len(chunk) < 50:  # Minimum length threshold
+            continue
+            
+        # Skip chunks that are just numbers or special characters
+        if re.match(r'^[\d\s\W]+$', chunk):
+            continue
+            
+        processed_chunks.append(chunk)
+    
+    return processed_chunks
+
+def locate_chunk(text, chunk):
+    """(start, end) character offsets of chunk in the text it was split from, or None if it is not there.
+
+    Chunks have their whitespace collapsed to single spaces, so any run of
+    whitespace in text matches one.
+    """
+    pattern = r'\s+'.join(map(re.escape, chunk.split(' ')))
+    match = re.search(pattern, text)
+    return (match.start(), match.end()) if match else None
+
+def tokenize(text):
+    """Lowercase text and split it into word tokens (the same tokens as the term-presence index)."""
+    return _TOKEN_RE.findall(text.lower())
+
+def extract_query_terms(query):
+    """Return the lowercased query words longer than three characters."""
+    query_terms = set(tokenize(query))
+    return {term for term in query_terms if len(term) > 3}  # Remove short words
+
+def chunk_documents(documents):
+    """Split every document into chunks, tracking each chunk's source document."""
+    return _chunk_documents(documents)[:3]
+
+def _chunk_documents(documents, granularity='chunk'):
+    """chunk_documents, plus the position in documents of every chunk's document and, for
+    granularity 'sentence', the (start, end) offsets of every span in its document's content.
+    """
+    from sentences import sentence_spans, span_text
+    all_chunks = []
+    chunk_sources = []
+    chunk_docs = []  # Track which document each chunk came from
+    chunk_origins = []
+    chunk_spans = []
+    
+    for number, doc in enumerate(documents):
+        if granularity == 'sentence':
+            spans = sentence_spans(doc['content'])
+            chunks = [span_text(doc['content'], start, end) for start, end in spans]
+            chunk_spans.extend(spans)
+        else:
+            # Split document content into chunks
+            chunks = split_text_into_chunks(doc['content'])
+        all_chunks.extend(chunks)
+        chunk_sources.extend([doc['filename']] * len(chunks))
+        chunk_docs.extend([doc['filename']] * len(chunks))
+        chunk_origins.extend([number] * len(chunks))
+    
+    return all_chunks, chunk_sources, chunk_docs, chunk_origins, chunk_spans
+
+def create_vectorizer():
+    """Create the TF-IDF vectorizer used for chunk retrieval."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(
+        stop_words='english',
+        max_features=5000,  # Limit vocabulary size
+        ngram_range=(1, 2),  # Include word pairs
+        min_df=2,  # Minimum document frequency
+        max_df=0.95  # Maximum document frequency
+    )
+
+def cosine_similarity(X, Y):
+    """sklearn's cosine_similarity, imported on first use."""
+    from sklearn.metrics.pairwise import cosine_similarity as pairwise_cosine_similarity
+    return pairwise_cosine_similarity(X, Y)
+
+def simple_keyword_matching(query, chunks, sources, max_chunks=10):
+    """Simple keyword matching as a fallback for finding relevant chunks.
+
+    Builds a throwaway index; callers holding a ChunkIndex should use its
+    keyword_search, which reuses the prebuilt postings.
+    """
+    return ChunkIndex(chunks, sources, sources).keyword_search(query, max_chunks)
+
+
+def top_k_rows(scores, k):
+    """Return the column indices of the k largest scores of each row, best first."""
+    import numpy as np
+    rows, columns = scores.shape
+    k = min(k, columns)
+    if k <= 0:
+        return np.empty((rows, 0), dtype=np.intp)
+    if k < columns:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(columns), (rows, 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def diverse_order(groups, limit):
+    """Order best-first candidates so each group's best comes first, then the rest; at most limit.
+
+    groups holds the group (document) id of every candidate; the result is
+    positions into it.
+    """
+    import numpy as np
+    # The first occurrence of a group in a best-first list is its group maximum
+    _, best_of_group = np.unique(groups, return_index=True)
+    best_of_group.sort()
+    others = np.ones(len(groups), dtype=bool)
+    others[best_of_group] = False
+    return np.concatenate([best_of_group, np.flatnonzero(others)])[:limit]
+
+
+class ChunkIndex:
+    """Chunks of one corpus snapshot and the TF-IDF matrix fitted on them.
+
+    ``vectorizer`` and ``matrix`` are None when fitting failed (e.g. min_df
+    pruned every term of a tiny corpus); searches then use keyword matching.
+    Selection works on precomputed arrays: ``doc_ids`` numbers each chunk's
+    document, and an inverted index over word tokens (``token_ids`` maps a
+    token to its postings, the sorted ids of the chunks containing it) backs
+    both query-term matching and keyword search. ``token_counts`` holds the
+    number of distinct tokens in each chunk; ``postings_tf`` the number of
+    occurrences of the token in each posting's chunk, and ``chunk_lengths``
+    the number of tokens of each chunk, for BM25.
+
+    ``duplicate_sources`` maps a chunk index to the other sources of the
+    near-duplicates dropped in its favour (see dedup.py); results list them
+    after the chunk's own source in 'sources'.
+
+    ``facets`` (set by build) resolves request filters to the ChunkSubset
+    passed as ``subset`` to the search methods; a filtered search only
+    reads and scores the rows of its subset. build also keeps the
+    ``documents`` indexed and each chunk's position among them in
+    ``origins``; for granularity 'sentence', ``spans`` holds the (start,
+    end) offsets of every chunk in its document's content. Results carry
+    the 'chunk_id' of their chunk.
+    """
+
+    def __init__(self, chunks: List[str], sources: List[str], docs: List[str], vectorizer=None, matrix=None,
+                 duplicate_sources: Optional[Dict[int, List[str]]] = None):
+        import numpy as np
+        self.chunks = chunks
+        self.sources = sources
+        self.docs = docs
+        self.duplicate_sources = duplicate_sources or {}
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.facets = None
+        self.granularity = 'chunk'
+        self.documents: Sequence[dict] = ()
+        self.origins = None
+        self.spans = None
+        self.positions = None  # PositionalIndex, built on the first phrase or NEAR query (see positional.py)
+        doc_numbers = {}
+        self.doc_ids = np.array([doc_numbers.setdefault(doc, len(doc_numbers)) for doc in docs], dtype=np.int32)
+        self._build_postings(chunks)
+
+    def _build_postings(self, chunks: List[str]):
+        from sklearn.feature_extraction.text import CountVectorizer
+        import numpy as np
+        counter = CountVectorizer(token_pattern=TOKEN_PATTERN, dtype=np.uint16)
+        try:
+            counts = counter.fit_transform(chunks).tocsr()
+        except ValueError:  # no chunks, or no tokens at all
+            self.token_ids = {}
+            self.postings_indptr = np.zeros(1, dtype=np.int64)
+            self.postings = np.empty(0, dtype=np.int32)
+            self.postings_tf = np.empty(0, dtype=np.uint16)
+            self.token_counts = np.zeros(len(chunks), dtype=np.int32)
+            self.chunk_lengths = np.zeros(len(chunks), dtype=np.int32)
+            return
+        self.token_ids = counter.vocabulary_
+        self.token_counts = np.diff(counts.indptr).astype(np.int32)
+        self.chunk_lengths = np.asarray(counts.sum(axis=1, dtype=np.int64)).ravel().astype(np.int32)
+        by_token = counts.tocsc()
+        by_token.sort_indices()
+        self.postings_indptr = by_token.indptr.astype(np.int64)
+        self.postings = by_token.indices.astype(np.int32)
+        self.postings_tf = by_token.data
+
+    def postings_for(self, token: str):
+        """Sorted ids of the chunks containing token (empty if it never occurs)."""
+        column = self.token_ids.get(token)
+        if column is None:
+            return self.postings[:0]
+        return self.postings[self.postings_indptr[column]:self.postings_indptr[column + 1]]
+
+    def chunk_frequencies(self) -> Dict[str, int]:
+        """Number of chunks containing each token of the vocabulary."""
+        import numpy as np
+        counts = np.diff(self.postings_indptr).tolist()
+        return {token: counts[column] for token, column in self.token_ids.items()}
+
+    @classmethod
+    def build(cls, documents: Sequence[dict], dedup_threshold: float = 0.0,
+              granularity: str = 'chunk') -> 'ChunkIndex':
+        """Chunk the documents and fit the TF-IDF vectorizer on the chunks.
+
+        With a dedup_threshold, only the first of every set of chunks whose
+        estimated shingle similarity reaches it is indexed. granularity is
+        one of GRANULARITIES.
+        """
+        import numpy as np
+        from facets import FacetIndex
+        if granularity not in GRANULARITIES:
+            raise ValueError(f'Unknown granularity {granularity!r} (use {", ".join(GRANULARITIES)})')
+        with metrics.span('chunking'):
+            chunks, sources, docs, origins, spans = _chunk_documents(documents, granularity)
+        duplicate_sources = {}
+        chunk_origins = [[origin] for origin in origins]
+        if dedup_threshold and len(chunks) > 1:
+            with metrics.span('deduplicating'):
+                kept, duplicate_sources, chunk_origins = _drop_near_duplicates(chunks, sources, origins,
+                                                                               dedup_threshold)
+                chunks, sources, docs = [chunks[i] for i in kept], [sources[i] for i in kept], [docs[i] for i in kept]
+                origins = [origins[i] for i in kept]
+                spans = [spans[i] for i in kept] if spans else spans
+        index = cls(chunks, sources, docs, duplicate_sources=duplicate_sources)
+        index.facets = FacetIndex(documents, chunk_origins)
+        index.granularity = granularity
+        index.documents = documents
+        index.origins = np.array(origins, dtype=np.int32)
+        if granularity == 'sentence':
+            index.spans = np.array(spans, dtype=np.int64).reshape(-1, 2)
+        if chunks:
+            vectorizer = create_vectorizer()
+            try:
+                with metrics.span('vectorizing'):
+                    index.matrix = vectorizer.fit_transform(chunks)
+                index.vectorizer = vectorizer
+            except ValueError as e:
+                logger.warning('TF-IDF fit failed, using keyword matching: %s', e)
+        return index
+
+    def sources_of(self, idx: int) -> List[str]:
+        return [self.sources[idx]] + self.duplicate_sources.get(idx, [])
+
+    def subset(self, filters):
+        """The ChunkSubset of parsed request filters (see facets.parse_filters); None when unfiltered."""
+        if not filters:
+            return None
+        if self.facets is None:
+            raise ValueError('This index was not built from documents and cannot be filtered')
+        return self.facets.subset(filters, self.matrix)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self.vectorizer.vocabulary_) if self.vectorizer is not None else 0
+
+    @property
+    def memory_bytes(self) -> int:
+        arrays = [self.doc_ids, self.postings, self.postings_indptr, self.postings_tf, self.token_counts,
+                  self.chunk_lengths]
+        arrays += [array for array in (self.origins, self.spans) if array is not None]
+        if self.positions is not None:
+            arrays += [self.positions.buffer, self.positions.offsets]
+        if self.matrix is not None:
+            arrays += [self.matrix.data, self.matrix.indices, self.matrix.indptr]
+        return sum(array.nbytes for array in arrays)
+
+    def similarities(self, queries: Sequence[str], subset=None):
+        """Cosine similarity of every query to every chunk, as a sparse (queries x chunks) matrix.
+
+        With a subset, only its rows are scored: column j is chunk subset.rows[j].
+        """
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine similarity
+        query_matrix = self.vectorizer.transform(queries)
+        matrix = self.matrix if subset is None else subset.matrix
+        return (matrix @ query_matrix.T).T.tocsr()
+
+    def bm25(self, query_terms, limit: int, subset=None):
+        """The (at most limit) chunks containing a query term, best BM25 score first: (chunk ids, scores).
+
+        Only the postings of the query terms are read; with a subset, only
+        its chunks are scored (term statistics stay those of the corpus).
+        """
+        import numpy as np
+        ids, weights = [], []
+        average_length = max(float(self.chunk_lengths.mean()), 1.0) if len(self.chunk_lengths) else 1.0
+        for term in query_terms:
+            column = self.token_ids.get(term)
+            if column is None:
+                continue
+            start, stop = self.postings_indptr[column], self.postings_indptr[column + 1]
+            postings = self.postings[start:stop]
+            tf = self.postings_tf[start:stop].astype(np.float32)
+            idf = np.log1p((len(self.chunks) - len(postings) + 0.5) / (len(postings) + 0.5))
+            if subset is not None:
+                allowed = subset.mask[postings]
+                postings, tf = postings[allowed], tf[allowed]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_lengths[postings] / average_length)
+            ids.append(postings)
+            weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Accumulating into one slot per chunk is linear in the postings read; sorting them is not
+        scores = np.bincount(np.concatenate(ids), weights=np.concatenate(weights), minlength=len(self.chunks))
+        matched = np.flatnonzero(scores)
+        best = matched[top_k_rows(scores[matched][np.newaxis, :], limit)[0]]
+        return best.astype(np.int64), scores[best].astype(np.float32)
+
+    def term_matches(self, candidates, query_terms):
+        """Number of distinct query terms each candidate chunk contains."""
+        import numpy as np
+        candidates = np.asarray(candidates)
+        matches = np.zeros(len(candidates), dtype=np.intp)
+        if not len(candidates):
+            return matches
+        for term in query_terms:
+            postings = self.postings_for(term)
+            if len(postings):
+                found = np.minimum(np.searchsorted(postings, candidates), len(postings) - 1)
+                matches += postings[found] == candidates
+        return matches
+
+    def select(self, similarities, query_terms, max_chunks: int = 10, candidates=None,
+               require_terms: bool = True) -> List[dict]:
+        """Pick the top chunks by similarity, favouring one chunk per document first.
+
+        Only candidates above MIN_SIMILARITY qualify, and with require_terms
+        only those containing a query term. candidates are chunk indices best
+        first (by default the top 2 * max_chunks by similarity); the result
+        is sorted by similarity, then term matches.
+        """
+        import numpy as np
+        if candidates is None:
+            candidates = top_k_rows(similarities[np.newaxis, :], max_chunks * 2)[0]
+        return self.select_candidates(candidates, similarities[candidates], query_terms, max_chunks, require_terms)
+
+    def select_candidates(self, candidates, scores, query_terms, max_chunks: int = 10,
+                          require_terms: bool = True) -> List[dict]:
+        """select() for candidate chunk indices given with their own similarity scores."""
+        import numpy as np
+        qualified = scores > MIN_SIMILARITY
+        candidates, scores = candidates[qualified], scores[qualified]
+        term_matches = self.term_matches(candidates, query_terms)
+        if require_terms:
+            qualified = term_matches > 0
+            candidates, scores, term_matches = candidates[qualified], scores[qualified], term_matches[qualified]
+
+        chosen = diverse_order(self.doc_ids[candidates], max_chunks)
+
+        order = chosen[np.lexsort((-term_matches[chosen], -scores[chosen]))]
+        return [{
+            'content': self.chunks[idx],
+            'source': self.sources[idx],
+            'sources': self.sources_of(idx),
+            'similarity': float(score),
+            'term_matches': int(matches),
+            'chunk_id': int(idx)
+        } for idx, score, matches in zip(candidates[order], scores[order], term_matches[order])]
+
+    def keyword_search(self, query: str, max_chunks: int = 10, subset=None) -> List[dict]:
+        """Rank chunks by the share of query words they contain, one chunk per source first.
+
+        Only the postings of the query words are read, so the cost does not
+        grow with the number of chunks that match nothing. Ties go to the
+        chunk with fewer distinct tokens (the denser match). With a subset,
+        only its chunks are ranked.
+        """
+        import numpy as np
+        query_words = set(tokenize(query))
+        postings = [self.postings_for(word) for word in query_words]
+        if subset is not None:
+            postings = [p[subset.mask[p]] for p in postings]
+        postings = [p for p in postings if len(p)]
+        relevant_chunks = []
+        if postings:
+            chunk_ids, overlap = np.unique(np.concatenate(postings), return_counts=True)
+            scores = overlap / len(query_words)
+            qualified = scores > MIN_SIMILARITY
+            chunk_ids, scores = chunk_ids[qualified], scores[qualified]
+            best_first = np.lexsort((self.token_counts[chunk_ids], -scores))
+            chunk_ids, scores = chunk_ids[best_first], scores[best_first]
+            chosen = diverse_order(self.doc_ids[chunk_ids], max_chunks)
+            relevant_chunks = [{
+                'content': self.chunks[idx],
+                'source': self.sources[idx],
+                'sources': self.sources_of(idx),
+                'similarity': float(score),
+                'chunk_id': int(idx)
+            } for idx, score in zip(chunk_ids[chosen], scores[chosen])]
+
+        # Log the sources being used
+        if logger.isEnabledFor(logging.INFO):
+            sources_used = sorted({chunk['source'] for chunk in relevant_chunks})
+            logger.info('Using content from %d sources (keyword matching): %s', len(sources_used), sources_used)
+
+        return relevant_chunks
+
+    def search(self, query: str, max_chunks: int = 10, scorer=None, nearest=None, subset=None) -> List[dict]:
+        return self.search_batch([query], max_chunks, scorer, nearest, subset)[0]
+
+    def search_batch(self, queries: Sequence[str], max_chunks: int = 10, scorer=None,
+                     nearest=None, subset=None) -> List[List[dict]]:
+        """Return the relevant chunks for every query, in the same order as queries.
+
+        scorer, if given, replaces TF-IDF cosine: it maps a list of queries
+        to a dense (queries x chunks) score array (e.g. LsaIndex.scores);
+        with a subset it is also given the subset's rows, and scores only
+        those. nearest, if given, is used instead of scoring every chunk: it
+        maps (queries, k) to the (rows, scores) of each query's k best
+        chunks found approximately (e.g. LsaIndex.nearest), rows padded with
+        -1; it cannot be restricted to a subset, so filtered searches leave
+        it out. Matches of either need not share words with the query.
+        """
+        queries = list(queries)
+        if not self.chunks or not queries or (subset is not None and not len(subset)):
+            return [[] for _ in queries]
+        if self.vectorizer is None:
+            return [self.keyword_search(query, max_chunks, subset) for query in queries]
+        if nearest is not None and subset is None:
+            return self._search_nearest(queries, max_chunks, nearest)
+
+        if scorer is None:
+            with metrics.span('scoring'):
+                scores = self.similarities(queries, subset)
+        columns = len(self.chunks) if subset is None else len(subset)
+        block = max(1, BATCH_BLOCK_CELLS // columns)
+        results = []
+        for start in range(0, len(queries), block):
+            with metrics.span('scoring'):
+                if scorer is None:
+                    dense = scores[start:start + block].toarray()
+                elif subset is None:
+                    dense = scorer(queries[start:start + block])
+                else:
+                    dense = scorer(queries[start:start + block], subset.rows)
+                top = top_k_rows(dense, max_chunks * 2)  # More candidates than needed for diversity
+            with metrics.span('selection'):
+                for row, query in enumerate(queries[start:start + block]):
+                    candidates = top[row] if subset is None else subset.rows[top[row]]
+                    relevant = self.select_candidates(candidates, dense[row][top[row]], extract_query_terms(query),
+                                                      max_chunks, require_terms=scorer is None)
+                    if not relevant:
+                        # Nothing passed the similarity/term thresholds; keyword overlap may still find something
+                        relevant = self.keyword_search(query, max_chunks, subset)
+                    results.append(relevant)
+        return results
+
+    def _search_nearest(self, queries: List[str], max_chunks: int, nearest) -> List[List[dict]]:
+        with metrics.span('scoring'):
+            rows, scores = nearest(queries, max_chunks * 2)
+        results = []
+        with metrics.span('selection'):
+            for query, query_rows, query_scores in zip(queries, rows, scores):
+                found = query_rows >= 0
+                relevant = self.select_candidates(query_rows[found], query_scores[found],
+                                                  extract_query_terms(query), max_chunks, require_terms=False)
+                results.append(relevant or self.keyword_search(query, max_chunks))
+        return results
+
+
+def _drop_near_duplicates(chunks, sources, origins, threshold):
+    """Keep the first chunk of every near-duplicate cluster, noting the sources and documents of the rest.
+
+    Returns (kept chunk indices, duplicate_sources, chunk_origins): the
+    document numbers (origins) each kept chunk stands for, its own first.
+    """
+    from dedup import near_duplicates
+    representatives = near_duplicates(chunks, threshold)
+    kept = {}
+    duplicate_sources = {}
+    chunk_origins = []
+    for idx, representative in enumerate(representatives.tolist()):
+        if representative == idx:
+            kept[idx] = len(kept)
+            chunk_origins.append([origins[idx]])
+        else:
+            others = duplicate_sources.setdefault(kept[representative], [])
+            if sources[idx] != sources[representative] and sources[idx] not in others:
+                others.append(sources[idx])
+            if origins[idx] not in chunk_origins[kept[representative]]:
+                chunk_origins[kept[representative]].append(origins[idx])
+    return list(kept), duplicate_sources, chunk_origins
+
+
+class IndexCache:
+    """The ChunkIndex of the most recent corpus snapshot.
+
+    Snapshots are compared by document identity: the corpus replaces a
+    document's dict when the file is re-ingested, so an unchanged snapshot
+    reuses the fitted index and any change rebuilds it. Indexes are built
+    with dedup_threshold and granularity (see ChunkIndex.build).
+    """
+
+    def __init__(self, dedup_threshold: float = 0.0, granularity: str = 'chunk'):
+        self.dedup_threshold = dedup_threshold
+        self.granularity = granularity
+        self._lock = threading.Lock()
+        self._documents: tuple = ()
+        self._index: Optional[ChunkIndex] = None
+
+    @property
+    def index(self) -> Optional[ChunkIndex]:
+        return self._index
+
+    def get(self, documents: Sequence[dict]) -> ChunkIndex:
+        with self._lock:
+            if self._index is None or len(documents) != len(self._documents) or \
+                    any(a is not b for a, b in zip(documents, self._documents)):
+                start = time.perf_counter()
+                self._index = ChunkIndex.build(documents, self.dedup_threshold, self.granularity)
+                self._documents = tuple(documents)
+                logger.info('Built retrieval index: %d chunks, %d terms in %.1f ms', len(self._index.chunks),
+                            self._index.vocabulary_size, (time.perf_counter() - start) * 1000)
+            return self._index
@@ -0,0 +1,122 @@
+"""Sentence-granular indexing and query-time window expansion ("small-to-big" retrieval).
+
+With granularity 'sentence', a ChunkIndex holds short spans of whole
+sentences instead of 1000-character chunks with 200 characters of overlap:
+every span is indexed once, with its character offsets in the document, so
+scoring is precise and no text is stored twice. A sentence shorter than
+MIN_SPAN_CHARS is joined with the next one, and one longer than
+MAX_SPAN_CHARS is cut at whitespace.
+
+At query time expand_windows grows every hit span into a window of the
+document text, ``window`` spans on either side, and merges the windows of a
+document that overlap or touch, so the prompt carries the text around the
+actual matches once.
+"""
+import re
+from typing import List, Tuple
+
+MIN_SPAN_CHARS = 60
+MAX_SPAN_CHARS = 400
+DEFAULT_WINDOW = 2
+
+# The end of a sentence (terminal punctuation and closing quotes or brackets before whitespace) or a blank line
+_SENTENCE_END = re.compile(r'[.!?]+[\'"”’)\]]*(?=\s|$)|\n[ \t]*\n')
+_WHITESPACE = re.compile(r'\s+')
+_WORD = re.compile(r'\w')
+
+
+def _trimmed(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def sentence_offsets(text: str) -> List[Tuple[int, int]]:
+    """(start, end) of every sentence of text, without surrounding whitespace."""
+    offsets = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.start() if text[match.start()] == '\n' else match.end()
+        offsets.append(_trimmed(text, start, end))
+        start = match.end()
+    offsets.append(_trimmed(text, start, len(text)))
+    return [(start, end) for start, end in offsets if _WORD.search(text, start, end)]
+
+
+def sentence_spans(text: str, min_chars: int = MIN_SPAN_CHARS,
+                   max_chars: int = MAX_SPAN_CHARS) -> List[Tuple[int, int]]:
+    """(start, end) of the spans text is indexed as: runs of whole sentences of min_chars to max_chars characters."""
+    spans = []
+    for start, end in sentence_offsets(text):
+        if spans and spans[-1][1] - spans[-1][0] < min_chars and end - spans[-1][0] <= max_chars:
+            start = spans.pop()[0]
+        while end - start > max_chars:
+            cut = text.rfind(' ', start + min_chars, start + max_chars)
+            if cut < 0:  # no space to cut at
+                cut = start + max_chars
+            spans.append(_trimmed(text, start, cut))
+            start = _trimmed(text, cut, end)[0]
+        spans.append((start, end))
+    # A short last span joins the one before it
+    if len(spans) > 1 and spans[-1][1] - spans[-1][0] < min_chars and spans[-1][1] - spans[-2][0] <= max_chars:
+        last = spans.pop()
+        spans[-1] = (spans[-1][0], last[1])
+    return spans
+
+
+def span_text(text: str, start: int, end: int) -> str:
+    """text[start:end] with whitespace collapsed, as spans are indexed."""
+    return _WHITESPACE.sub(' ', text[start:end])
+
+
+def expand_windows(index, hits: List[dict], window: int = DEFAULT_WINDOW) -> List[dict]:
+    """Replace span hits (best first, from a sentence-granular ChunkIndex) by windows of document text.
+
+    Each hit grows to the window spans before and after it in its document;
+    windows of one document that overlap or are separated only by
+    whitespace are merged. A window's similarity and term matches are those
+    of its best hit, and 'hits' counts the hits it holds. Windows come best
+    first, with their 'offsets' in the document text.
+    """
+    by_document = {}
+    for hit in hits:
+        row = hit['chunk_id']
+        document = int(index.origins[row])
+        first = last = row
+        while first > max(row - window, 0) and index.origins[first - 1] == document:
+            first -= 1
+        while last < min(row + window, len(index.chunks) - 1) and index.origins[last + 1] == document:
+            last += 1
+        by_document.setdefault(document, []).append((int(index.spans[first][0]), int(index.spans[last][1]), hit))
+
+    windows = []
+    for document, found in by_document.items():
+        text = index.documents[document]['content']
+        found.sort(key=lambda item: item[0])
+        merged = []
+        for start, end, hit in found:
+            if merged and not text[merged[-1][1]:start].strip():
+                merged[-1][1] = max(merged[-1][1], end)
+                merged[-1][2].append(hit)
+            else:
+                merged.append([start, end, [hit]])
+        for start, end, window_hits in merged:
+            best = max(window_hits, key=lambda hit: hit['similarity'])
+            sources = []
+            for hit in window_hits:
+                sources += [source for source in hit.get('sources', [hit['source']]) if source not in sources]
+            expanded = {
+                'content': span_text(text, start, end),
+                'source': best['source'],
+                'sources': sources,
+                'similarity': best['similarity'],
+                'offsets': (start, end),
+                'hits': len(window_hits),
+            }
+            if 'term_matches' in best:
+                expanded['term_matches'] = max(hit.get('term_matches', 0) for hit in window_hits)
+            windows.append(expanded)
+    windows.sort(key=lambda expanded: expanded['similarity'], reverse=True)
+    return windows
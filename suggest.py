@@ -0,0 +1,198 @@
+"""Autocomplete for partly typed questions, over past questions and the retrieval vocabulary.
+
+Both sources are PrefixIndexes: keys in one sorted list, each with a weight,
+so the completions of a prefix are one contiguous run of keys, found by
+bisection, and the heaviest of them are picked with one partial sort of that
+run's weights. A new key is inserted in place, so neither source is ever
+re-sorted as it grows.
+
+Questions are weighted by how often they were asked; only questions that
+retrieved chunks are recorded, so misspellings that found nothing are never
+offered again. Vocabulary terms complete the last word typed, weighted by the
+number of chunks containing them, so the corpus spelling of a transliteration
+comes first. A word with no completion falls back to its longest prefix that
+has some ("ahavat" finds "ahavas").
+
+numpy is imported on first use. With a log path, recorded questions are
+appended to it as JSON lines, loaded again on first use and, once mostly
+repeats, rewritten with one counted line per question.
+"""
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('suggest')
+
+DEFAULT_LIMIT = 8
+DEFAULT_MAX_QUESTIONS = 50000
+# Shorter vocabulary terms are never suggested, and a misspelt word is not shortened below this
+MIN_TERM_CHARS = 3
+# Longer messages are not offered as completions
+MAX_QUESTION_CHARS = 200
+
+_WHITESPACE = re.compile(r'\s+')
+_LAST_WORD = re.compile(r'\w+$')
+_LAST_KEY = '\U0010ffff'
+
+
+class PrefixIndex:
+    """Weighted keys in sorted order; the keys starting with a prefix are one contiguous run."""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        import numpy as np
+        weights = weights or {}
+        self.keys = sorted(weights)
+        self.weights = np.array([weights[key] for key in self.keys], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, weight: float = 1.0):
+        """Add weight to key, inserting it in order if it is new."""
+        import numpy as np
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            self.weights[position] += weight
+        else:
+            self.keys.insert(position, key)
+            self.weights = np.insert(self.weights, position, weight)
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, float]]:
+        """(key, weight) of the limit heaviest keys starting with prefix, heaviest first, ties in key order."""
+        import numpy as np
+        start = bisect.bisect_left(self.keys, prefix)
+        stop = bisect.bisect_left(self.keys, prefix + _LAST_KEY, start)
+        weights = self.weights[start:stop]
+        top = np.argpartition(-weights, limit - 1)[:limit] if len(weights) > limit else np.arange(len(weights))
+        top = top[np.lexsort((top, -weights[top]))]
+        return [(self.keys[start + i], float(weights[i])) for i in top.tolist()]
+
+    def retain(self, count: int):
+        """Drop all but the count heaviest keys."""
+        import numpy as np
+        if len(self.keys) > count:
+            keep = np.sort(np.argpartition(-self.weights, count - 1)[:count])
+            self.keys = [self.keys[i] for i in keep.tolist()]
+            self.weights = self.weights[keep]
+
+
+def normalize_question(text: str) -> str:
+    """text with whitespace collapsed and leading whitespace removed; a trailing space is kept."""
+    return _WHITESPACE.sub(' ', text).lstrip()
+
+
+class Suggester:
+    """Completions of partly typed questions: past questions first, then vocabulary terms for the last word.
+
+    Questions keep at most max_questions distinct entries, the most asked
+    ones. The vocabulary is rebuilt when the documents change (compared by
+    identity, like IndexCache).
+    """
+
+    def __init__(self, max_questions: int = DEFAULT_MAX_QUESTIONS, log_path: str = ''):
+        self.max_questions = max_questions
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._questions: Optional[PrefixIndex] = None  # lowercased questions, loaded on first use
+        self._asked: Dict[str, str] = {}  # lowercased question -> as first asked
+        self._vocabulary_lock = threading.Lock()
+        self._documents: tuple = ()
+        self._vocabulary: Optional[PrefixIndex] = None
+
+    @property
+    def question_count(self) -> int:
+        return len(self._asked)
+
+    def _load(self) -> PrefixIndex:
+        if self._questions is None:
+            self._questions = PrefixIndex()
+            if self.log_path and os.path.exists(self.log_path):
+                lines = 0
+                with open(self.log_path, encoding='utf-8') as log:
+                    for line in log:
+                        lines += 1
+                        try:
+                            entry = json.loads(line)
+                            self._add(entry['q'], float(entry.get('n', 1)))
+                        except (ValueError, KeyError, TypeError, AttributeError):
+                            logger.warning('Skipping malformed line in question log %s', self.log_path)
+                logger.info('Loaded %d questions from %s', len(self._asked), self.log_path)
+                if lines > 2 * len(self._asked):
+                    self._compact()
+        return self._questions
+
+    def _compact(self):
+        """Rewrite the log with one line per kept question, carrying its count."""
+        temporary = self.log_path + '.tmp'
+        try:
+            with open(temporary, 'w', encoding='utf-8') as log:
+                for key, weight in zip(self._questions.keys, self._questions.weights.tolist()):
+                    log.write(json.dumps({'q': self._asked[key], 'n': weight}, ensure_ascii=False) + '\n')
+            os.replace(temporary, self.log_path)
+        except OSError as e:
+            logger.warning('Could not compact question log %s: %s', self.log_path, e)
+
+    def _add(self, question: str, weight: float = 1.0):
+        key = question.lower()
+        self._asked.setdefault(key, question)
+        self._questions.add(key, weight)
+        # Trimming waits for some slack, so it happens once per many new questions
+        if len(self._questions) > self.max_questions * 1.1:
+            self._questions.retain(self.max_questions)
+            self._asked = {key: self._asked[key] for key in self._questions.keys}
+
+    def record(self, question: str):
+        """Count one more asking of question (which retrieved chunks)."""
+        question = normalize_question(question).rstrip()
+        if not question or len(question) > MAX_QUESTION_CHARS:
+            return
+        with self._lock:
+            self._load()
+            self._add(question)
+            if self.log_path:
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as log:
+                        log.write(json.dumps({'q': question}, ensure_ascii=False) + '\n')
+                except OSError as e:
+                    logger.warning('Could not append to question log %s: %s', self.log_path, e)
+
+    def vocabulary(self, documents: Sequence[dict], build: Callable[[], Dict[str, float]]) -> PrefixIndex:
+        """The vocabulary PrefixIndex of documents; build() gives term weights when they changed."""
+        with self._vocabulary_lock:
+            if self._vocabulary is None or len(documents) != len(self._documents) or \
+                    any(a is not b for a, b in zip(documents, self._documents)):
+                self._vocabulary = PrefixIndex({term: weight for term, weight in build().items()
+                                                if len(term) >= MIN_TERM_CHARS and not term.isdigit()})
+                self._documents = tuple(documents)
+            return self._vocabulary
+
+    def suggest(self, text: str, limit: int = DEFAULT_LIMIT, vocabulary: Optional[PrefixIndex] = None) -> List[dict]:
+        """Up to limit completions of text: {'text', 'source' ('question' or 'term'), 'weight'}, best first."""
+        typed = normalize_question(text)
+        if not typed:
+            return []
+        with self._lock:
+            questions = self._load().complete(typed.lower(), limit)
+            suggestions = [{'text': self._asked[key], 'source': 'question', 'weight': weight}
+                           for key, weight in questions]
+        word = _LAST_WORD.search(typed)
+        if vocabulary is None or word is None or len(suggestions) >= limit:
+            return suggestions
+        stem = word.group().lower()
+        terms = vocabulary.complete(stem, limit)
+        # A misspelt word completes as its longest prefix that the corpus has
+        while not terms and len(stem) > MIN_TERM_CHARS:
+            stem = stem[:-1]
+            terms = vocabulary.complete(stem, limit)
+        head = typed[:word.start()]
+        offered = {suggestion['text'].lower() for suggestion in suggestions} | {typed.lower()}
+        for term, weight in terms:
+            completion = head + term
+            if completion.lower() not in offered and len(suggestions) < limit:
+                offered.add(completion.lower())
+                suggestions.append({'text': completion, 'source': 'term', 'weight': weight})
+        return suggestions
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+from ann_index import IvfIndex, recall
+from dense_index import quantize
+from retrieval import top_k_rows
+
+
+def clustered_vectors(rows, clusters=20, dimensions=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions))
+    vectors = centers[rng.integers(clusters, size=rows)] + 0.3 * rng.normal(size=(rows, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+class TestIvfIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.vectors = clustered_vectors(3000)
+        cls.queries = clustered_vectors(20, seed=1)
+        cls.exact = top_k_rows(cls.queries @ cls.vectors.T, 10)
+
+    def test_probing_every_list_is_exact(self):
+        ivf = IvfIndex.train(self.vectors, lists=16)
+        self.assertEqual(ivf.size, len(self.vectors))
+        rows, scores = ivf.search(self.queries, self.vectors, None, 10, nprobe=16)
+        np.testing.assert_array_equal(rows, self.exact)
+        self.assertTrue(np.all(np.diff(scores, axis=1) <= 0))
+
+    def test_recall_grows_with_nprobe_on_quantized_vectors(self):
+        stored, scales = quantize(self.vectors, 'int8')
+        ivf = IvfIndex.train(stored, scales, lists=64)
+        recalls = [recall(self.exact, ivf.search(self.queries, stored, scales, 10, nprobe)[0])
+                   for nprobe in (1, 8, 64)]
+        self.assertEqual(recalls, sorted(recalls))
+        self.assertGreater(recalls[1], 0.8)
+        self.assertGreater(recalls[2], 0.95)
+
+    def test_inserted_and_remapped_rows_are_found(self):
+        ivf = IvfIndex.train(self.vectors[:500], lists=8)
+        ivf.add(np.arange(500, 3000), self.vectors[500:])
+        self.assertTrue(ivf.needs_training)
+        rows, _ = ivf.search(self.vectors[2500:2501], self.vectors, None, 1, nprobe=1)
+        self.assertEqual(rows[0, 0], 2500)
+
+        # Drop every other row and renumber the rest, as when chunks are removed from the corpus
+        mapping = np.where(np.arange(3000) % 2 == 0, np.arange(3000) // 2, -1)
+        remapped = ivf.remapped(mapping)
+        self.assertEqual(remapped.size, 1500)
+        rows, _ = remapped.search(self.vectors[2500:2501], self.vectors[::2], None, 1, nprobe=8)
+        self.assertEqual(rows[0, 0], 1250)
+
+    def test_padding_when_fewer_rows_than_k(self):
+        ivf = IvfIndex.train(self.vectors[:5], lists=2)
+        rows, scores = ivf.search(self.queries[:1], self.vectors[:5], None, 8, nprobe=2)
+        self.assertEqual(sorted(rows[0, :5]), list(range(5)))
+        self.assertTrue(np.all(rows[0, 5:] == -1))
+        self.assertTrue(np.all(np.isneginf(scores[0, 5:])))
+        restored = IvfIndex.from_arrays(ivf.arrays())
+        np.testing.assert_array_equal(restored.search(self.queries[:1], self.vectors[:5], None, 8, 2)[0], rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+import app as app_module
+from models.corpus import Corpus
+from uploads import ContentHashIndex
+from watcher import CREATED, MODIFIED
+
+
+class TestBackgroundMerge(unittest.TestCase):
+    def test_failing_merge_still_resolves_and_reports(self):
+        """Test that an error raised while merging fails the merged future and still runs on_done"""
+        corpus = Corpus()
+
+        def listener(event, doc):
+            raise RuntimeError('listener failed')
+        corpus.subscribe(listener)
+        finished = []
+        extracted = Future()
+        merged = app_module._merge_when_done(extracted, corpus, 'pdfs', 'sicha.txt', 'txt', on_done=finished.append)
+        extracted.set_result('A teaching about simcha.')
+        with self.assertRaises(RuntimeError):
+            merged.result(timeout=1)
+        self.assertEqual(finished, [None])
+
+    def test_merge_targets_the_corpus_live_when_extraction_finishes(self):
+        """Test that a merge without a corpus goes to the corpus published while it was extracting"""
+        previous = getattr(app_module.app, 'processed_documents', None)
+        try:
+            app_module.app.processed_documents = Corpus()
+            extracted = Future()
+            merged = app_module._merge_when_done(extracted, None, 'pdfs', 'sicha.txt', 'txt')
+            replacement = Corpus()
+            app_module.app.processed_documents = replacement
+            extracted.set_result('A teaching about simcha.')
+            merged.result(timeout=1)
+            self.assertIsNotNone(replacement.get('pdfs', 'sicha.txt'))
+        finally:
+            app_module.app.processed_documents = previous
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+    def test_watcher_is_not_started_on_import(self):
+        """Test that importing the app never starts the directory watcher"""
+        self.assertIsNone(app_module.directory_watcher)
+
+
+class TestProcessUploads(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous = getattr(app_module.app, 'processed_documents', None)
+        app_module.app.processed_documents = Corpus()
+        self.patches = [mock.patch.object(app_module, 'UPLOAD_FOLDER', self.directory.name),
+                        mock.patch.object(app_module, 'upload_hashes', ContentHashIndex(self.directory.name)),
+                        mock.patch.dict(app_module.app.config, {'UPLOAD_FOLDER': self.directory.name})]
+        for patch in self.patches:
+            patch.start()
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        app_module.app.processed_documents = self.previous
+        self.directory.cleanup()
+
+    def upload(self, name, data):
+        response = self.client.post('/process', data={'files': (io.BytesIO(data), name)},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data(as_text=True).splitlines()[-1])
+
+    def test_upload_is_indexed_once(self):
+        """Test that /process indexes a new upload, recognises a repeat and is not indexed again by the watcher"""
+        teaching = b'Every Jew is a shliach to make a dwelling place for G-dliness in this world.'
+        completion = self.upload('shlichus.txt', teaching)
+        self.assertEqual([f['status'] for f in completion['files']], ['indexed'])
+        self.assertEqual(completion['documents'], 1)
+        self.assertEqual(self.upload('copy.txt', teaching)['files'][0],
+                         {'filename': 'copy.txt', 'stored_as': 'shlichus.txt', 'status': 'duplicate'})
+        self.assertEqual(self.client.post('/process').status_code, 400)
+
+        # The watcher sees the upload arrive in the directory it watches, but /process has merged it already
+        with mock.patch.object(app_module, 'ingest_file') as ingest:
+            app_module.handle_watched_changes([(CREATED, self.directory.name, 'shlichus.txt')])
+            ingest.assert_not_called()
+            with open(f'{self.directory.name}/shlichus.txt', 'ab') as f:
+                f.write(b' Edited afterwards.')
+            app_module.handle_watched_changes([(MODIFIED, self.directory.name, 'shlichus.txt')])
+            ingest.assert_called_once_with(self.directory.name, 'shlichus.txt')
+
+    def test_upload_during_ingest_stays_searchable(self):
+        """Test that a document uploaded while /ingest builds its corpus is carried into the corpus it publishes"""
+        with open(os.path.join(self.directory.name, 'tanya.txt'), 'w') as f:
+            f.write('The Tanya explains the two souls of every Jew, the animal soul and the G-dly soul.')
+        app_module.app.processed_documents = Corpus([{'filename': 'old.txt', 'directory': self.directory.name,
+                                                      'file_type': 'txt', 'content': 'An older teaching.'}])
+        with mock.patch.dict(app_module.app.config, {'INGEST_DIRECTORIES': [self.directory.name]}):
+            response = self.client.get('/ingest', buffered=False)
+            events = iter(response.response)
+            # Once the directory is listed, an upload arriving in it is not part of this run's scan
+            for event in events:
+                if b'directory_start' in (event if isinstance(event, bytes) else event.encode()):
+                    break
+            upload = self.upload('mivtzoim.txt', b'The mivtzoim campaigns bring tefillin and Shabbos candles to all.')
+            self.assertEqual([f['status'] for f in upload['files']], ['indexed'])
+            remaining = b''.join(event if isinstance(event, bytes) else event.encode() for event in events)
+            response.close()
+        self.assertIn(b'"status": "complete"', remaining)
+        self.assertEqual(sorted(doc['filename'] for doc in app_module.app.processed_documents),
+                         ['mivtzoim.txt', 'tanya.txt'])
+        found = self.client.post('/search', json={'query': 'mivtzoim tefillin campaigns'}).get_json()
+        self.assertEqual(found['results'][0]['source'], 'mivtzoim.txt')
+
+
+class TestSearch(unittest.TestCase):
+    def test_boolean_page_size_is_rejected(self):
+        """Test that a JSON true is not taken as page size 1"""
+        previous = getattr(app_module.app, 'processed_documents', None)
+        app_module.app.processed_documents = Corpus([{'filename': 'a.txt', 'directory': 'pdfs', 'file_type': 'txt',
+                                                      'content': 'Ahavas Yisrael is the love of every Jew.'}])
+        try:
+            response = app_module.app.test_client().post('/search', json={'query': 'ahavas', 'page_size': True})
+            self.assertEqual(response.status_code, 400)
+        finally:
+            app_module.app.processed_documents = previous
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import unittest
+
+from benchmarks.synthetic_corpus import generate_corpus, generate_queries
+from benchmarks.bench_retrieval import compare
+from benchmarks.load_test_chat import parse_server_timing, percentile
+from benchmarks.stub_llm_server import StubConfig, start_stub_server
+
+
+class TestBenchmarkHelpers(unittest.TestCase):
+    def test_corpus_is_seeded(self):
+        """Test that the same seed gives the same corpus and a new seed does not"""
+        self.assertEqual(generate_corpus(3, 2000, seed=7), generate_corpus(3, 2000, seed=7))
+        self.assertNotEqual(generate_corpus(3, 2000, seed=7), generate_corpus(3, 2000, seed=8))
+        self.assertEqual(generate_queries(5), generate_queries(5))
+
+    def test_documents_look_like_processed_documents(self):
+        """Test document shape and approximate size"""
+        for doc in generate_corpus(4, 3000):
+            self.assertEqual(set(doc), {'filename', 'content', 'directory', 'file_type'})
+            self.assertGreaterEqual(len(doc['content']), 3000)
+            self.assertIn('\n\n', doc['content'])
+
+    def test_compare_flags_regressions(self):
+        """Test that only stages slower than the allowed margin are reported"""
+        def run(chunking, scoring):
+            return {'results': [{'target_chunks': 1000, 'stages': {
+                'chunking': {'median_ms': chunking}, 'scoring': {'median_ms': scoring}}}]}
+        regressions = compare(run(10.0, 2.6), run(10.0, 2.0), max_regression=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('scoring', regressions[0])
+        self.assertEqual(compare(run(12.0, 2.4), run(10.0, 2.0), max_regression=0.25), [])
+
+    def test_percentiles_and_server_timing(self):
+        """Test nearest-rank percentiles and Server-Timing parsing"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(parse_server_timing('retrieval;dur=12.5, model;desc="llm";dur=400'),
+                         {'retrieval': 12.5, 'model': 400.0})
+        self.assertEqual(parse_server_timing(None), {})
+
+    def test_stub_server_injects_errors(self):
+        """Test that the stub answers chat completions and injects failures"""
+        import json
+        import urllib.error
+        import urllib.request
+        server = start_stub_server(StubConfig(latency=0, jitter=0, error_rate=1.0))
+        try:
+            base = f'http://127.0.0.1:{server.server_port}/v1'
+            with urllib.request.urlopen(base + '/models') as response:
+                self.assertEqual(json.load(response)['object'], 'list')
+            request = urllib.request.Request(base + '/chat/completions', data=b'{}')
+            with self.assertRaises(urllib.error.HTTPError) as caught:
+                urllib.request.urlopen(request)
+            self.assertEqual(caught.exception.code, 500)
+        finally:
+            server.shutdown()
+
+    def test_ingest_corpus_round_trips_through_extractors(self):
+        """Test that generated ingest fixtures extract and report their sizes"""
+        import argparse
+        import tempfile
+        import wave
+        from benchmarks.bench_ingest import ENCODING_SAMPLES, build_corpus
+        from extractors import extract_text
+        args = argparse.Namespace(files=1, pdf_pages=2, docx_paragraphs=5, txt_kb=2,
+                                  encodings=['utf-8', 'cp1252'], audio_seconds=0.5)
+        with tempfile.TemporaryDirectory() as root:
+            txt = build_corpus(os.path.join(root, 'txt'), 'txt', args)
+            self.assertEqual(len(txt['files']), 2)
+            for path in txt['files']:
+                encoding = path.rsplit('_', 1)[1][:-4]
+                self.assertIn(ENCODING_SAMPLES[encoding], extract_text(path, use_cache=False))
+            docx = build_corpus(os.path.join(root, 'docx'), 'docx', args)
+            self.assertTrue(extract_text(docx['files'][0], use_cache=False))
+            wav = build_corpus(os.path.join(root, 'wav'), 'wav', args)
+            self.assertEqual(wav['audio_seconds'], 0.5)
+            with wave.open(wav['files'][0]) as audio:
+                self.assertEqual(audio.getnframes(), 8000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import math
+import unittest
+
+from benchmarks.synthetic_corpus import corpus_for_chunks, generate_queries
+from cascade import Cascade, budget_exhausted, proximity, term_pattern
+from retrieval import BM25_B, BM25_K1, ChunkIndex, extract_query_terms, tokenize
+
+
+def reference_bm25(index, terms, idx):
+    tokens = tokenize(index.chunks[idx])
+    average = sum(len(tokenize(chunk)) for chunk in index.chunks) / len(index.chunks)
+    score = 0.0
+    for term in terms:
+        df = sum(term in tokenize(chunk) for chunk in index.chunks)
+        tf = tokens.count(term)
+        if tf:
+            idf = math.log1p((len(index.chunks) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average))
+    return score
+
+
+class TestProximity(unittest.TestCase):
+    def test_shortest_span_holding_every_term(self):
+        pattern = term_pattern({'ahavas', 'yisrael'})
+        self.assertAlmostEqual(proximity('ahavas yisrael', pattern), 13 / 14)
+        spread = proximity('ahavas is the love of every fellow jew, yisrael', pattern)
+        self.assertLess(spread, 0.5)
+        self.assertGreater(proximity('yisrael ... ahavas yisrael', pattern), spread)
+        self.assertEqual(proximity('ahavas ahavas', pattern), 0.0)
+        self.assertEqual(proximity('ahavasyisrael', pattern), 0.0)
+
+
+class TestCascade(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = ChunkIndex.build(corpus_for_chunks(150, seed=11))
+        cls.queries = generate_queries(6, seed=12)
+
+    def test_bm25_matches_reference(self):
+        terms = extract_query_terms(self.queries[0])
+        candidates, scores = self.index.bm25(terms, 20)
+        self.assertTrue(all(a >= b for a, b in zip(scores, scores[1:])))
+        for idx, score in zip(candidates, scores):
+            self.assertAlmostEqual(float(score), reference_bm25(self.index, terms, idx), places=3)
+
+    def test_adjacent_terms_outrank_scattered_ones(self):
+        filler = ' '.join(['the rebbe spoke at the farbrengen about many subjects'] * 8)
+        documents = [
+            {'filename': 'scattered.txt', 'content': f'Simchas {filler} mitzvah'},
+            {'filename': 'adjacent.txt', 'content': f'Simchas mitzvah {filler}'},
+            {'filename': 'other.txt', 'content': f'{filler} chassidus'},
+        ]
+        result = Cascade().search(ChunkIndex.build(documents), 'simchas mitzvah', 3)
+        self.assertEqual([chunk['source'] for chunk in result], ['adjacent.txt', 'scattered.txt'])
+
+    def test_exhausted_budget_still_returns_ranked_chunks(self):
+        before = budget_exhausted.value()
+        for query in self.queries:
+            generous = Cascade(budget_ms=10000).search(self.index, query, 5)
+            hurried = Cascade(budget_ms=0).search(self.index, query, 5)
+            self.assertEqual(len(hurried), len(generous))
+            self.assertTrue(all(chunk['term_matches'] > 0 for chunk in hurried))
+        self.assertEqual(budget_exhausted.value() - before, len(self.queries))
+
+
+if __name__ == '__main__':
+    unittest.main()
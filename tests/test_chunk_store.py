@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from chunk_store import ChunkStore, fts_query
+from models.corpus import Corpus
+from retrieval import split_text_into_chunks, tokenize
+
+TEACHING = ("The purpose of creation is to make a dwelling place for G-dliness in the lower realms. "
+            "Every mitzvah refines the physical world.\n\n"
+            "Ahavas Yisrael means loving every Jew, without conditions, as the Baal Shem Tov taught.")
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'store', 'chunks.db')
+        self.store = ChunkStore(self.path, split_text_into_chunks, tokenize)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def doc(self, filename='a.txt', content=TEACHING, directory='pdfs'):
+        return {'filename': filename, 'content': content, 'directory': directory, 'file_type': 'txt'}
+
+    def test_wal_mode_and_unchanged_documents_are_not_rewritten(self):
+        mode = self.store._connection().execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+        self.assertTrue(self.store.upsert(self.doc()))
+        self.assertFalse(self.store.upsert(self.doc()))
+        self.assertTrue(self.store.upsert(self.doc(content=TEACHING + ' Shalom.')))
+        self.assertEqual(self.store.stats()['documents'], 1)
+
+    def test_bm25_search_with_operators_in_the_question(self):
+        self.store.upsert(self.doc())
+        self.store.upsert(self.doc('b.txt', 'Chanukah lights are kindled at the entrance, facing the public '
+                                            'domain, to illuminate the outside world.'))
+        results = self.store.search('What is "Ahavas Yisrael" (love) AND NOT hatred?', limit=5)
+        self.assertEqual(results[0]['source'], 'a.txt')
+        self.assertGreater(results[0]['similarity'], 0)
+        self.assertEqual(self.store.search('?!'), [])
+        self.assertEqual(fts_query('a "b', tokenize), '"a" OR "b"')
+
+    def test_corpus_changes_are_written_through_and_survive_reopening(self):
+        corpus = Corpus()
+        corpus.subscribe(self.store.on_corpus_change)
+        corpus.add(self.doc('a.txt'))
+        corpus.add(self.doc('b.txt', 'Chanukah lights illuminate the public domain, the outside world, '
+                                     'at the entrance of the home.'))
+        corpus.remove('pdfs', 'a.txt')
+        self.store.close()
+
+        reopened = ChunkStore(self.path, split_text_into_chunks, tokenize)
+        try:
+            self.assertEqual([doc['filename'] for doc in reopened.documents()], ['b.txt'])
+            self.assertEqual(reopened.search('dwelling'), [])
+            self.assertEqual(reopened.retain([]), 1)
+            self.assertEqual(reopened.stats()['chunks'], 0)
+        finally:
+            reopened.close()
+
+    def test_readers_see_committed_data_while_a_write_is_open(self):
+        self.store.upsert(self.doc())
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            writer.execute('BEGIN IMMEDIATE')
+            writer.execute("DELETE FROM documents")
+            self.assertEqual(self.store.search('dwelling')[0]['source'], 'a.txt')
+            writer.execute('ROLLBACK')
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from models.corpus import Corpus
+
+
+class TestCorpus(unittest.TestCase):
+    def test_add_replaces_same_file(self):
+        """Test that re-ingesting a file replaces it and bumps the generation"""
+        corpus = Corpus()
+        corpus.add({'filename': 'a.txt', 'directory': 'pdfs', 'content': 'old'})
+        corpus.add({'filename': 'a.txt', 'directory': 'test_audio', 'content': 'other dir'})
+        generation = corpus.generation
+        corpus.add({'filename': 'a.txt', 'directory': 'pdfs', 'content': 'new'})
+        self.assertEqual(len(corpus), 2)
+        self.assertEqual(corpus.get('pdfs', 'a.txt')['content'], 'new')
+        self.assertGreater(corpus.generation, generation)
+
+    def test_snapshots_are_stable_while_adding(self):
+        """Test that iteration is not affected by concurrent additions"""
+        corpus = Corpus([{'filename': 'a.txt', 'content': 'a'}])
+        snapshot = list(corpus)
+        corpus.append({'filename': 'b.txt', 'content': 'b'})
+        self.assertEqual([d['filename'] for d in snapshot], ['a.txt'])
+        self.assertEqual([d['filename'] for d in corpus[:5]], ['a.txt', 'b.txt'])
+
+    def test_remove(self):
+        """Test removing documents and truthiness of an empty corpus"""
+        corpus = Corpus([{'filename': 'a.txt', 'directory': 'pdfs', 'content': 'a'}])
+        self.assertIsNotNone(corpus.remove('pdfs', 'a.txt'))
+        self.assertIsNone(corpus.remove('pdfs', 'a.txt'))
+        self.assertFalse(corpus)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import random
+import unittest
+
+import numpy as np
+
+from benchmarks.synthetic_corpus import corpus_for_chunks
+from dedup import minhash_signatures, near_duplicates
+from retrieval import ChunkIndex, chunk_documents
+
+
+class TestNearDuplicates(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.documents = corpus_for_chunks(120, seed=21)
+        rng = random.Random(0)
+        cls.copies = []
+        for doc in cls.documents[::3]:
+            words = doc['content'].split(' ')
+            for _ in range(len(words) // 200):
+                words[rng.randrange(len(words))] = 'edited'
+            # A re-export: different header (so chunk boundaries shift) and a few changed words
+            cls.copies.append({'filename': doc['filename'] + '.docx', 'content': 'Exported. ' + ' '.join(words)})
+
+    def test_case_whitespace_and_punctuation_do_not_matter(self):
+        signatures, has_shingles = minhash_signatures([
+            'The Alter Rebbe, in Tanya: "every Jew has a G-dly soul."',
+            'the alter rebbe in tanya -- every jew   has a g dly soul',
+            'A completely different sentence about Chanukah lights.',
+            '?!',
+        ])
+        np.testing.assert_array_equal(signatures[0], signatures[1])
+        self.assertLess((signatures[0] == signatures[2]).mean(), 0.2)
+        self.assertEqual(has_shingles.tolist(), [True, True, True, False])
+
+    def test_shifted_and_edited_copies_map_to_the_original(self):
+        chunks = chunk_documents(self.documents + self.copies)[0]
+        originals = len(chunk_documents(self.documents)[0])
+        representatives = near_duplicates(chunks)
+        np.testing.assert_array_equal(representatives[:originals], np.arange(originals))
+        duplicates = representatives[originals:] != np.arange(originals, len(chunks))
+        self.assertGreater(duplicates.mean(), 0.9)
+
+    def test_index_keeps_one_chunk_citing_every_source(self):
+        plain = ChunkIndex.build(self.documents + self.copies)
+        deduplicated = ChunkIndex.build(self.documents + self.copies, dedup_threshold=0.8)
+        self.assertLess(len(deduplicated.chunks), len(plain.chunks) * 0.85)
+        self.assertEqual(len(set(deduplicated.chunks)), len(deduplicated.chunks))
+        copy = self.copies[0]['filename']
+        cited = [idx for idx, others in deduplicated.duplicate_sources.items() if copy in others]
+        self.assertTrue(cited)
+        original = copy[:-len('.docx')]
+        self.assertEqual(deduplicated.sources_of(cited[0]), [original, copy])
+
+        query = ' '.join(deduplicated.chunks[cited[0]].split()[:12])
+        result = deduplicated.search(query, max_chunks=5)
+        contents = [chunk['content'] for chunk in result]
+        self.assertEqual(len(set(contents)), len(contents))
+        self.assertIn(copy, next(chunk['sources'] for chunk in result if chunk['source'] == original))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import dense_index
+from benchmarks.synthetic_corpus import corpus_for_chunks, generate_queries
+from dense_index import LsaIndex, lsa_for
+from retrieval import ChunkIndex
+
+
+class TestLsaIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.documents = corpus_for_chunks(300, seed=5)
+        cls.queries = generate_queries(8, seed=6)
+        cls.index = ChunkIndex.build(cls.documents)
+
+    def setUp(self):
+        patcher = mock.patch.object(dense_index, '_latest', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_int8_scores_track_float32(self):
+        exact = LsaIndex.fit(self.index, 64, 'float32')
+        quantized = LsaIndex.fit(self.index, 64, 'int8')
+        self.assertEqual(quantized.vectors.dtype, np.int8)
+        self.assertLess(quantized.vectors.nbytes * 3, exact.vectors.nbytes)
+        np.testing.assert_allclose(quantized.scores(self.queries), exact.scores(self.queries), atol=0.02)
+
+    def test_saved_index_is_reused_for_a_reordered_corpus(self):
+        lsa = LsaIndex.fit(self.index, 32, 'int8')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lsa.npz')
+            lsa.save(path)
+            reordered = ChunkIndex.build(list(reversed(self.documents)))
+            with mock.patch.object(LsaIndex, 'fit', side_effect=AssertionError('refitted')):
+                loaded = lsa_for(reordered, path)
+            self.assertIs(reordered.lsa, loaded)
+            expected = dict(zip(self.index.chunks, lsa.scores(self.queries[:1])[0]))
+            for chunk, score in zip(reordered.chunks, loaded.scores(self.queries[:1])[0]):
+                self.assertAlmostEqual(score, expected[chunk], places=5)
+
+    def test_changed_corpus_is_folded_in_with_its_ann_index(self):
+        lsa = LsaIndex.fit(self.index, 32, 'int8')
+        lsa.train_ann(lists=8)
+        changed = [dict(doc) for doc in self.documents[1:]]
+        changed[0]['content'] += ' The Rebbe taught that every encounter has a purpose.'
+        index = ChunkIndex.build(changed)
+        extended = lsa.extended_to(index)
+        self.assertEqual(len(extended.vectors), len(index.chunks))
+        self.assertEqual(sorted(np.concatenate(extended.ann.lists)), list(range(len(index.chunks))))
+        # Unchanged chunks keep their vectors; new ones are projected into the same space
+        unchanged = index.chunks.index(self.index.chunks[-1])
+        np.testing.assert_array_equal(extended.vectors[unchanged], lsa.vectors[-1])
+        folded = next(i for i, chunk in enumerate(index.chunks) if 'every encounter' in chunk)
+        expected = float(lsa.project([index.chunks[folded]])[0] @ lsa.project(self.queries[:1])[0])
+        self.assertAlmostEqual(float(extended.scores(self.queries[:1])[0, folded]), expected, delta=0.02)
+        rows, scores = extended.nearest(self.queries[:2], 5, nprobe=8)
+        np.testing.assert_allclose(scores, np.sort(extended.scores(self.queries[:2]), axis=1)[:, ::-1][:, :5],
+                                   atol=1e-6)
+        # A mostly new corpus is refitted instead
+        self.assertIsNone(lsa.extended_to(ChunkIndex.build(corpus_for_chunks(300, seed=8))))
+
+    def test_dense_scores_do_not_require_shared_terms(self):
+        scores = np.zeros(len(self.index.chunks), dtype=np.float32)
+        scores[7] = 0.9
+        result = self.index.search('zzzz qqqq', max_chunks=3, scorer=lambda queries: scores[np.newaxis, :])
+        self.assertEqual(result[0]['content'], self.index.chunks[7])
+        self.assertEqual(result[0]['term_matches'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
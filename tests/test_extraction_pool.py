@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import extractors
+from extraction_pool import (ExtractionPool, ExtractionError, ExtractionMemoryError,
+                             ExtractionTimeout)
+
+
+@unittest.skipUnless(hasattr(os, 'mkfifo'), "Needs named pipes to simulate a hung file")
+class TestExtractionPool(unittest.TestCase):
+    def setUp(self):
+        """Create a good text file and a FIFO that blocks any reader forever"""
+        self.test_dir = tempfile.mkdtemp()
+        extractors.clear_cache()
+        self.good = os.path.join(self.test_dir, 'good.txt')
+        with open(self.good, 'w', encoding='utf-8') as f:
+            f.write("Every Jew is a lamp to illuminate the world.")
+        self.hung = os.path.join(self.test_dir, 'hung.txt')
+        os.mkfifo(self.hung)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_hung_file_times_out_without_blocking_others(self):
+        """Test that a hung file is killed while other files still complete"""
+        pool = ExtractionPool(workers=2, timeout=1.5, max_rss_mb=None)
+        try:
+            start = time.monotonic()
+            hung = pool.submit(self.hung)
+            good = pool.submit(self.good)
+            self.assertIn("lamp", good.result(timeout=30))
+            self.assertLess(time.monotonic() - start, 1.5)
+            with self.assertRaises(ExtractionTimeout):
+                hung.result(timeout=30)
+
+            # The killed worker is replaced and the pool keeps working
+            extractors.clear_cache()
+            self.assertIn("lamp", pool.submit(self.good).result(timeout=30))
+            self.assertGreaterEqual(pool.stats['workers_killed'], 1)
+        finally:
+            pool.shutdown()
+
+    def test_memory_cap_kills_worker(self):
+        """Test that a worker above the RSS cap is killed"""
+        pool = ExtractionPool(workers=1, timeout=30, max_rss_mb=1)
+        try:
+            with self.assertRaises(ExtractionMemoryError):
+                pool.submit(self.hung).result(timeout=30)
+        finally:
+            pool.shutdown()
+
+    def test_errors_and_cache(self):
+        """Test that failures surface as ExtractionError and results are cached"""
+        pool = ExtractionPool(workers=1, timeout=30)
+        try:
+            missing = os.path.join(self.test_dir, 'missing.pdf')
+            with self.assertRaises(ExtractionError):
+                pool.submit(missing).result(timeout=30)
+            pool.submit(self.good).result(timeout=30)
+            hits = extractors.cache.hits
+            self.assertTrue(pool.submit(self.good).done())
+            self.assertEqual(extractors.cache.hits, hits + 1)
+        finally:
+            pool.shutdown()
+
+    def test_inline_mode(self):
+        """Test that workers=0 extracts in the calling thread"""
+        pool = ExtractionPool(workers=0)
+        self.assertIn("lamp", pool.submit(self.good).result())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import extractors
+
+
+class TestExtractorRegistry(unittest.TestCase):
+    def setUp(self):
+        """Create a scratch directory and start from an empty cache"""
+        self.test_dir = tempfile.mkdtemp()
+        extractors.clear_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _write(self, name, data, mode='wb', **kwargs):
+        path = os.path.join(self.test_dir, name)
+        with open(path, mode, **kwargs) as f:
+            f.write(data)
+        return path
+
+    def test_file_type_mapping(self):
+        """Test extension and WhatsApp name detection"""
+        self.assertEqual(extractors.get_file_type('a/b/Sicha.PDF'), 'pdf')
+        self.assertEqual(extractors.get_file_type('note.docx'), 'docx')
+        self.assertEqual(extractors.get_file_type('voice.dat'), 'audio')
+        self.assertEqual(extractors.get_file_type('WhatsApp Audio 2024.opus'), 'audio')
+        self.assertIsNone(extractors.get_file_type('image.png'))
+
+    def test_txt_encoding_fallback_round_trips(self):
+        """Test that latin-1 text is decoded and streamed segments rejoin exactly"""
+        text = "Shalom caf\xe9\n" * 20000 + "last line"
+        path = self._write('sicha.txt', text, mode='w', encoding='latin-1', newline='')
+        self.assertEqual(extractors.extract_text(path, 'txt'), text)
+
+    def test_txt_lines_spanning_blocks_round_trip(self):
+        """Test that lines longer than a read block, and breaks on block edges, rejoin exactly"""
+        text = 'a' * 50 + '\n' + 'b' * 6 + '\n\n' + 'c' * 23 + '\r\n' + 'tail without a break ' * 5
+        path = self._write('long.txt', text, mode='w', newline='')
+        block_size = extractors.TXT_BLOCK_SIZE
+        extractors.TXT_BLOCK_SIZE = 7
+        try:
+            segments = list(extractors.iter_text(path, 'txt', use_cache=False))
+        finally:
+            extractors.TXT_BLOCK_SIZE = block_size
+        self.assertEqual('\n'.join(segments), text)
+        self.assertIn('a' * 50, segments)
+
+    def test_docx_backends_agree(self):
+        """Test that every installed DOCX backend returns the same paragraphs"""
+        paragraphs = ["Ahavas Yisrael", "Dirah b'tachtonim & more"]
+        path = self._write('doc.docx', extractors.build_docx_bytes(paragraphs))
+        for name in extractors.available_backends()['docx']:
+            text = extractors.extract_text(path, 'docx', use_cache=False, backend=name)
+            self.assertEqual(text, '\n'.join(paragraphs), name)
+
+    def test_pdf_pages_stream_in_order(self):
+        """Test that PDF text is streamed one page at a time"""
+        if not extractors.available_backends()['pdf']:
+            self.skipTest("No PDF backend installed")
+        path = self._write('doc.pdf', extractors.build_pdf_bytes(["first page", "second page"]))
+        pages = list(extractors.iter_text(path, 'pdf', use_cache=False))
+        self.assertEqual(len(pages), 2)
+        self.assertIn("first page", pages[0])
+        self.assertIn("second page", pages[1])
+
+    def test_cache_hits_and_invalidation(self):
+        """Test that results are cached until the file changes"""
+        path = self._write('a.txt', "original text", mode='w')
+        self.assertEqual(extractors.extract_text(path), "original text")
+        hits = extractors.cache.hits
+        self.assertEqual(extractors.extract_text(path), "original text")
+        self.assertEqual(extractors.cache.hits, hits + 1)
+
+        time.sleep(0.01)
+        self._write('a.txt', "rewritten text!", mode='w')
+        self.assertEqual(extractors.extract_text(path), "rewritten text!")
+
+    def test_cache_evicts_least_recently_used(self):
+        """Test that the cache stays within its character budget"""
+        cache = extractors.ExtractionCache(max_chars=10)
+        cache.put(('a',), "12345")
+        cache.put(('b',), "12345")
+        cache.get(('a',))
+        cache.put(('c',), "12345")
+        self.assertIsNotNone(cache.get(('a',)))
+        self.assertIsNone(cache.get(('b',)))
+
+    def test_select_backends_prefers_override(self):
+        """Test that EXTRACTOR_BACKENDS overrides the benchmark ordering"""
+        if len(extractors.available_backends()['docx']) < 2:
+            self.skipTest("Only one DOCX backend installed")
+        os.environ['EXTRACTOR_BACKENDS'] = 'docx=python-docx'
+        try:
+            self.assertEqual(extractors.select_backends()['docx'], 'python-docx')
+        finally:
+            del os.environ['EXTRACTOR_BACKENDS']
+            extractors.select_backends(benchmark=False)
+
+    def test_unsupported_file_returns_none(self):
+        """Test that unknown formats fail softly"""
+        path = self._write('image.png', b'\x89PNG')
+        self.assertIsNone(extractors.extract_text(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
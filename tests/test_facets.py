@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks.synthetic_corpus import corpus_for_chunks, generate_queries
+from cascade import Cascade
+from chunk_store import ChunkStore
+from dense_index import LsaIndex
+from facets import FilterError, matches, parse_filters
+from retrieval import ChunkIndex, extract_query_terms, split_text_into_chunks, tokenize
+
+
+class TestParseFilters(unittest.TestCase):
+    def test_normalized_and_validated(self):
+        self.assertIsNone(parse_filters(None))
+        self.assertIsNone(parse_filters({}))
+        self.assertEqual(parse_filters({'filename': '*Tanya*', 'file_type': ['pdf', 'audio', 'pdf']}),
+                         (('file_type', ('audio', 'pdf')), ('filename', ('*tanya*',))))
+        for bad in (['pdf'], {'sefer': 'tanya'}, {'file_type': []}, {'directory': 3}):
+            with self.assertRaises(FilterError):
+                parse_filters(bad)
+        doc = {'filename': 'Likkutei_Sichos.PDF', 'directory': 'pdfs', 'file_type': 'pdf'}
+        self.assertTrue(matches(doc, parse_filters({'filename': 'likkutei*.pdf', 'directory': 'pdfs'})))
+        self.assertFalse(matches(doc, parse_filters({'filename': 'likkutei*', 'file_type': 'audio'})))
+
+
+class TestFilteredSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.documents = corpus_for_chunks(200, seed=31)
+        cls.index = ChunkIndex.build(cls.documents)
+        cls.queries = generate_queries(8, seed=32)
+        cls.filters = parse_filters({'file_type': ['audio', 'txt']})
+        cls.allowed = {doc['filename'] for doc in cls.documents if matches(doc, cls.filters)}
+
+    def test_subset_rows_are_the_matching_documents_chunks(self):
+        subset = self.index.subset(self.filters)
+        expected = [i for i, source in enumerate(self.index.sources) if source in self.allowed]
+        self.assertEqual(subset.rows.tolist(), expected)
+        self.assertIs(self.index.subset(parse_filters({'file_type': ['txt', 'audio']})), subset)
+        self.assertEqual(subset.matrix.shape[0], len(expected))
+        self.assertEqual(len(self.index.subset(parse_filters({'directory': 'nowhere'}))), 0)
+
+    def test_filtered_results_are_the_best_matching_chunks(self):
+        subset = self.index.subset(self.filters)
+        full = self.index.similarities(self.queries).toarray()
+        for query, filtered, scores in zip(self.queries, self.index.search_batch(self.queries, 5, subset=subset),
+                                           full):
+            self.assertTrue(filtered)
+            self.assertTrue({chunk['source'] for chunk in filtered} <= self.allowed)
+            best = max(chunk['similarity'] for chunk in filtered)
+            self.assertAlmostEqual(best, float(scores[subset.rows].max()), places=5)
+            cascaded = Cascade().search(self.index, query, 5, subset)
+            self.assertTrue({chunk['source'] for chunk in cascaded} <= self.allowed)
+            keyword = self.index.keyword_search(query, 5, subset)
+            self.assertTrue({chunk['source'] for chunk in keyword} <= self.allowed)
+            rows, _ = self.index.bm25(extract_query_terms(query), 50, subset)
+            self.assertTrue(subset.mask[rows].all())
+
+    def test_dense_scores_of_a_subset(self):
+        lsa = LsaIndex.fit(self.index, dimensions=32)
+        subset = self.index.subset(self.filters)
+        np.testing.assert_allclose(lsa.scores(self.queries, subset.rows), lsa.scores(self.queries)[:, subset.rows],
+                                   rtol=1e-5, atol=1e-6)
+        for result in self.index.search_batch(self.queries, 5, scorer=lsa.scores, subset=subset):
+            self.assertTrue({chunk['source'] for chunk in result} <= self.allowed)
+
+    def test_deduplicated_chunk_matches_the_filters_of_every_copy(self):
+        original = dict(self.documents[0])
+        copy = dict(original, filename='copy.mp3', directory='test_audio', file_type='audio')
+        index = ChunkIndex.build([original, copy], dedup_threshold=0.8)
+        self.assertEqual(len(index.chunks), len(split_text_into_chunks(original['content'])))
+        audio = index.subset(parse_filters({'file_type': 'audio'}))
+        self.assertEqual(audio.rows.tolist(), list(range(len(index.chunks))))
+        self.assertEqual(len(index.subset(parse_filters({'filename': 'copy.*', 'directory': 'pdfs'}))), 0)
+
+
+class TestChunkStoreFilters(unittest.TestCase):
+    def test_filters_restrict_the_documents_searched(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ChunkStore(os.path.join(directory, 'chunks.db'), split_text_into_chunks, tokenize)
+            content = 'Every mitzvah refines the physical world and makes a dwelling place for G-dliness below.'
+            store.sync([{'filename': 'Sicha.PDF', 'content': content, 'directory': 'pdfs', 'file_type': 'pdf'},
+                        {'filename': 'shiur.wav', 'content': content, 'directory': 'test_audio',
+                         'file_type': 'audio'}])
+            self.assertEqual(len(store.search('mitzvah world')), 2)
+            audio = store.search('mitzvah world', filters=parse_filters({'file_type': 'audio'}))
+            self.assertEqual([chunk['source'] for chunk in audio], ['shiur.wav'])
+            named = store.search('mitzvah world', filters=parse_filters({'filename': 'sicha.*', 'directory': 'pdfs'}))
+            self.assertEqual([chunk['source'] for chunk in named], ['Sicha.PDF'])
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+
+import logging_config
+
+
+class FormattedOn:
+    """Argument that records which thread rendered it."""
+
+    def __init__(self):
+        self.thread = None
+
+    def __str__(self):
+        self.thread = threading.current_thread().name
+        return 'value'
+
+
+class TestLoggingConfig(unittest.TestCase):
+    def setUp(self):
+        # Start from no listener, even if an imported module (such as app) configured logging already
+        logging_config.stop_logging()
+        self.root = logging.getLogger()
+        self.saved = (list(self.root.handlers), self.root.level)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        logging_config.stop_logging()
+        for handler in list(self.root.handlers):
+            self.root.removeHandler(handler)
+        handlers, level = self.saved
+        for handler in handlers:
+            self.root.addHandler(handler)
+        self.root.setLevel(level)
+        logging.getLogger('noisy.module').setLevel(logging.NOTSET)
+        self.directory.cleanup()
+
+    def read_records(self):
+        logging_config.stop_logging()
+        with open(os.path.join(self.directory.name, 'app.log'), encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_are_json_with_extra_fields(self):
+        """Test structured JSON output including extra= fields and exceptions"""
+        logging_config.configure_logging(self.directory.name, console_level='CRITICAL', module_levels={})
+        logger = logging.getLogger('test.structured')
+        logger.info('Indexed %d chunks', 42, extra={'corpus': 'pdfs'})
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logger.exception('Failed')
+        records = self.read_records()
+        self.assertEqual(records[0]['message'], 'Indexed 42 chunks')
+        self.assertEqual(records[0]['corpus'], 'pdfs')
+        self.assertEqual(records[0]['logger'], 'test.structured')
+        self.assertIn('ValueError: boom', records[1]['exception'])
+
+    def test_formatting_happens_on_listener_thread(self):
+        """Test that messages are rendered off the calling thread"""
+        logging_config.configure_logging(self.directory.name, console_level='CRITICAL', module_levels={})
+        argument = FormattedOn()
+        logging.getLogger('test.lazy').info('Rendered %s', argument)
+        self.assertEqual(self.read_records()[0]['message'], 'Rendered value')
+        self.assertNotEqual(argument.thread, threading.current_thread().name)
+
+    def test_per_module_levels(self):
+        """Test LOG_LEVELS style per-module overrides"""
+        self.assertEqual(logging_config.parse_levels('a=debug, b.c=WARNING,bad'), {'a': 'DEBUG', 'b.c': 'WARNING'})
+        logging_config.configure_logging(self.directory.name, console_level='CRITICAL',
+                                         module_levels={'noisy.module': 'ERROR'})
+        logging.getLogger('noisy.module').warning('dropped')
+        logging.getLogger('noisy.module').error('kept')
+        self.assertEqual([r['message'] for r in self.read_records()], ['kept'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter_and_gauge_render(self):
+        """Test Prometheus text output for counters and callback gauges"""
+        requests = self.registry.register(metrics.Counter('demo_total', 'Demo requests', ('status',)))
+        requests.inc(status='ok')
+        requests.inc(2, status='ok')
+        self.registry.register(metrics.Gauge('demo_docs', 'Documents', func=lambda: 7))
+        text = self.registry.render()
+        self.assertIn('# TYPE demo_total counter', text)
+        self.assertIn('demo_total{status="ok"} 3', text)
+        self.assertIn('demo_docs 7', text)
+        with self.assertRaises(ValueError):
+            requests.inc(code='200')
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket counts, sum and count of a histogram"""
+        latency = self.registry.register(metrics.Histogram('demo_seconds', 'Latency', buckets=(0.1, 1.0)))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            latency.observe(value)
+        text = self.registry.render()
+        self.assertIn('demo_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('demo_seconds_bucket{le="1"} 3', text)
+        self.assertIn('demo_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('demo_seconds_count 4', text)
+        self.assertIn('demo_seconds_sum 4.25', text)
+
+    def test_spans_record_into_active_trace(self):
+        """Test that spans anywhere on the call path land in the active trace"""
+        def helper():
+            with metrics.span('scoring'):
+                pass
+
+        before = metrics.REQUESTS.value(operation='test', status='ok')
+        with metrics.trace('test') as trace:
+            with metrics.span('retrieval'):
+                helper()
+                helper()
+        self.assertEqual(list(trace.stages), ['scoring', 'retrieval'])
+        self.assertIn('retrieval;dur=', trace.server_timing())
+        self.assertEqual(metrics.REQUESTS.value(operation='test', status='ok'), before + 1)
+        self.assertIsNone(metrics.current_trace())
+
+    def test_traced_view_counts_error_status(self):
+        """Test that traced views record their response status"""
+        @metrics.traced('test-view')
+        def view(code):
+            return {'error': 'nope'}, code
+
+        view(400)
+        view(500)
+        self.assertEqual(metrics.REQUESTS.value(operation='test-view', status='client_error'), 1)
+        self.assertEqual(metrics.REQUESTS.value(operation='test-view', status='error'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
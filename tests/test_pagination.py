@@ -0,0 +1,66 @@
+import base64
+import json
+import re
+import unittest
+
+from facets import parse_filters
+from pagination import CursorError, ResultCache, decode_cursor, encode_cursor
+from retrieval import locate_chunk, split_text_into_chunks
+
+
+class TestCursors(unittest.TestCase):
+    def test_round_trip_and_forgeries(self):
+        filters = parse_filters({'file_type': ['audio', 'pdf'], 'filename': '*Tanya*'})
+        cursor = encode_cursor('What is simcha?', filters, 10, 20)
+        self.assertRegex(cursor, r'^[A-Za-z0-9_-]+$')
+        query, raw_filters, page_size, offset = decode_cursor(cursor)
+        self.assertEqual((query, parse_filters(raw_filters), page_size, offset), ('What is simcha?', filters, 10, 20))
+        self.assertIsNone(decode_cursor(encode_cursor('q', None, 5, 0))[1])
+        booleans = [base64.urlsafe_b64encode(json.dumps({'q': 'q', 'f': [], 'n': n, 'o': o}).encode()).decode()
+                    for n, o in ((True, 0), (5, True))]
+        for forged in ['', 'not a cursor', encode_cursor('q', None, 5, 0)[:-4], 'eyJxIjoxfQ'] + booleans:
+            with self.assertRaises(CursorError):
+                decode_cursor(forged)
+
+
+class TestResultCache(unittest.TestCase):
+    def test_pages_reuse_one_search_until_the_documents_change(self):
+        cache = ResultCache(size=2)
+        documents = [{'filename': 'a.txt', 'content': 'x'}]
+        calls = []
+
+        def search(name):
+            def run():
+                calls.append(name)
+                return [name]
+            return run
+        for _ in range(3):
+            self.assertEqual(cache.get(documents, ('q',), search('q')), ['q'])
+        self.assertEqual((calls, cache.hits, cache.misses), (['q'], 2, 1))
+        # An equal but re-ingested document is a new corpus
+        cache.get([dict(documents[0])], ('q',), search('q'))
+        self.assertEqual(calls, ['q', 'q'])
+
+    def test_least_recently_used_lists_are_evicted(self):
+        cache = ResultCache(size=2)
+        documents = []
+        for key in ('a', 'b', 'a', 'c', 'a', 'b'):
+            cache.get(documents, (key,), lambda: [key])
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (2, 4, 2))
+
+
+class TestLocateChunk(unittest.TestCase):
+    def test_offsets_of_overlapping_normalized_chunks(self):
+        paragraphs = [f'Paragraph {i}:\tthe Rebbe   explained\nthat every {i}th mitzvah ' + 'refines the world. ' * 12
+                      for i in range(8)]
+        text = '\n\n  \n'.join(paragraphs)
+        chunks = split_text_into_chunks(text)
+        self.assertGreater(len(chunks), 2)
+        for chunk in chunks:
+            start, end = locate_chunk(text, chunk)
+            self.assertEqual(re.sub(r'\s+', ' ', text[start:end]), chunk)
+        self.assertIsNone(locate_chunk(text, 'not in the text'))
+
+
+if __name__ == '__main__':
+    unittest.main()
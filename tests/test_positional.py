@@ -0,0 +1,102 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks.synthetic_corpus import corpus_for_chunks
+from chunk_store import ChunkStore, fts_query
+from facets import parse_filters
+from positional import constrain, decode_varints, encode_varints, parse_query, positions_for
+from retrieval import ChunkIndex, split_text_into_chunks, tokenize
+
+FILLER = ' '.join(['the rebbe spoke at the farbrengen about many subjects'] * 8)
+DOCUMENTS = [
+    {'filename': 'phrase.txt', 'directory': 'pdfs', 'file_type': 'txt',
+     'content': f"The purpose of creation is dirah b'tachtonim, a dwelling below. {FILLER}"},
+    {'filename': 'reversed.txt', 'directory': 'pdfs', 'file_type': 'txt',
+     'content': f"In the tachtonim, the lower worlds, He desired a dirah. {FILLER}"},
+    {'filename': 'spread.txt', 'directory': 'test_audio', 'file_type': 'audio',
+     'content': f"Dirah is a dwelling; {FILLER} b'tachtonim means in the lowest realm."},
+]
+
+
+def contains(tokens, phrase):
+    return any(tokens[i:i + len(phrase)] == list(phrase) for i in range(len(tokens) - len(phrase) + 1))
+
+
+class TestParseQuery(unittest.TestCase):
+    def test_phrases_and_near_are_separated_from_the_scored_text(self):
+        parsed = parse_query('What is “dirah b\'tachtonim” and ahavas NEAR/3 yisrael NEAR simcha? "a" "open')
+        self.assertEqual(parsed.text, 'What is dirah b\'tachtonim and ahavas yisrael simcha? a "open')
+        self.assertEqual(parsed.phrases, (('dirah', 'b', 'tachtonim'),))
+        self.assertEqual(parsed.near, (('ahavas', 'yisrael', 3), ('yisrael', 'simcha', 10)))
+        self.assertFalse(parse_query('who is near the rebbe?').constrained)
+        self.assertEqual(fts_query('"dirah b\'tachtonim" ahavas NEAR/2 yisrael', tokenize),
+                         '("dirah" OR "b" OR "tachtonim" OR "ahavas" OR "yisrael") AND "dirah b tachtonim" '
+                         'AND NEAR("ahavas" "yisrael", 2)')
+
+    def test_varints_round_trip(self):
+        values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 21, 2 ** 28 + 5, 2 ** 31 - 1])
+        encoded, sizes = encode_varints(values)
+        self.assertEqual(sizes.tolist(), [1, 1, 1, 2, 2, 2, 3, 4, 5, 5])
+        np.testing.assert_array_equal(decode_varints(encoded), values)
+
+
+class TestPositionalIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = ChunkIndex.build(corpus_for_chunks(200, seed=51))
+        cls.positions = positions_for(cls.index)
+        cls.tokens = [tokenize(chunk) for chunk in cls.index.chunks]
+
+    def test_phrase_and_near_rows_match_a_scan_of_the_text(self):
+        rng = random.Random(0)
+        rows = np.arange(0, len(self.tokens), 2, dtype=np.int32)
+        for _ in range(20):
+            tokens = self.tokens[rng.randrange(len(self.tokens))]
+            start = rng.randrange(len(tokens) - 4)
+            phrase = tuple(tokens[start:start + rng.randint(2, 4)])
+            expected = [i for i, chunk in enumerate(self.tokens) if contains(chunk, phrase)]
+            self.assertEqual(self.positions.phrase_rows(phrase).tolist(), expected)
+            self.assertEqual(self.positions.phrase_rows(phrase, rows).tolist(), [i for i in expected if i % 2 == 0])
+
+            a, b, k = tokens[start], tokens[start + rng.randint(1, 4)], rng.randint(0, 4)
+            if rng.random() < 0.3:
+                b = a
+            expected = [i for i, chunk in enumerate(self.tokens)
+                        if any(0 < abs(x - y) <= k + 1 for x, word in enumerate(chunk) if word == a
+                               for y, other in enumerate(chunk) if other == b)]
+            self.assertEqual(self.positions.near_rows(a, b, k).tolist(), expected)
+        self.assertLess(self.positions.buffer.nbytes, 1.1 * self.index.chunk_lengths.sum())
+
+    def test_ranked_search_only_scores_chunks_with_the_phrase(self):
+        index = ChunkIndex.build(DOCUMENTS)
+        parsed = parse_query('"dirah b\'tachtonim"')
+        result = index.search(parsed.text, 5, subset=constrain(index, parsed, None))
+        self.assertEqual([chunk['source'] for chunk in result], ['phrase.txt'])
+        self.assertEqual(len(index.search(parsed.text, 5)), 3)
+        near = parse_query('tachtonim NEAR/6 dirah')
+        self.assertEqual(constrain(index, near, None).rows.tolist(), [0, 1])
+        # The same word twice needs two occurrences: "the rebbe spoke at the" has three words between them,
+        # "the tachtonim, the" one
+        self.assertEqual(len(index.positions.near_rows('the', 'the', 3)), 3)
+        self.assertEqual(index.positions.near_rows('the', 'the', 1).tolist(), [1])
+        self.assertEqual(len(index.positions.near_rows('the', 'the', 0)), 0)
+        self.assertEqual(len(index.positions.near_rows('dirah', 'dirah', 10)), 0)
+        audio = index.subset(parse_filters({'file_type': 'audio'}))
+        self.assertEqual(len(constrain(index, parsed, audio)), 0)
+
+    def test_chunk_store_matches_phrases_with_fts5(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ChunkStore(os.path.join(directory, 'chunks.db'), split_text_into_chunks, tokenize)
+            store.sync(DOCUMENTS)
+            self.assertEqual([chunk['source'] for chunk in store.search('"dirah b\'tachtonim"')], ['phrase.txt'])
+            self.assertEqual(sorted(chunk['source'] for chunk in store.search('tachtonim NEAR/6 dirah')),
+                             ['phrase.txt', 'reversed.txt'])
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
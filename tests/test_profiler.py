@@ -0,0 +1,112 @@
+import os
+import tempfile
+import time
+import unittest
+
+import profiler
+from profiler import ProfileStore, RequestProfile, authorized, profile_iterable, requested_mode
+
+
+class FakeRequest:
+    def __init__(self, headers=None, args=None):
+        self.headers = headers or {}
+        self.args = args or {}
+        self.path = '/chat'
+
+
+def busy_work(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+class TestProfiler(unittest.TestCase):
+    def test_profiling_requires_token(self):
+        """Test that profiling is refused without the configured secret"""
+        self.assertFalse(authorized('anything', ''))
+        self.assertFalse(authorized('wrong', 'secret'))
+        self.assertTrue(authorized('secret', 'secret'))
+        request = FakeRequest(headers={'X-Profile': 'cprofile', 'X-Profile-Token': 'secret'})
+        self.assertEqual(requested_mode(request, 'secret'), 'cprofile')
+        self.assertIsNone(requested_mode(request, ''))
+        self.assertIsNone(requested_mode(FakeRequest(args={'profile': 'sample'}), 'secret'))
+        self.assertEqual(requested_mode(FakeRequest(args={'profile': 'sample', 'profile_token': 'secret'}),
+                                        'secret'), 'sample')
+
+    def test_profile_saves_pstats_and_collapsed_stacks(self):
+        """Test that a profiled call produces pstats and collapsed stacks naming the hot function"""
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProfileStore(directory, keep=5)
+            profile = RequestProfile('chat', 'cprofile', interval=0.001)
+            profile.resume()
+            busy_work(0.1)
+            profile.finish()
+            paths = profile.save(store, path='/chat')
+            self.assertEqual(sorted(os.path.splitext(p)[1] for p in paths), ['.collapsed', '.pstats'])
+            with open(paths[0]) as f:
+                collapsed = f.read()
+            self.assertIn('busy_work (test_profiler.py:', collapsed)
+            self.assertRegex(collapsed.splitlines()[0], r' \d+$')
+            self.assertEqual(store.list()[0]['path'], '/chat')
+
+    def test_store_is_a_bounded_ring(self):
+        """Test that only the newest profiles are kept and paths stay inside the store"""
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProfileStore(directory, keep=2)
+            ids = []
+            for _ in range(3):
+                profile = RequestProfile('ingest', 'sample')
+                profile.started = time.time() + len(ids)
+                profile.finish()
+                profile.save(store)
+                ids.append(profile.id)
+            self.assertEqual([info['id'] for info in store.list()], ids[:0:-1])
+            self.assertFalse(os.path.exists(os.path.join(directory, ids[0] + '.json')))
+            self.assertIsNone(store.path_for('../app.py'))
+            self.assertIsNotNone(store.path_for(ids[-1] + '.collapsed'))
+
+    def test_unread_streamed_body_releases_cprofile(self):
+        """Test that closing a streamed body that was never iterated finishes the profile"""
+        finished = []
+        profile = RequestProfile('ingest', 'cprofile')
+        self.assertEqual(profile.mode, 'cprofile')
+        body = profile_iterable(profile, iter(['a', 'b']), lambda: finished.append(profile.save(NullStore())))
+        body.close()
+        body.close()
+        self.assertEqual(len(finished), 1)
+        self.assertTrue(profiler._cprofile_lock.acquire(blocking=False))
+        profiler._cprofile_lock.release()
+
+    def test_failing_profiled_view_releases_cprofile(self):
+        """Test that a profiled view that raises still saves its profile and frees the cProfile slot"""
+        import app as app_module
+
+        def view():
+            raise RuntimeError('boom')
+        wrapped = app_module.profiled('chat')(view)
+        headers = {'X-Profile': 'cprofile', 'X-Profile-Token': 'secret'}
+        with tempfile.TemporaryDirectory() as directory:
+            store, app_module.profile_store = app_module.profile_store, ProfileStore(directory)
+            token, app_module.app.config['PROFILING_TOKEN'] = app_module.app.config['PROFILING_TOKEN'], 'secret'
+            try:
+                for _ in range(2):
+                    with app_module.app.test_request_context('/chat', method='POST', headers=headers):
+                        with self.assertRaises(RuntimeError):
+                            wrapped()
+                self.assertEqual([info['mode'] for info in app_module.profile_store.list()], ['cprofile'] * 2)
+            finally:
+                app_module.profile_store = store
+                app_module.app.config['PROFILING_TOKEN'] = token
+        self.assertTrue(profiler._cprofile_lock.acquire(blocking=False))
+        profiler._cprofile_lock.release()
+
+
+class NullStore:
+    def save(self, profile, meta):
+        return []
+
+
+if __name__ == '__main__':
+    unittest.main()
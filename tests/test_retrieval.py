@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+
+from benchmarks.synthetic_corpus import corpus_for_chunks, generate_queries
+from retrieval import MIN_SIMILARITY, ChunkIndex, IndexCache, extract_query_terms, tokenize, top_k_rows
+
+
+def reference_select(index, similarities, query_terms, max_chunks):
+    """Straightforward two-pass selection the vectorized one must agree with"""
+    candidates = list(np.argsort(-similarities, kind='stable')[:max_chunks * 2])
+    qualified = []
+    for idx in candidates:
+        matches = len(query_terms & set(tokenize(index.chunks[idx])))
+        if similarities[idx] > MIN_SIMILARITY and matches:
+            qualified.append((idx, matches))
+    chosen, used_docs = [], set()
+    for idx, matches in qualified:  # best chunk of each document first
+        if index.docs[idx] not in used_docs:
+            chosen.append((idx, matches))
+            used_docs.add(index.docs[idx])
+    chosen += [item for item in qualified if item not in chosen]
+    chosen = chosen[:max_chunks]
+    chosen.sort(key=lambda item: (similarities[item[0]], item[1]), reverse=True)
+    return [(index.chunks[idx], matches) for idx, matches in chosen]
+
+
+class TestTopKRows(unittest.TestCase):
+    def test_matches_full_sort(self):
+        scores = np.random.default_rng(0).random((5, 50))
+        top = top_k_rows(scores, 7)
+        expected = np.argsort(-scores, axis=1)[:, :7]
+        np.testing.assert_array_equal(top, expected)
+
+    def test_k_larger_than_row(self):
+        scores = np.array([[0.1, 0.3, 0.2]])
+        np.testing.assert_array_equal(top_k_rows(scores, 10), [[1, 2, 0]])
+
+
+class TestChunkIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.documents = corpus_for_chunks(200, seed=3)
+        cls.queries = generate_queries(12, seed=4)
+
+    def test_batch_matches_single_queries(self):
+        """Batch results equal a per-query cosine computed independently, with the two-pass selection"""
+        from sklearn.metrics.pairwise import cosine_similarity
+        index = ChunkIndex.build(self.documents)
+        chunk_vectors = index.vectorizer.transform(index.chunks)
+        batch = index.search_batch(self.queries, max_chunks=5)
+        for query, result in zip(self.queries, batch):
+            similarities = cosine_similarity(index.vectorizer.transform([query]), chunk_vectors)[0]
+            expected = reference_select(index, similarities, extract_query_terms(query), 5)
+            self.assertTrue(expected)
+            self.assertEqual([(chunk['content'], chunk['term_matches']) for chunk in result], expected)
+            by_content = dict(zip(index.chunks, similarities))
+            for chunk in result:
+                self.assertAlmostEqual(chunk['similarity'], by_content[chunk['content']], places=6)
+
+    def test_selection_matches_reference(self):
+        """Vectorized selection picks the same chunks as the two-pass loop, capped at max_chunks"""
+        index = ChunkIndex.build(self.documents)
+        for query in self.queries:
+            similarities = index.similarities([query]).toarray()[0]
+            terms = extract_query_terms(query)
+            result = index.select(similarities, terms, 4)
+            self.assertLessEqual(len(result), 4)
+            self.assertEqual([(chunk['content'], chunk['term_matches']) for chunk in result],
+                             reference_select(index, similarities, terms, 4))
+
+    def test_keyword_search_scores_from_postings(self):
+        """Keyword scores are the share of query words present; each source's best chunk comes first"""
+        index = ChunkIndex.build(self.documents)
+        for query in self.queries:
+            words = set(tokenize(query))
+            result = index.keyword_search(query, max_chunks=6)
+            self.assertLessEqual(len(result), 6)
+            by_content = {chunk: source for chunk, source in zip(index.chunks, index.sources)}
+            for chunk in result:
+                overlap = len(words & set(tokenize(chunk['content'])))
+                self.assertAlmostEqual(chunk['similarity'], overlap / len(words))
+                self.assertEqual(chunk['source'], by_content[chunk['content']])
+            sources = [chunk['source'] for chunk in result]
+            distinct = len(set(sources))
+            self.assertEqual(len(set(sources[:distinct])), distinct)
+
+    def test_tiny_corpus_falls_back_to_keywords(self):
+        documents = [{'filename': 'a.txt', 'content': 'Ahavas Yisrael is the love of every fellow Jew, '
+                                                      'without exception or condition.'}]
+        index = ChunkIndex.build(documents)
+        self.assertIsNone(index.vectorizer)
+        result = index.search('ahavas yisrael', max_chunks=3)
+        self.assertEqual([chunk['source'] for chunk in result], ['a.txt'])
+
+    def test_cache_rebuilds_only_when_documents_change(self):
+        cache = IndexCache()
+        documents = list(self.documents)
+        index = cache.get(documents)
+        self.assertIs(cache.get(list(documents)), index)
+        documents[0] = dict(documents[0])
+        self.assertIsNot(cache.get(documents), index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from benchmarks.synthetic_corpus import corpus_for_chunks
+from retrieval import ChunkIndex
+from sentences import MAX_SPAN_CHARS, expand_windows, sentence_offsets, sentence_spans, span_text
+
+SICHA = ('The Rebbe asked: "Why was the world created?" The answer is simple.\n\n'
+         'A dwelling place below! Every mitzvah refines the physical world, and this is the purpose of creation. '
+         'Ok. ' + 'A very long sentence about the shliach and his mission in the world ' * 10 + 'ends here.')
+
+
+class TestSentenceSpans(unittest.TestCase):
+    def test_sentences_and_spans_cover_the_text_without_overlap(self):
+        self.assertEqual([SICHA[start:end] for start, end in sentence_offsets(SICHA)][:4], [
+            'The Rebbe asked: "Why was the world created?"', 'The answer is simple.', 'A dwelling place below!',
+            'Every mitzvah refines the physical world, and this is the purpose of creation.'])
+        spans = sentence_spans(SICHA)
+        self.assertTrue(all(0 < end - start <= MAX_SPAN_CHARS for start, end in spans))
+        self.assertTrue(all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:])))
+        self.assertEqual(' '.join(span_text(SICHA, start, end) for start, end in spans), ' '.join(SICHA.split()))
+        # The short first sentence is joined with the next one
+        self.assertEqual(SICHA[slice(*spans[0])], 'The Rebbe asked: "Why was the world created?" The answer is simple.')
+
+
+class TestSentenceIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.documents = corpus_for_chunks(60, seed=41)
+        cls.index = ChunkIndex.build(cls.documents, granularity='sentence')
+
+    def test_spans_are_indexed_once_with_their_offsets(self):
+        chunked = ChunkIndex.build(self.documents)
+        self.assertLess(sum(map(len, self.index.chunks)), sum(map(len, chunked.chunks)))
+        for row in range(0, len(self.index.chunks), 7):
+            start, end = self.index.spans[row]
+            text = self.documents[self.index.origins[row]]['content']
+            self.assertEqual(span_text(text, start, end), self.index.chunks[row])
+
+    def test_adjacent_hits_merge_into_one_window(self):
+        origins = self.index.origins.tolist()
+        row = next(row for row in range(3, len(origins) - 3) if len(set(origins[row - 3:row + 4])) == 1)
+
+        def hit(row, similarity):
+            return {'chunk_id': row, 'source': self.index.sources[row], 'sources': [self.index.sources[row]],
+                    'similarity': similarity}
+        far = next(first for first in range(1, len(origins))
+                   if origins[first] != origins[first - 1] and origins[first] != origins[row])
+        windows = expand_windows(self.index, [hit(row, 0.9), hit(row + 1, 0.5), hit(far, 0.7)], window=1)
+        self.assertEqual([window['hits'] for window in windows], [2, 1])
+        self.assertEqual(windows[0]['similarity'], 0.9)
+        text = self.documents[origins[row]]['content']
+        self.assertEqual(windows[0]['offsets'], (self.index.spans[row - 1][0], self.index.spans[row + 2][1]))
+        self.assertEqual(windows[0]['content'], span_text(text, *windows[0]['offsets']))
+        # The first span of a document has no window before it in the previous document
+        self.assertEqual(windows[1]['offsets'][0], self.index.spans[far][0])
+
+    def test_search_returns_the_text_around_the_match(self):
+        row = len(self.index.chunks) // 2
+        query = ' '.join(self.index.chunks[row].split()[:10])
+        windows = expand_windows(self.index, self.index.search(query, 3), window=2)
+        self.assertIn(self.index.chunks[row], windows[0]['content'])
+        self.assertLessEqual(len(windows[0]['content']), 5 * MAX_SPAN_CHARS + 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import ffmpeg_setup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestFindFfmpeg(unittest.TestCase):
+    def setUp(self):
+        ffmpeg_setup.find_ffmpeg.cache_clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.binary = os.path.join(self.directory.name, 'ffmpeg' + ffmpeg_setup.EXE_SUFFIX)
+        with open(self.binary, 'w') as f:
+            f.write('')
+
+    def tearDown(self):
+        ffmpeg_setup.find_ffmpeg.cache_clear()
+        self.directory.cleanup()
+
+    def test_ffmpeg_path_may_name_the_directory(self):
+        with mock.patch.dict(os.environ, {'FFMPEG_PATH': self.directory.name}):
+            self.assertEqual(ffmpeg_setup.find_ffmpeg(), os.path.abspath(self.binary))
+
+    def test_result_is_cached_and_exported(self):
+        with mock.patch.dict(os.environ, {'FFMPEG_PATH': ''}), \
+                mock.patch('shutil.which', return_value=self.binary) as which:
+            self.assertEqual(ffmpeg_setup.find_ffmpeg(), os.path.abspath(self.binary))
+            ffmpeg_setup.find_ffmpeg()
+            self.assertEqual(which.call_count, 1)
+            self.assertEqual(os.environ['FFMPEG_PATH'], os.path.abspath(self.binary))
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_defers_heavy_modules_and_health_is_fast(self):
+        script = (
+            "import json, sys, app\n"
+            "heavy = [m for m in ('sklearn', 'openai', 'pydub', 'scipy') if m in sys.modules]\n"
+            "response = app.app.test_client().get('/health')\n"
+            "print(json.dumps({'heavy': heavy, 'status': response.status_code,\n"
+            "                  'body': response.get_json()}))\n"
+        )
+        env = dict(os.environ, WATCH_DIRECTORIES='', LOG_CONSOLE_LEVEL='ERROR')
+        result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(report['heavy'], [])
+        self.assertEqual(report['status'], 200)
+        self.assertEqual(report['body']['status'], 'ok')
+        self.assertGreater(report['body']['startup_ms'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+
+from chunk_store import ChunkStore
+from retrieval import ChunkIndex, split_text_into_chunks, tokenize
+from suggest import PrefixIndex, Suggester
+
+DOCUMENTS = [
+    {'filename': 'ahavas.txt', 'directory': 'pdfs', 'file_type': 'txt',
+     'content': 'Ahavas Yisrael is the love of every Jew. ' * 3 + 'Ahavas Hashem follows from it.'},
+    {'filename': 'simcha.txt', 'directory': 'pdfs', 'file_type': 'txt',
+     'content': 'Serve Hashem with simcha, with joy, and ahavas Yisrael grows. Simchas Torah is joy.'},
+]
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def test_completions_are_the_heaviest_keys_with_the_prefix(self):
+        index = PrefixIndex({'ahavas': 5, 'ahava': 1, 'ahavat': 1, 'ahron': 9, 'yisrael': 7})
+        self.assertEqual(index.complete('ahav', 2), [('ahavas', 5.0), ('ahava', 1.0)])
+        self.assertEqual(index.complete('ah', 10)[0], ('ahron', 9.0))
+        self.assertEqual(index.complete('z', 3), [])
+        index.add('ahavat', 10)
+        index.add('ahavah', 2)
+        self.assertEqual(index.keys, sorted(index.keys))
+        self.assertEqual(index.complete('ahav', 3), [('ahavat', 11.0), ('ahavas', 5.0), ('ahavah', 2.0)])
+        index.retain(2)
+        self.assertEqual(index.keys, ['ahavat', 'ahron'])
+
+
+class TestSuggester(unittest.TestCase):
+    def test_past_questions_come_before_vocabulary_terms(self):
+        suggester = Suggester()
+        for question in ['What is ahavas Yisrael?', 'what is  ahavas yisrael?', 'What is simcha?']:
+            suggester.record(question)
+        vocabulary = PrefixIndex(ChunkIndex.build(DOCUMENTS).chunk_frequencies())
+        suggestions = suggester.suggest('  what is', 4, vocabulary)
+        self.assertEqual([(s['text'], s['source'], s['weight']) for s in suggestions],
+                         [('What is ahavas Yisrael?', 'question', 2.0), ('What is simcha?', 'question', 1.0)])
+        self.assertEqual([s['text'] for s in suggester.suggest('what is sim', 4, vocabulary)],
+                         ['What is simcha?', 'what is simcha', 'what is simchas'])
+        # A misspelt word completes as the corpus spelling of its longest known prefix
+        self.assertEqual([s['text'] for s in suggester.suggest('Ahavat', 4, vocabulary)], ['ahavas'])
+        self.assertEqual(suggester.suggest('what is ', 4, vocabulary)[-1]['text'], 'What is simcha?')
+        self.assertEqual(suggester.suggest('   ', 4, vocabulary), [])
+
+    def test_questions_are_logged_and_compacted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'questions.jsonl')
+            suggester = Suggester(log_path=path)
+            for _ in range(5):
+                suggester.record('Who was the Alter Rebbe?')
+            suggester.record('Who wrote Tanya?')
+            restored = Suggester(log_path=path)
+            self.assertEqual([(s['text'], s['weight']) for s in restored.suggest('who w', 5)],
+                             [('Who was the Alter Rebbe?', 5.0), ('Who wrote Tanya?', 1.0)])
+            with open(path, encoding='utf-8') as log:
+                self.assertEqual([json.loads(line) for line in log],
+                                 [{'q': 'Who was the Alter Rebbe?', 'n': 5.0}, {'q': 'Who wrote Tanya?', 'n': 1.0}])
+
+    def test_vocabularies_of_the_index_and_the_chunk_store_agree(self):
+        index = ChunkIndex.build(DOCUMENTS)
+        with tempfile.TemporaryDirectory() as directory:
+            store = ChunkStore(os.path.join(directory, 'chunks.db'), split_text_into_chunks, tokenize)
+            store.sync(DOCUMENTS)
+            self.assertEqual(store.vocabulary(), index.chunk_frequencies())
+            store.close()
+        suggester = Suggester()
+        calls = []
+        build = lambda: calls.append(1) or index.chunk_frequencies()
+        vocabulary = suggester.vocabulary(DOCUMENTS, build)
+        self.assertIs(suggester.vocabulary(list(DOCUMENTS), build), vocabulary)
+        self.assertEqual(len(calls), 1)
+        self.assertNotIn('is', vocabulary.keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
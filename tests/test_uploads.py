@@ -0,0 +1,52 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from uploads import HashingUpload, ContentHashIndex
+
+
+class TestUploads(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.test_dir, 'existing.txt'), 'wb') as f:
+            f.write(b"existing teaching")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _upload(self, data):
+        upload = HashingUpload(self.test_dir)
+        for i in range(0, len(data), 4):
+            upload.write(data[i:i + 4])
+        upload.seek(0)
+        return upload
+
+    def test_upload_is_hashed_while_written(self):
+        """Test that the digest matches the streamed bytes"""
+        upload = self._upload(b"streamed in small chunks")
+        self.assertEqual(upload.hexdigest(), hashlib.sha256(b"streamed in small chunks").hexdigest())
+        self.assertEqual(upload.read(), b"streamed in small chunks")
+        upload.close()
+        self.assertFalse(os.path.exists(upload.name))
+
+    def test_duplicate_content_is_not_stored_twice(self):
+        """Test that uploads are deduplicated by content hash"""
+        index = ContentHashIndex(self.test_dir)
+        name, is_new = index.store(self._upload(b"existing teaching"), 'renamed.txt')
+        self.assertEqual((name, is_new), ('existing.txt', False))
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['existing.txt'])
+
+    def test_name_collision_keeps_both_files(self):
+        """Test that different content with the same name gets a suffix"""
+        index = ContentHashIndex(self.test_dir)
+        name, is_new = index.store(self._upload(b"a different teaching"), 'existing.txt')
+        self.assertTrue(is_new)
+        self.assertNotEqual(name, 'existing.txt')
+        with open(os.path.join(self.test_dir, name), 'rb') as f:
+            self.assertEqual(f.read(), b"a different teaching")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from watcher import DirectoryWatcher, CREATED, MODIFIED, DELETED
+
+
+class WatcherTestMixin:
+    use_inotify = False
+
+    def setUp(self):
+        """Start a watcher on a scratch directory with a short debounce"""
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.test_dir, 'existing.txt'), 'w') as f:
+            f.write("already here")
+        self.batches = queue.Queue()
+        self.watcher = DirectoryWatcher(
+            [self.test_dir], self.batches.put,
+            file_filter=lambda name: name.endswith('.txt'),
+            debounce=0.3, poll_interval=0.1, use_inotify=self.use_inotify).start()
+        time.sleep(0.2)
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _changes(self, timeout=5):
+        changes = set()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                batch = self.batches.get(timeout=0.5)
+            except queue.Empty:
+                if changes:
+                    break
+                continue
+            changes.update((change, name) for change, _, name in batch)
+        return changes
+
+    def test_burst_is_debounced_into_one_change(self):
+        """Test that repeated writes to a new file are reported once as created"""
+        path = os.path.join(self.test_dir, 'new.txt')
+        for i in range(5):
+            with open(path, 'a') as f:
+                f.write(f"line {i}\n")
+            time.sleep(0.05)
+        with open(os.path.join(self.test_dir, 'ignored.pdf.tmp'), 'w') as f:
+            f.write("filtered out")
+        self.assertEqual(self._changes(), {(CREATED, 'new.txt')})
+
+    def test_modify_and_delete(self):
+        """Test that modifications and deletions of existing files are reported"""
+        time.sleep(0.01)
+        with open(os.path.join(self.test_dir, 'existing.txt'), 'w') as f:
+            f.write("rewritten content")
+        self.assertEqual(self._changes(), {(MODIFIED, 'existing.txt')})
+        os.remove(os.path.join(self.test_dir, 'existing.txt'))
+        self.assertEqual(self._changes(), {(DELETED, 'existing.txt')})
+
+
+class TestPollingWatcher(WatcherTestMixin, unittest.TestCase):
+    use_inotify = False
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "inotify is Linux only")
+class TestInotifyWatcher(WatcherTestMixin, unittest.TestCase):
+    use_inotify = True
+
+    def test_backend(self):
+        """Test that the inotify backend was actually used"""
+        self.assertEqual(self.watcher.backend, 'inotify')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Streaming upload support.
+
+Multipart file parts are written straight into a temporary file inside the
+upload folder while their SHA-256 is computed, so an upload is never held in
+memory and can be moved into place (or discarded as a duplicate) without a
+second pass over the bytes.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import Request, current_app
+
+HASH_BLOCK_SIZE = 1024 * 1024
+TEMP_PREFIX = '.upload-'
+
+
+class HashingUpload:
+    """Writable/readable temp file that hashes everything written to it."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=directory, prefix=TEMP_PREFIX, suffix='.part',
+                                                 delete=False)
+        self.name = self._file.name
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self._moved = False
+
+    def write(self, data: bytes) -> int:
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def move_to(self, path: str):
+        """Atomically move the finished upload to its final path."""
+        self._file.close()
+        os.replace(self.name, path)
+        self._moved = True
+
+    def close(self):
+        """Close the file and delete it unless it has been moved into place."""
+        self._file.close()
+        if not self._moved:
+            try:
+                os.unlink(self.name)
+            except OSError:
+                pass
+            self._moved = True
+
+    def __getattr__(self, name):
+        # read/readline/seek/tell etc. go to the underlying file
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Request class that streams file parts into HashingUpload files."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return HashingUpload(current_app.config['UPLOAD_FOLDER'])
+
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentHashIndex:
+    """Map of content hash -> filename for one directory, built lazily.
+
+    Files moved in by store() are remembered with their hash, so a watcher of
+    the same directory can tell (is_stored_upload) that the upload handler
+    indexes them itself.
+    """
+
+    def __init__(self, directory: str, file_filter=None):
+        self.directory = directory
+        self.file_filter = file_filter or (lambda name: True)
+        self._by_hash: Optional[Dict[str, str]] = None
+        self._stored: Dict[str, str] = {}  # filename -> hash of the upload store() moved there
+        self._lock = threading.RLock()
+
+    def _load(self) -> Dict[str, str]:
+        if self._by_hash is None:
+            by_hash = {}
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    path = os.path.join(self.directory, name)
+                    # Skip in-flight uploads; they are not stored content yet
+                    if name.startswith(TEMP_PREFIX):
+                        continue
+                    if os.path.isfile(path) and self.file_filter(name):
+                        by_hash.setdefault(hash_file(path), name)
+            self._by_hash = by_hash
+        return self._by_hash
+
+    def lookup(self, digest: str) -> Optional[str]:
+        """Return the stored filename with this content, if it still exists."""
+        with self._lock:
+            name = self._load().get(digest)
+            if name is not None and not os.path.isfile(os.path.join(self.directory, name)):
+                del self._by_hash[digest]
+                return None
+            return name
+
+    def add(self, digest: str, name: str):
+        with self._lock:
+            self._load()[digest] = name
+
+    def store(self, upload: HashingUpload, filename: str) -> Tuple[str, bool]:
+        """Move an upload into the directory unless its content is already there.
+
+        Returns (stored filename, is_new). A different file with the same name
+        is never overwritten; the new one gets a short hash suffix instead.
+        """
+        digest = upload.hexdigest()
+        with self._lock:
+            existing = self.lookup(digest)
+            if existing is not None:
+                upload.close()
+                return existing, False
+            target = filename
+            if os.path.exists(os.path.join(self.directory, target)):
+                stem, ext = os.path.splitext(filename)
+                target = f"{stem}-{digest[:8]}{ext}"
+            upload.move_to(os.path.join(self.directory, target))
+            self.add(digest, target)
+            self._stored[target] = digest
+            return target, True
+
+    def is_stored_upload(self, name: str) -> bool:
+        """Whether name still holds the content store() moved there; forgotten once the file changes."""
+        with self._lock:
+            digest = self._stored.get(name)
+        if digest is None:
+            return False
+        try:
+            unchanged = hash_file(os.path.join(self.directory, name)) == digest
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            with self._lock:
+                if self._stored.get(name) == digest:
+                    del self._stored[name]
+        return unchanged
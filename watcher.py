@@ -0,0 +1,242 @@
+"""Directory watcher for continuous incremental ingestion.
+
+Watches the top level of each configured directory and reports created,
+modified and deleted files after a quiet period, so a burst of writes to the
+same file (or a copy of many files) becomes a single batch of changes. Uses
+inotify on Linux and falls back to polling directory listings elsewhere.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('watcher')
+
+CREATED = 'created'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _file_state(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class _Inotify:
+    """Minimal ctypes binding to the Linux inotify API."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs: Dict[int, str] = {}
+
+    def add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+        self._dirs[wd] = directory
+
+    def read_events(self, timeout: float) -> List[Tuple[str, str]]:
+        """Return (directory, name) pairs touched since the last read."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            # An empty name means the directory itself; rescan it
+            events.append((directory, name))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class DirectoryWatcher:
+    """Watch directories and call ``callback(changes)`` with debounced batches.
+
+    ``changes`` is a list of (change, directory, filename) tuples where change
+    is one of CREATED, MODIFIED or DELETED. Only files accepted by
+    ``file_filter(filename)`` are reported.
+    """
+
+    def __init__(self, directories: Iterable[str],
+                 callback: Callable[[List[Tuple[str, str, str]]], None],
+                 file_filter: Optional[Callable[[str], bool]] = None,
+                 debounce: float = 1.0, poll_interval: float = 2.0,
+                 use_inotify: Optional[bool] = None):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self._relative = dict(zip(self.directories, directories))
+        self.callback = callback
+        self.file_filter = file_filter or (lambda name: True)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith('linux')
+        self.use_inotify = use_inotify
+        self._known: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._pending: Dict[Tuple[str, str], float] = {}
+        self._observed: Dict[Tuple[str, str], Optional[Tuple[int, int]]] = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.backend = None
+
+    def start(self):
+        """Record the current files and start watching in a daemon thread."""
+        for directory in self.directories:
+            for name, state in self._scan(directory).items():
+                self._known[(directory, name)] = state
+        self._thread = threading.Thread(target=self._run, name='directory-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _scan(self, directory: str) -> Dict[str, Tuple[int, int]]:
+        states = {}
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return states
+        for name in names:
+            if not self.file_filter(name):
+                continue
+            state = _file_state(os.path.join(directory, name))
+            if state is not None:
+                states[name] = state
+        return states
+
+    def _run(self):
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify()
+                for directory in self.directories:
+                    if os.path.isdir(directory):
+                        inotify.add_watch(directory)
+                    else:
+                        logger.warning("Not watching missing directory %s", directory)
+                self.backend = 'inotify'
+            except (OSError, AttributeError) as e:
+                logger.warning("inotify unavailable (%s), falling back to polling", e)
+                if inotify is not None:
+                    inotify.close()
+                inotify = None
+        if inotify is None:
+            self.backend = 'polling'
+        logger.info("Watching %s with %s", ', '.join(self.directories), self.backend)
+
+        last_poll = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if inotify is not None:
+                    wait = self.debounce if self._pending else 1.0
+                    for directory, name in inotify.read_events(wait):
+                        if not name:
+                            self._mark_directory(directory)
+                        elif self.file_filter(name):
+                            self._pending[(directory, name)] = time.monotonic()
+                else:
+                    self._stop.wait(min(self.poll_interval, self.debounce) if self._pending
+                                    else self.poll_interval)
+                    if time.monotonic() - last_poll >= self.poll_interval:
+                        last_poll = time.monotonic()
+                        for directory in self.directories:
+                            self._mark_directory(directory)
+                self._flush()
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def _mark_directory(self, directory: str):
+        """Queue every file whose state differs from what was last reported.
+
+        The debounce clock restarts whenever a file is seen changing again, so a
+        file that is still being written is reported once it settles.
+        """
+        current = self._scan(directory)
+        now = time.monotonic()
+        names = {name for (d, name) in self._known if d == directory}
+        names.update(name for (d, name) in self._pending if d == directory)
+        for name in names | set(current):
+            key = (directory, name)
+            state = current.get(name)
+            if self._known.get(key) == state and key not in self._pending:
+                continue
+            if key not in self._pending or self._observed.get(key) != state:
+                self._pending[key] = now
+            self._observed[key] = state
+
+    def _flush(self):
+        """Report files that have been quiet for at least the debounce period."""
+        now = time.monotonic()
+        quiet = [key for key, seen in self._pending.items() if now - seen >= self.debounce]
+        if not quiet:
+            return
+        changes = []
+        for key in quiet:
+            del self._pending[key]
+            self._observed.pop(key, None)
+            directory, name = key
+            state = _file_state(os.path.join(directory, name))
+            previous = self._known.get(key)
+            if state == previous:
+                continue
+            if state is None:
+                del self._known[key]
+                changes.append((DELETED, self._relative[directory], name))
+            else:
+                self._known[key] = state
+                changes.append((CREATED if previous is None else MODIFIED,
+                                self._relative[directory], name))
+        if changes:
+            try:
+                self.callback(changes)
+            except Exception as e:
+                logger.error("Watcher callback failed: %s", e)